@@ -1,11 +1,21 @@
-from .repl import main as repl
+# entry points import their module on call, so importing the package (or
+# one of its submodules) does not pull in the whole repl or telegram stack
 
-try:
-    from .telegram_bot import main as telegram_bot
-except ImportError:
 
-    def telegram_bot():
+def repl():
+    from .repl import main
+
+    main()
+
+
+def telegram_bot():
+    try:
+        from .telegram_bot import main
+    except ImportError:
         print("telegram_bot is not available. ensure all dependencies are installed.")
+        return
+
+    main()
 
 
 __all__ = ["repl", "telegram_bot"]
@@ -0,0 +1,326 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import contextvars
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+import httpx
+
+from .. import globalvars
+from ..utils.config import load_config, migrate_config_if_needed
+from ..utils.context.impl.api_context import APIContext
+from ..utils.context.impl.console_messenger import ConsoleMessenger
+from ..utils.fs import CACHE_DIR
+from ..utils.logging import configure_logging, print
+from .isolation import describe_exit, wait_for_result
+from .mock_gateway import MockGateway
+
+SCENARIOS = ["list_sync", "paper_fetch", "text_extraction", "audio_download"]
+BENCH_DIR = CACHE_DIR / "bench"
+
+
+def _run_items(items: list, func: Callable, workers: int) -> tuple[int, int, float]:
+    # returns (succeeded, failed, seconds); a falsy result or an exception
+    # counts as a failure, like the prefetcher treats them
+    def run(item) -> bool:
+        try:
+            return bool(func(item))
+        except Exception:
+            return False
+
+    start = time.perf_counter()
+    if workers <= 1:
+        results = list(map(run, items))
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, run, item)
+                for item in items
+            ]
+            results = [future.result() for future in futures]
+    seconds = time.perf_counter() - start
+    succeeded = sum(results)
+    return succeeded, len(results) - succeeded, seconds
+
+
+def _run_worker(options: dict, queue) -> None:
+    # runs in a fresh interpreter whose EHH_CACHE_DIR points at an empty
+    # directory, so every scenario starts cold
+    from ..models.credentials import Credentials
+    from ..models.homework_kind import HomeworkKind
+    from ..tasks import (
+        _get_hw_paper_entry,
+        cache_audio,
+        cache_text_content,
+        get_audio_path,
+        get_hw_list,
+        login,
+    )
+
+    request_count = [0]
+
+    def count_request(request: httpx.Request) -> None:
+        request_count[0] += 1
+
+    globalvars.set_default_context(
+        APIContext(
+            messenger=ConsoleMessenger(),
+            http_client=httpx.Client(
+                base_url=options["base_url"],
+                event_hooks={"request": [count_request]},
+            ),
+        )
+    )
+
+    def measure(scenario: str, items: list, func: Callable, workers: int) -> dict:
+        requests_before = request_count[0]
+        succeeded, failed, seconds = _run_items(items, func, workers)
+        return {
+            "scenario": scenario,
+            "items": succeeded,
+            "errors": failed,
+            "seconds": seconds,
+            "requests": request_count[0] - requests_before,
+            "items_per_second": succeeded / seconds if seconds > 0 else None,
+        }
+
+    try:
+        credentials = Credentials("Mock School", "student", "password")
+        token = login(credentials)
+        if token is None:
+            raise RuntimeError("login against the mock gateway failed")
+
+        results = []
+        hw_lists = []
+
+        def sync_list(_) -> bool:
+            hw_list = get_hw_list(token, credentials.account_key())
+            if hw_list is not None:
+                hw_lists.append(hw_list)
+            return hw_list is not None
+
+        # the other scenarios need the list, so it is always synced at least once
+        list_runs = options["runs"] if "list_sync" in options["scenarios"] else 1
+        result = measure("list_sync", list(range(list_runs)), sync_list, 1)
+        if "list_sync" in options["scenarios"]:
+            results.append(result)
+        if len(hw_lists) == 0:
+            raise RuntimeError("no homework list could be retrieved")
+        records = max(hw_lists, key=len)
+        questions = [r for r in records if r.kind == HomeworkKind.QUESTIONS]
+
+        if "paper_fetch" in options["scenarios"]:
+            results.append(
+                measure(
+                    "paper_fetch",
+                    questions,
+                    lambda r: _get_hw_paper_entry(token, r),
+                    options["workers"],
+                )
+            )
+
+        if "text_extraction" in options["scenarios"]:
+            results.append(
+                measure(
+                    "text_extraction",
+                    records,
+                    lambda r: cache_text_content(token, r),
+                    options["workers"],
+                )
+            )
+
+        if "audio_download" in options["scenarios"]:
+            result = measure(
+                "audio_download",
+                questions,
+                lambda r: cache_audio(token, r),
+                options["workers"],
+            )
+            downloaded = sum(
+                get_audio_path(r).stat().st_size
+                for r in questions
+                if get_audio_path(r).is_file()
+            )
+            result["bytes"] = downloaded
+            result["mib_per_second"] = (
+                downloaded / 1024 / 1024 / result["seconds"]
+                if result["seconds"] > 0
+                else None
+            )
+            results.append(result)
+
+        queue.put({"results": results, "error": None})
+    except Exception as e:
+        queue.put({"results": [], "error": f"{type(e).__name__}: {e}"})
+
+
+def _run_isolated(options: dict) -> dict:
+    mp_context = multiprocessing.get_context("spawn")
+    queue = mp_context.Queue()
+    with tempfile.TemporaryDirectory(prefix="ehh-bench-") as cache_dir:
+        # spawned children re-import utils.fs and pick this up as CACHE_DIR
+        previous = os.environ.get("EHH_CACHE_DIR", None)
+        os.environ["EHH_CACHE_DIR"] = cache_dir
+        try:
+            process = mp_context.Process(target=_run_worker, args=(options, queue))
+            process.start()
+        finally:
+            if previous is None:
+                os.environ.pop("EHH_CACHE_DIR", None)
+            else:
+                os.environ["EHH_CACHE_DIR"] = previous
+        result = wait_for_result(process, queue)
+        process.join()
+    if result is None:
+        result = {"results": [], "error": describe_exit(process.exitcode)}
+    return result
+
+
+def _summarize(result: dict) -> tuple:
+    rate = result["items_per_second"]
+    throughput = result.get("mib_per_second", None)
+    return (
+        result["scenario"],
+        str(result["items"]),
+        str(result["errors"]),
+        str(result["requests"]),
+        f"{result['seconds']:.2f}s",
+        f"{rate:.1f}/s" if rate is not None else "-",
+        f"{throughput:.1f} MiB/s" if throughput is not None else "-",
+    )
+
+
+def main():
+    globalvars.set_default_context(
+        APIContext(messenger=ConsoleMessenger(), http_client=httpx.Client())
+    )
+
+    migrate_config_if_needed()
+    config = load_config()
+    configure_logging(config)
+    bench_config = getattr(getattr(config, "benchmark", None), "gateway", None)
+
+    def _default(key: str, fallback):
+        return getattr(bench_config, key, None) or fallback
+
+    parser = argparse.ArgumentParser(
+        prog="python -m ehh.bench.gateway",
+        description="benchmark list sync, paper fetch, text extraction and audio download against a local mock gateway",
+    )
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        choices=SCENARIOS,
+        default=_default("scenarios", SCENARIOS),
+    )
+    parser.add_argument("--tasks", type=int, default=_default("tasks", 100))
+    parser.add_argument(
+        "--translations", type=int, default=_default("translations", 20)
+    )
+    parser.add_argument("--questions", type=int, default=_default("questions", 20))
+    parser.add_argument("--audio-kb", type=int, default=_default("audio_kb", 512))
+    parser.add_argument(
+        "--latency-ms", type=float, default=_default("latency_ms", 20.0)
+    )
+    parser.add_argument("--jitter-ms", type=float, default=_default("jitter_ms", 5.0))
+    parser.add_argument("--error-rate", type=float, default=_default("error_rate", 0.0))
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=_default("workers", 1),
+        help="concurrent requests for the per-homework scenarios",
+    )
+    parser.add_argument(
+        "--runs", type=int, default=_default("runs", 3), help="list sync repetitions"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="path of the json lines result file")
+    args = parser.parse_args()
+
+    output = Path(
+        args.output
+        or BENCH_DIR / f"gateway_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+
+    gateway = MockGateway(
+        tasks=args.tasks,
+        translations=args.translations,
+        questions=args.questions,
+        audio_kb=args.audio_kb,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    gateway.start_in_thread()
+
+    print("--- step: benchmark gateway ---")
+    print(
+        f"<info> {args.tasks} task(s), {args.translations} translation(s), "
+        f"latency {args.latency_ms:.0f}±{args.jitter_ms:.0f} ms, error rate {args.error_rate:.0%}, "
+        f"{args.workers} worker(s); writing results to '{output}'"
+    )
+
+    try:
+        outcome = _run_isolated(
+            {
+                "base_url": gateway.base_url,
+                "scenarios": args.scenarios,
+                "workers": args.workers,
+                "runs": args.runs,
+            }
+        )
+    finally:
+        gateway.stop_thread()
+
+    if outcome["error"] is not None:
+        print(f"<error> benchmark failed: {outcome['error']}")
+        return
+
+    run = {
+        "timestamp": datetime.now().isoformat(),
+        "tasks": args.tasks,
+        "translations": args.translations,
+        "questions": args.questions,
+        "audio_kb": args.audio_kb,
+        "latency_ms": args.latency_ms,
+        "jitter_ms": args.jitter_ms,
+        "error_rate": args.error_rate,
+        "workers": args.workers,
+        "seed": args.seed,
+    }
+    with open(output, "wt", encoding="utf-8") as f:
+        for result in outcome["results"]:
+            f.write(json.dumps({**run, **result}, ensure_ascii=False) + "\n")
+
+    globalvars.get_context().messenger.send_table(
+        title="Gateway Benchmark",
+        columns=[
+            ("Scenario", "cyan"),
+            ("Items", "white", "right"),
+            ("Errors", "red", "right"),
+            ("Requests", "white", "right"),
+            ("Time", "yellow", "right"),
+            ("Rate", "green", "right"),
+            ("Throughput", "blue", "right"),
+        ],
+        rows=list(map(_summarize, outcome["results"])),
+    )
+    print(
+        f"<info> mock gateway served {sum(gateway.requests.values())} request(s), "
+        f"{sum(gateway.errors.values())} injected failure(s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
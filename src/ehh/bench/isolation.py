@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import signal
+from multiprocessing.process import BaseProcess
+from queue import Empty
+from typing import Any, Optional
+
+RESULT_POLL_SECONDS = 1.0
+
+
+def describe_exit(exitcode: Optional[int]) -> str:
+    if exitcode is not None and exitcode < 0:
+        try:
+            return f"worker killed by {signal.Signals(-exitcode).name}"
+        except ValueError:
+            pass
+    return f"worker exited with code {exitcode} without a result"
+
+
+def wait_for_result(process: BaseProcess, queue: Any) -> Optional[Any]:
+    # a worker killed by the oom killer or a crash never puts a result, so
+    # poll instead of waiting on the queue forever; returns None once the
+    # worker is gone without one
+    while True:
+        try:
+            return queue.get(timeout=RESULT_POLL_SECONDS)
+        except Empty:
+            if process.is_alive():
+                continue
+        # the worker may have put its result right before exiting
+        try:
+            return queue.get(timeout=RESULT_POLL_SECONDS)
+        except Empty:
+            return None
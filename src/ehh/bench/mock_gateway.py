@@ -0,0 +1,354 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import asyncio
+import json
+import random
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+import httpx
+
+from .. import globalvars
+from ..utils.constants import (
+    FIND_SCHOOLS_URL,
+    GET_HW_CONTENT_URL,
+    GET_HW_DETAILS_URL,
+    GET_HW_LIST_URL,
+    GET_TOKEN_URL,
+    GET_TRANSLATION_HW_CONTENT_URL,
+    GET_TRANSLATION_HW_LIST_URL,
+    TIME_FORMAT,
+)
+from ..utils.context.impl.api_context import APIContext
+from ..utils.context.impl.console_messenger import ConsoleMessenger
+from ..utils.http_server import HttpRequest, HttpResponse, HttpServer
+from ..utils.logging import print
+
+AUDIO_PATH = "/audio"
+ACCESS_TOKEN = "mock-access-token"
+SCHOOL = {"id": 1, "name": "Mock School"}
+WORDS = (
+    "the quick brown fox jumps over a lazy dog while students listen to "
+    "the recording and answer every question about the passage carefully"
+).split()
+
+
+class MockGateway:
+    # a stand-in for the homework gateway that serves a generated dataset,
+    # so the tasks can be exercised and measured without the network. every
+    # request waits latency_ms (+- jitter_ms) and fails with error_rate
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        tasks: int = 100,
+        translations: int = 20,
+        questions: int = 20,
+        audio_kb: int = 512,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        # requests per path, and how many of them got an injected failure
+        self.requests: Counter[str] = Counter()
+        self.errors: Counter[str] = Counter()
+        self._random = random.Random(seed)
+        self._tasks = [self._make_task(i) for i in range(1, tasks + 1)]
+        self._translations = [
+            self._make_translation(i) for i in range(1, translations + 1)
+        ]
+        self._questions = questions
+        # every recording shares one blob; nothing decodes it
+        self._audio = random.Random(seed).randbytes(audio_kb * 1024)
+
+        self.server = HttpServer(host, port, max_body_size=64 * 1024)
+        for path, handler in (
+            (FIND_SCHOOLS_URL, self._find_schools),
+            (GET_TOKEN_URL, self._get_token),
+            (GET_HW_LIST_URL, self._get_hw_list),
+            (GET_TRANSLATION_HW_LIST_URL, self._get_translation_hw_list),
+            (GET_HW_DETAILS_URL, self._get_hw_details),
+            (GET_HW_CONTENT_URL, self._get_hw_content),
+            (GET_TRANSLATION_HW_CONTENT_URL, self._get_translation_hw_content),
+        ):
+            self.server.route("POST", path, self._wrap(path, handler))
+        self.server.route("GET", AUDIO_PATH, self._wrap(AUDIO_PATH, self._get_audio))
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.server.host}:{self.server.port}"
+
+    # --- dataset ---
+
+    def _make_time(self, index: int) -> str:
+        return (datetime(2025, 9, 1) + timedelta(hours=index)).strftime(TIME_FORMAT)
+
+    def _make_task(self, index: int) -> dict:
+        return {
+            "id": index,
+            "taskId": 10000 + index,
+            "taskPaperId": 20000 + index,
+            "batchId": 30000 + index,
+            "taskTitle": f"Mock Task {index}",
+            "assignerName": "Mock Teacher",
+            "beginTime": self._make_time(index),
+            "totalScore": 100,
+            "score": self._random.choice([None, self._random.randint(0, 100)]),
+            "status": self._random.choice([0, 1, 4, 5]),
+        }
+
+    def _make_translation(self, index: int) -> dict:
+        return {
+            "id": 50000 + index,
+            "title": f"Mock Translation {index}",
+            "assignerName": "Mock Teacher",
+            "beginTime": self._make_time(index),
+            "totalScore": 100,
+            "ownerScore": None,
+            "status": self._random.choice([0, 1, 4]),
+        }
+
+    def _make_sentence(self, rng: random.Random) -> str:
+        return " ".join(rng.choices(WORDS, k=rng.randint(8, 20))).capitalize() + "."
+
+    def _make_paper(self, task: dict) -> dict:
+        rng = random.Random(task["id"])
+        parts = [
+            f"<h1>{task['taskTitle']}</h1>",
+            f'<audio controls><source src="{self.base_url}{AUDIO_PATH}?id={task["id"]}"></audio>',
+        ]
+        flows = []
+        for sort in range(1, self._questions + 1):
+            tag_id = f"radio{sort}" if sort % 2 else f"text{sort}"
+            parts.append(f"<p>{sort}. {self._make_sentence(rng)}</p>")
+            if tag_id.startswith("radio"):
+                for option in "ABCD":
+                    parts.append(
+                        f'<label><input type="radio" name="{tag_id}" value="{option}">'
+                        f"{option}. {self._make_sentence(rng)}</label>"
+                    )
+                answer = rng.choice("ABCD")
+            else:
+                parts.append(f'<input type="text" name="{tag_id}">')
+                answer = rng.choice(WORDS)
+            flows.append(
+                {
+                    "sort": sort,
+                    "id": sort,
+                    "tagId": tag_id,
+                    "answer": answer,
+                    "score": 5,
+                }
+            )
+        return {"content": "\n".join(parts), "flows": flows}
+
+    # --- handlers ---
+
+    def _wrap(self, path: str, handler):
+        async def wrapped(request: HttpRequest) -> HttpResponse:
+            self.requests[path] += 1
+            if self.latency_ms > 0 or self.jitter_ms > 0:
+                delay = self.latency_ms + self._random.uniform(
+                    -self.jitter_ms, self.jitter_ms
+                )
+                await asyncio.sleep(max(0.0, delay) / 1000)
+            if self._random.random() < self.error_rate:
+                self.errors[path] += 1
+                return _json(
+                    {"success": False, "code": 503, "msg": "injected failure"}, 503
+                )
+            if path not in (FIND_SCHOOLS_URL, GET_TOKEN_URL, AUDIO_PATH):
+                if request.headers.get("authorization") != f"Bearer {ACCESS_TOKEN}":
+                    return _json({"success": False, "code": 401}, 401)
+            return await handler(request)
+
+        return wrapped
+
+    async def _find_schools(self, request: HttpRequest) -> HttpResponse:
+        return _json({"success": True, "data": [SCHOOL]})
+
+    async def _get_token(self, request: HttpRequest) -> HttpResponse:
+        username = request.query.get("username", "").split("|")[0]
+        return _json(
+            {
+                "success": True,
+                "access_token": ACCESS_TOKEN,
+                "token_type": "bearer",
+                "refresh_token": "mock-refresh-token",
+                "expires_in": 86400,
+                "scope": "server",
+                "jti": "mock-jti",
+                "userInfo": {
+                    "id": 1,
+                    "username": username,
+                    "name": "Mock Student",
+                    "type": "1",
+                },
+            }
+        )
+
+    def _page(self, request: HttpRequest, items: list[dict], key: str) -> HttpResponse:
+        body = request.json()
+        page_size = max(1, int(body.get("pageSize", 50)))
+        page_index = max(1, int(body.get("pageIndex", 1)))
+        start = (page_index - 1) * page_size
+        return _json(
+            {
+                "success": True,
+                "data": {
+                    "pageCount": -(-len(items) // page_size),
+                    key: items[start : start + page_size],
+                },
+            }
+        )
+
+    async def _get_hw_list(self, request: HttpRequest) -> HttpResponse:
+        return self._page(request, self._tasks, "userTasks")
+
+    async def _get_translation_hw_list(self, request: HttpRequest) -> HttpResponse:
+        return self._page(request, self._translations, "tasks")
+
+    def _find(self, items: list[dict], key: str, value: Any) -> Optional[dict]:
+        return next((item for item in items if item[key] == value), None)
+
+    async def _get_hw_details(self, request: HttpRequest) -> HttpResponse:
+        task = self._find(self._tasks, "id", request.json().get("id", None))
+        if task is None:
+            return _json({"success": False, "code": 404})
+        flows = self._make_paper(task)["flows"]
+        return _json(
+            {
+                "success": True,
+                "data": {
+                    "subResults": [
+                        {"tagId": f["tagId"], "standardAnswer": f["answer"]}
+                        for f in flows
+                    ]
+                },
+            }
+        )
+
+    async def _get_hw_content(self, request: HttpRequest) -> HttpResponse:
+        task = self._find(self._tasks, "taskPaperId", request.json().get("id", None))
+        if task is None:
+            return _json({"success": False, "code": 404})
+        return _json({"success": True, "data": self._make_paper(task)})
+
+    async def _get_translation_hw_content(self, request: HttpRequest) -> HttpResponse:
+        translation = self._find(
+            self._translations, "id", request.json().get("id", None)
+        )
+        if translation is None:
+            return _json({"success": False, "code": 404})
+        rng = random.Random(translation["id"])
+        return _json(
+            {
+                "success": True,
+                "data": [
+                    {"questionNumber": n, "question": self._make_sentence(rng)}
+                    for n in range(1, self._questions + 1)
+                ],
+            }
+        )
+
+    async def _get_audio(self, request: HttpRequest) -> HttpResponse:
+        if self._find(self._tasks, "id", int(request.query.get("id", 0))) is None:
+            return HttpResponse.error(404)
+        return HttpResponse(body=self._audio, content_type="audio/mpeg")
+
+    # --- lifecycle ---
+
+    def start_in_thread(self) -> None:
+        # the benchmarks are synchronous, so the server gets its own loop
+        started = threading.Event()
+
+        def run() -> None:
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.server.start())
+            started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self.server.stop(timeout=1.0))
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="mock-gateway", daemon=True)
+        self._thread.start()
+        started.wait()
+
+    def stop_thread(self) -> None:
+        if self._loop is None or self._thread is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop = None
+        self._thread = None
+
+
+def _json(data: Any, status: int = 200) -> HttpResponse:
+    return HttpResponse(
+        status=status,
+        body=json.dumps(data, ensure_ascii=False).encode("utf-8"),
+        content_type="application/json",
+    )
+
+
+def main():
+    globalvars.set_default_context(
+        APIContext(messenger=ConsoleMessenger(), http_client=httpx.Client())
+    )
+
+    parser = argparse.ArgumentParser(
+        prog="python -m ehh.bench.mock_gateway",
+        description="serve a generated dataset in place of the homework gateway",
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8808)
+    parser.add_argument("--tasks", type=int, default=100)
+    parser.add_argument("--translations", type=int, default=20)
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--audio-kb", type=int, default=512)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    gateway = MockGateway(
+        host=args.host,
+        port=args.port,
+        tasks=args.tasks,
+        translations=args.translations,
+        questions=args.questions,
+        audio_kb=args.audio_kb,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+
+    async def serve() -> None:
+        await gateway.server.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await gateway.server.stop(timeout=1.0)
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        print(f"<info> served {sum(gateway.requests.values())} request(s)")
+
+
+if __name__ == "__main__":
+    main()
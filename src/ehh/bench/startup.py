@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+
+from .. import globalvars
+from ..utils.config import load_config, migrate_config_if_needed
+from ..utils.context.impl.api_context import APIContext
+from ..utils.context.impl.console_messenger import ConsoleMessenger
+from ..utils.fs import CACHE_DIR
+from ..utils.logging import configure_logging, print
+
+ENTRY_POINTS = ["ehh.repl", "ehh.telegram_bot"]
+DEFAULT_BUDGET_MS = 500
+BENCH_DIR = CACHE_DIR / "bench"
+# the directory that contains the ehh package, so that child interpreters
+# import this checkout rather than whatever happens to be installed
+SOURCE_ROOT = Path(__file__).resolve().parents[2]
+
+
+def parse_importtime(output: str) -> dict[str, tuple[int, int]]:
+    # "import time: <self us> | <cumulative us> | <indent><module>"; a module
+    # imported more than once keeps its first (real) timing
+    modules: dict[str, tuple[int, int]] = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:") :].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            # the header line
+            continue
+        modules.setdefault(parts[2].strip(), (self_us, cumulative_us))
+    return modules
+
+
+def _run_once(entry_point: str) -> dict:
+    env = os.environ.copy()
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [str(SOURCE_ROOT), env.get("PYTHONPATH", None)])
+    )
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {entry_point}"],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+
+    if process.returncode != 0:
+        error = process.stderr.strip().splitlines()
+        return {"error": error[-1] if error else f"exit code {process.returncode}"}
+
+    modules = parse_importtime(process.stderr)
+    if entry_point not in modules:
+        return {"error": f"{entry_point} missing from -X importtime output"}
+    return {
+        "error": None,
+        "wall_ms": wall_ms,
+        "import_ms": modules[entry_point][1] / 1000,
+        "modules": modules,
+    }
+
+
+def benchmark_entry_point(entry_point: str, runs: int, top: int) -> dict:
+    # every run is a fresh interpreter, so nothing is shared through
+    # sys.modules; the median smooths over disk and scheduler noise
+    samples = []
+    for _ in range(runs):
+        sample = _run_once(entry_point)
+        if sample["error"] is not None:
+            return {"entry_point": entry_point, "error": sample["error"]}
+        samples.append(sample)
+
+    self_times: dict[str, list[int]] = {}
+    cumulative_times: dict[str, list[int]] = {}
+    for sample in samples:
+        for module, (self_us, cumulative_us) in sample["modules"].items():
+            self_times.setdefault(module, []).append(self_us)
+            cumulative_times.setdefault(module, []).append(cumulative_us)
+
+    slowest = sorted(
+        self_times, key=lambda m: statistics.median(self_times[m]), reverse=True
+    )[:top]
+    return {
+        "entry_point": entry_point,
+        "error": None,
+        "runs": runs,
+        "wall_ms": statistics.median(s["wall_ms"] for s in samples),
+        "import_ms": statistics.median(s["import_ms"] for s in samples),
+        "module_count": len(self_times),
+        "slowest": [
+            {
+                "module": module,
+                "self_ms": statistics.median(self_times[module]) / 1000,
+                "cumulative_ms": statistics.median(cumulative_times[module]) / 1000,
+            }
+            for module in slowest
+        ],
+    }
+
+
+def main():
+    globalvars.set_default_context(
+        APIContext(messenger=ConsoleMessenger(), http_client=httpx.Client())
+    )
+
+    migrate_config_if_needed()
+    config = load_config()
+    configure_logging(config)
+    bench_config = getattr(getattr(config, "benchmark", None), "startup", None)
+
+    def _default(key: str, fallback):
+        return getattr(bench_config, key, None) or fallback
+
+    parser = argparse.ArgumentParser(
+        prog="python -m ehh.bench.startup",
+        description="measure the cold-start import time of the entry points",
+    )
+    parser.add_argument(
+        "--entry-points",
+        nargs="+",
+        default=_default("entry_points", ENTRY_POINTS),
+    )
+    parser.add_argument("--runs", type=int, default=_default("runs", 5))
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=_default("budget_ms", DEFAULT_BUDGET_MS),
+        help="fail when the median import time of an entry point exceeds this",
+    )
+    parser.add_argument(
+        "--top", type=int, default=15, help="number of slowest modules to show"
+    )
+    parser.add_argument("--output", help="path of the json lines result file")
+    args = parser.parse_args()
+
+    output = Path(
+        args.output
+        or BENCH_DIR / f"startup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+
+    print("--- step: benchmark startup ---")
+    print(
+        f"<info> {args.runs} run(s) per entry point, budget {args.budget_ms:.0f} ms; writing results to '{output}'"
+    )
+
+    over_budget = []
+    with open(output, "wt", encoding="utf-8") as f:
+        for entry_point in args.entry_points:
+            print(f"<info> importing {entry_point}...")
+            result = benchmark_entry_point(entry_point, args.runs, args.top)
+            result["budget_ms"] = args.budget_ms
+            result["timestamp"] = datetime.now().isoformat()
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+            f.flush()
+
+            if result["error"] is not None:
+                print(f"<error> {entry_point} failed to import: {result['error']}")
+                over_budget.append(entry_point)
+                continue
+
+            globalvars.get_context().messenger.send_table(
+                title=f"Slowest Imports: {entry_point}",
+                columns=[
+                    ("Module", "cyan"),
+                    ("Self", "yellow", "right"),
+                    ("Cumulative", "green", "right"),
+                ],
+                rows=[
+                    (
+                        m["module"],
+                        f"{m['self_ms']:.1f} ms",
+                        f"{m['cumulative_ms']:.1f} ms",
+                    )
+                    for m in result["slowest"]
+                ],
+            )
+
+            within = result["import_ms"] <= args.budget_ms
+            print(
+                f"<{'success' if within else 'error'}> {entry_point}: import {result['import_ms']:.0f} ms, "
+                f"process {result['wall_ms']:.0f} ms, {result['module_count']} modules "
+                f"(budget {args.budget_ms:.0f} ms)"
+            )
+            if not within:
+                over_budget.append(entry_point)
+
+    if len(over_budget) > 0:
+        print(f"<error> over startup budget: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import math
+import multiprocessing
+import re
+import struct
+import time
+import wave
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+from .. import globalvars
+from ..utils.config import load_config, migrate_config_if_needed
+from ..utils.context.impl.api_context import APIContext
+from ..utils.context.impl.console_messenger import ConsoleMessenger
+from ..utils.crypto import decodeb64_safe
+from ..utils.fs import CACHE_DIR, read_file_text
+from ..utils.logging import configure_logging, print
+from .isolation import describe_exit, wait_for_result
+
+BACKENDS = ["whisper", "whisper-mmap"]
+SAMPLE_RATE = 16000
+BENCH_DIR = CACHE_DIR / "bench"
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+
+def _normalize_words(text: str) -> list[str]:
+    return WORD_PATTERN.findall(text.lower())
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    ref = _normalize_words(reference)
+    hyp = _normalize_words(hypothesis)
+    if len(ref) == 0:
+        return 0.0 if len(hyp) == 0 else 1.0
+
+    # single-row levenshtein distance over words
+    prev = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, start=1):
+        cur = [i] + [0] * len(hyp)
+        for j, hyp_word in enumerate(hyp, start=1):
+            cur[j] = min(
+                prev[j] + 1,
+                cur[j - 1] + 1,
+                prev[j - 1] + (ref_word != hyp_word),
+            )
+        prev = cur
+
+    return prev[-1] / len(ref)
+
+
+def _generate_tone_clip(path: Path, seconds: int = 30) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        frames = bytearray()
+        for i in range(SAMPLE_RATE * seconds):
+            sample = int(8000 * math.sin(2 * math.pi * 440 * i / SAMPLE_RATE))
+            frames += struct.pack("<h", sample)
+        f.writeframes(bytes(frames))
+
+
+def _collect_clips(manifest: Optional[str], from_cache: bool) -> list[dict]:
+    if manifest is not None:
+        # manifest format: [{"audio": "...", "reference": "..."} | {"audio": "...", "reference_file": "..."}]
+        base = Path(manifest).parent
+        with open(manifest, "rt", encoding="utf-8") as f:
+            entries = json.load(f)
+        clips = []
+        for entry in entries:
+            reference = entry.get("reference", None)
+            if reference is None and "reference_file" in entry:
+                reference = read_file_text(base / entry["reference_file"])
+            clips.append(
+                {
+                    "name": entry.get("name", Path(entry["audio"]).name),
+                    "audio": str(base / entry["audio"]),
+                    "reference": reference,
+                }
+            )
+        return clips
+
+    if from_cache:
+        # cached transcriptions were made by whisper itself, so scoring against
+        # them would be circular; word error rate needs a human reference
+        # from a manifest
+        clips = []
+        for audio in sorted(CACHE_DIR.glob("homework_*_audio.mp3")):
+            encoded_title = audio.name[len("homework_") : -len("_audio.mp3")]
+            clips.append(
+                {
+                    "name": decodeb64_safe(encoded_title),
+                    "audio": str(audio),
+                    "reference": None,
+                }
+            )
+        if len(clips) > 0:
+            print(
+                "<info> cached audio has no human reference; word error rate will not be reported"
+            )
+            return clips
+        print("<warning> no cached audio found")
+
+    tone_clip = BENCH_DIR / "tone_30s.wav"
+    if not tone_clip.is_file():
+        _generate_tone_clip(tone_clip)
+    print("<info> using generated tone clip; word error rate will not be reported")
+    return [{"name": "tone_30s", "audio": str(tone_clip), "reference": None}]
+
+
+def _get_peak_rss_bytes() -> Optional[int]:
+    try:
+        import resource
+        import sys
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macos reports bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _run_worker(run: dict, clips: list[dict], queue) -> None:
+    globalvars.set_default_context(
+        APIContext(messenger=ConsoleMessenger(), http_client=httpx.Client())
+    )
+
+    try:
+        import torch
+        from whisper.audio import load_audio
+
+        from ..utils.whisper_model import load_whisper_model
+
+        if run["threads"] is not None:
+            torch.set_num_threads(run["threads"])
+
+        start = time.perf_counter()
+        model = load_whisper_model(
+            run["model"],
+            device=None if run["device"] == "auto" else run["device"],
+            in_memory=False,
+            mmap=run["backend"] == "whisper-mmap",
+        )
+        load_seconds = time.perf_counter() - start
+
+        clip_results = []
+        for clip in clips:
+            audio = load_audio(clip["audio"])
+            audio_seconds = len(audio) / SAMPLE_RATE
+
+            start = time.perf_counter()
+            result = model.transcribe(audio, language="en", verbose=None)
+            transcribe_seconds = time.perf_counter() - start
+
+            text = result.get("text", "")
+            if isinstance(text, list):
+                text = "\n".join(text)
+            clip_results.append(
+                {
+                    "clip": clip["name"],
+                    "audio_seconds": audio_seconds,
+                    "transcribe_seconds": transcribe_seconds,
+                    "rtf": transcribe_seconds / audio_seconds,
+                    "wer": (
+                        word_error_rate(clip["reference"], text)
+                        if clip["reference"] is not None
+                        else None
+                    ),
+                }
+            )
+
+        queue.put(
+            {
+                **run,
+                "load_seconds": load_seconds,
+                "peak_rss_bytes": _get_peak_rss_bytes(),
+                "clips": clip_results,
+                "error": None,
+            }
+        )
+    except Exception as e:
+        queue.put({**run, "error": f"{type(e).__name__}: {e}"})
+
+
+def _run_isolated(run: dict, clips: list[dict]) -> dict:
+    # every run gets a fresh interpreter so load time and peak rss are not
+    # polluted by models loaded in earlier runs
+    mp_context = multiprocessing.get_context("spawn")
+    queue = mp_context.Queue()
+    process = mp_context.Process(target=_run_worker, args=(run, clips, queue))
+    process.start()
+    result = wait_for_result(process, queue)
+    process.join()
+    if result is None:
+        result = {**run, "error": describe_exit(process.exitcode)}
+    return result
+
+
+def _summarize(result: dict) -> tuple:
+    if result["error"] is not None:
+        return (
+            result["backend"],
+            result["model"],
+            result["device"],
+            str(result["threads"] or "-"),
+            "-",
+            "-",
+            "-",
+            "-",
+            result["error"],
+        )
+
+    clips = result["clips"]
+    total_audio = sum(c["audio_seconds"] for c in clips)
+    total_transcribe = sum(c["transcribe_seconds"] for c in clips)
+    wers = [c["wer"] for c in clips if c["wer"] is not None]
+    rss = result["peak_rss_bytes"]
+    return (
+        result["backend"],
+        result["model"],
+        result["device"],
+        str(result["threads"] or "-"),
+        f"{result['load_seconds']:.2f}s",
+        f"{total_transcribe / total_audio:.3f}",
+        f"{rss / 1024 / 1024:.0f} MiB" if rss is not None else "-",
+        f"{sum(wers) / len(wers) * 100:.1f}%" if len(wers) > 0 else "n/a",
+        "",
+    )
+
+
+def main():
+    globalvars.set_default_context(
+        APIContext(messenger=ConsoleMessenger(), http_client=httpx.Client())
+    )
+
+    migrate_config_if_needed()
+    config = load_config()
+    configure_logging(config)
+    bench_config = getattr(getattr(config, "benchmark", None), "transcription", None)
+
+    def _default(key: str, fallback):
+        return getattr(bench_config, key, None) or fallback
+
+    parser = argparse.ArgumentParser(
+        prog="python -m ehh.bench.transcription",
+        description="benchmark transcription backends, models and thread settings",
+    )
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        choices=BACKENDS,
+        default=_default("backends", BACKENDS),
+    )
+    parser.add_argument(
+        "--models", nargs="+", default=_default("models", [config.whisper.model])
+    )
+    parser.add_argument(
+        "--devices", nargs="+", default=_default("devices", [config.whisper.device])
+    )
+    parser.add_argument(
+        "--threads", nargs="+", type=int, default=_default("threads", [None])
+    )
+    parser.add_argument("--clips", help="path to a json clip manifest")
+    parser.add_argument(
+        "--from-cache",
+        action="store_true",
+        help="use cached homework audio; no reference, so no word error rate",
+    )
+    parser.add_argument("--output", help="path of the json lines result file")
+    args = parser.parse_args()
+
+    clips = _collect_clips(args.clips, args.from_cache)
+    output = Path(
+        args.output
+        or BENCH_DIR / f"transcription_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+
+    print("--- step: benchmark transcription ---")
+    print(f"<info> {len(clips)} clip(s); writing results to '{output}'")
+
+    results = []
+    with open(output, "wt", encoding="utf-8") as f:
+        for backend in args.backends:
+            for model in args.models:
+                for device in args.devices:
+                    for threads in args.threads:
+                        run = {
+                            "backend": backend,
+                            "model": model,
+                            "device": device,
+                            "threads": threads,
+                            "timestamp": datetime.now().isoformat(),
+                        }
+                        print(
+                            f"<info> running {backend} / {model} / {device} / threads={threads or 'default'}..."
+                        )
+                        result = _run_isolated(run, clips)
+                        if result["error"] is not None:
+                            print(f"<error> run failed: {result['error']}")
+                        f.write(json.dumps(result, ensure_ascii=False) + "\n")
+                        f.flush()
+                        results.append(result)
+
+    globalvars.get_context().messenger.send_table(
+        title="Transcription Benchmark",
+        columns=[
+            ("Backend", "cyan"),
+            ("Model", "magenta"),
+            ("Device", "white", "center"),
+            ("Threads", "white", "right"),
+            ("Load", "yellow", "right"),
+            ("RTF", "green", "right"),
+            ("Peak RSS", "blue", "right"),
+            ("WER", "red", "right"),
+            ("Error", "red"),
+        ],
+        rows=list(map(_summarize, results)),
+    )
+
+
+if __name__ == "__main__":
+    main()
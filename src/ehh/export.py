@@ -0,0 +1,364 @@
+import contextvars
+import hashlib
+import io
+import json
+import os
+import re
+import tarfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO, Callable, Optional
+
+from munch import Munch
+
+from . import globalvars
+from .models.homework_kind import HomeworkKind
+from .models.homework_record import HomeworkRecord
+from .models.token import Token
+from .tasks import (
+    cache_audio,
+    cache_text_content,
+    get_audio_path,
+    get_text_path,
+    get_transcription_path,
+)
+from .utils.constants import TIME_FORMAT
+from .utils.convert import try_parse_int
+from .utils.fs import CACHE_DIR
+from .utils.homework_store import get_record, parse_record_filters, query_records
+from .utils.logging import print
+from .utils.tracing import span
+
+EXPORT_DIR = CACHE_DIR / "exports"
+# format -> file suffix
+ARCHIVE_FORMATS = {"zip": ".zip", "tar": ".tar", "tar.gz": ".tar.gz"}
+MANIFEST_NAME = "manifest.json"
+COPY_CHUNK_SIZE = 1024 * 1024
+DIR_NAME_LIMIT = 60
+
+# (artifact, cache path, name inside the item's directory, questions only)
+ARTIFACTS: list[tuple[str, Callable[[HomeworkRecord], Path], str, bool]] = [
+    ("text", get_text_path, "text.txt", False),
+    ("transcript", get_transcription_path, "transcript.txt", True),
+    ("audio", get_audio_path, "audio.mp3", True),
+]
+
+
+@dataclass
+class ExportOptions:
+    format: str = "zip"
+    include_audio: bool = True
+    fetch_missing: bool = True
+    concurrency: int = 2
+
+    @classmethod
+    def from_config(cls, config: Munch) -> "ExportOptions":
+        export_config = getattr(config, "export", None)
+        return cls(
+            format=getattr(export_config, "format", None) or "zip",
+            include_audio=getattr(export_config, "audio", True),
+            concurrency=getattr(export_config, "concurrency", None) or 2,
+        )
+
+
+@dataclass
+class ExportSummary:
+    items: int
+    files: int
+    fetched: int
+    missing: int
+    # bytes of the exported files, before compression
+    content_bytes: int
+    seconds: float
+
+    def describe(self) -> str:
+        return (
+            f"exported {self.files} file(s) of {self.items} homework item(s) "
+            f"({self.content_bytes / 1024 / 1024:.1f} MiB) in {self.seconds:.1f}s; "
+            f"fetched {self.fetched}, {self.missing} still missing"
+        )
+
+
+class _HashingReader:
+    # hands a file to the archive chunk by chunk, hashing it on the way
+    def __init__(self, f: BinaryIO) -> None:
+        self.f = f
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.f.read(size)
+        self.sha256.update(data)
+        self.size += len(data)
+        return data
+
+
+class _ZipWriter:
+    def __init__(self, output: BinaryIO) -> None:
+        # an unseekable output (a pipe) gets data descriptors instead of
+        # headers patched after the fact
+        self.archive = zipfile.ZipFile(output, "w")
+
+    def add_file(self, name: str, path: Path) -> _HashingReader:
+        info = zipfile.ZipInfo.from_file(path, name)
+        # mp3 does not shrink any further; only text is worth deflating
+        info.compress_type = (
+            zipfile.ZIP_STORED if path.suffix == ".mp3" else zipfile.ZIP_DEFLATED
+        )
+        with (
+            open(path, "rb") as f,
+            self.archive.open(info, "w", force_zip64=True) as dst,
+        ):
+            reader = _HashingReader(f)
+            while chunk := reader.read(COPY_CHUNK_SIZE):
+                dst.write(chunk)
+        return reader
+
+    def add_bytes(self, name: str, data: bytes) -> None:
+        self.archive.writestr(name, data, compress_type=zipfile.ZIP_DEFLATED)
+
+    def close(self) -> None:
+        self.archive.close()
+
+
+class _TarWriter:
+    def __init__(self, output: BinaryIO, compress: bool) -> None:
+        # stream mode ("w|") never seeks, so any writable output works
+        self.archive = tarfile.open(
+            fileobj=output, mode="w|gz" if compress else "w|"  # type: ignore
+        )
+
+    def add_file(self, name: str, path: Path) -> _HashingReader:
+        info = self.archive.gettarinfo(str(path), name)
+        with open(path, "rb") as f:
+            reader = _HashingReader(f)
+            self.archive.addfile(info, reader)  # type: ignore
+        return reader
+
+    def add_bytes(self, name: str, data: bytes) -> None:
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        self.archive.addfile(info, io.BytesIO(data))
+
+    def close(self) -> None:
+        self.archive.close()
+
+
+def _get_dir_name(record: HomeworkRecord) -> str:
+    # cache files are named by base64 titles; the archive uses readable ones
+    title = re.sub(r'[\x00-\x1f/\\:*?"<>|]+', "_", record.title).strip(" .")
+    return f"{record.store_id or 0:05d} {title[:DIR_NAME_LIMIT]}".rstrip()
+
+
+def _get_artifacts(
+    record: HomeworkRecord, include_audio: bool
+) -> list[tuple[str, Path, str]]:
+    return [
+        (artifact, get_path(record), file_name)
+        for artifact, get_path, file_name, questions_only in ARTIFACTS
+        if (record.kind == HomeworkKind.QUESTIONS or not questions_only)
+        and (include_audio or artifact != "audio")
+    ]
+
+
+def estimate_export_size(records: list[HomeworkRecord], include_audio: bool) -> int:
+    # bytes of the artifacts already cached; a lower bound for the archive,
+    # since missing files are only fetched by the export itself
+    return sum(
+        path.stat().st_size
+        for record in records
+        for _, path, _ in _get_artifacts(record, include_audio)
+        if path.is_file()
+    )
+
+
+def fetch_missing_artifacts(
+    token: Token, records: list[HomeworkRecord], include_audio: bool, concurrency: int
+) -> int:
+    # fills text and audio through the same cache paths prefetching uses, a
+    # bounded number of records at a time; transcripts need whisper and are
+    # only exported when they already exist
+    def fetch(record: HomeworkRecord) -> int:
+        fetched_count = int(cache_text_content(token, record))
+        if include_audio:
+            fetched_count += int(cache_audio(token, record))
+        return fetched_count
+
+    fetched_count = 0
+    with ThreadPoolExecutor(
+        max_workers=concurrency, thread_name_prefix="ehh-export"
+    ) as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, fetch, record)
+            for record in records
+        ]
+        for record, future in zip(records, futures):
+            try:
+                fetched_count += future.result()
+            except Exception as e:
+                print(f"<warning> could not fetch files for '{record.title}': {e}")
+    return fetched_count
+
+
+def write_archive(
+    records: list[HomeworkRecord],
+    output: BinaryIO,
+    format: str = "zip",
+    include_audio: bool = True,
+) -> tuple[int, int, int]:
+    # streams each file into the archive in fixed-size chunks and ends with
+    # the manifest, so memory use does not depend on the archive's size;
+    # returns (files, missing artifacts, content bytes)
+    if format not in ARCHIVE_FORMATS:
+        raise ValueError(
+            f"unknown archive format: {format}; supported: {', '.join(ARCHIVE_FORMATS)}"
+        )
+    if format == "zip":
+        writer = _ZipWriter(output)
+    else:
+        writer = _TarWriter(output, compress=format == "tar.gz")
+
+    items = []
+    file_count = 0
+    missing_count = 0
+    content_bytes = 0
+    with globalvars.get_context().messenger.track_progress(
+        "Exporting...", total=len(records)
+    ) as progress:
+        for record in records:
+            dir_name = _get_dir_name(record)
+            files = []
+            missing = []
+            for artifact, path, file_name in _get_artifacts(record, include_audio):
+                if not path.is_file():
+                    missing.append(artifact)
+                    continue
+                name = f"{dir_name}/{file_name}"
+                reader = writer.add_file(name, path)
+                files.append(
+                    {
+                        "artifact": artifact,
+                        "path": name,
+                        "size": reader.size,
+                        "sha256": reader.sha256.hexdigest(),
+                    }
+                )
+                content_bytes += reader.size
+            file_count += len(files)
+            missing_count += len(missing)
+            items.append(
+                {
+                    "id": record.store_id,
+                    "title": record.title,
+                    "kind": record.kind.value,
+                    "publisher": record.publisher_name,
+                    "publish_time": record.publish_time.strftime(TIME_FORMAT),
+                    "status": record.status.value[1] if record.status else None,
+                    "score": record.current_score,
+                    "total_score": record.total_score,
+                    "files": files,
+                    "missing": missing,
+                }
+            )
+            progress.advance(1)
+
+        manifest = {
+            "generated_at": datetime.now().strftime(TIME_FORMAT),
+            "items": items,
+        }
+        writer.add_bytes(
+            MANIFEST_NAME,
+            json.dumps(manifest, indent=2, ensure_ascii=False).encode("utf-8"),
+        )
+        writer.close()
+
+    return file_count, missing_count, content_bytes
+
+
+def export_records(
+    token: Optional[Token],
+    records: list[HomeworkRecord],
+    path: Path,
+    options: ExportOptions,
+) -> ExportSummary:
+    start = time.perf_counter()
+    fetched_count = 0
+    with span("export", items=len(records), format=options.format):
+        if options.fetch_missing and token is not None:
+            print(f"--- step: fetch missing files for {len(records)} item(s) ---")
+            fetched_count = fetch_missing_artifacts(
+                token, records, options.include_audio, options.concurrency
+            )
+        elif options.fetch_missing:
+            print("<warning> not logged in; exporting cached files only")
+
+        print(f"--- step: write {options.format} archive ---")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                file_count, missing_count, content_bytes = write_archive(
+                    records, f, options.format, options.include_audio
+                )
+            os.replace(tmp_path, path)
+        finally:
+            # a failed or cancelled export leaves no partial archive behind
+            tmp_path.unlink(missing_ok=True)
+
+    return ExportSummary(
+        items=len(records),
+        files=file_count,
+        fetched=fetched_count,
+        missing=missing_count,
+        content_bytes=content_bytes,
+        seconds=time.perf_counter() - start,
+    )
+
+
+def get_export_path(format: str) -> Path:
+    return (
+        EXPORT_DIR
+        / f"ehh_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}{ARCHIVE_FORMATS[format]}"
+    )
+
+
+def parse_export_args(
+    account: Optional[str],
+    args: list[str],
+    flags: dict[str, str],
+    options: ExportOptions,
+) -> list[HomeworkRecord]:
+    # positional ids pick items directly, otherwise the list filters select
+    # from the store; --format, --audio, --no-audio and --no-fetch adjust
+    # options in place. raises ValueError with a message fit for the user
+    if "format" in flags:
+        if flags["format"] not in ARCHIVE_FORMATS:
+            raise ValueError(
+                f"unknown archive format: {flags['format']}; supported: {', '.join(ARCHIVE_FORMATS)}"
+            )
+        options.format = flags["format"]
+    if "audio" in flags:
+        options.include_audio = True
+    if "no-audio" in flags:
+        options.include_audio = False
+    if "no-fetch" in flags:
+        options.fetch_missing = False
+
+    if len(args) == 0:
+        return query_records(account, **parse_record_filters(flags))
+
+    records = []
+    for arg in args:
+        store_id = try_parse_int(arg.lstrip("#"))
+        if store_id is None:
+            raise ValueError(f"invalid homework id: {arg}")
+        record = get_record(account, store_id)
+        if record is None:
+            raise ValueError(f"no homework with id {store_id}")
+        records.append(record)
+    return records
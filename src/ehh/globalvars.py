@@ -1,3 +1,44 @@
+import contextvars
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
 from .utils.context.base import Context
 
-context: Context = None  # type: ignore
+# the context for the current thread or asyncio task; asyncio tasks and
+# run_in_executor calls made through contextvars.copy_context() inherit it
+_context_var: contextvars.ContextVar[Optional[Context]] = contextvars.ContextVar(
+    "ehh_context", default=None
+)
+# process-wide fallback for threads that were started without a copied
+# context (plain threading.Thread does not inherit context variables)
+_default_context: Optional[Context] = None
+
+
+def get_context() -> Context:
+    return _context_var.get() or _default_context  # type: ignore
+
+
+def set_default_context(context: Context) -> None:
+    global _default_context
+    _default_context = context
+
+
+def get_default_context() -> Optional[Context]:
+    return _default_context
+
+
+def set_context(context: Context) -> contextvars.Token:
+    return _context_var.set(context)
+
+
+def reset_context(token: contextvars.Token) -> None:
+    _context_var.reset(token)
+
+
+@contextmanager
+def use_context(context: Optional[Context]) -> Iterator[None]:
+    token = _context_var.set(context)
+    try:
+        yield
+    finally:
+        _context_var.reset(token)
@@ -0,0 +1,241 @@
+import asyncio
+import contextvars
+import functools
+import itertools
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Awaitable, Callable, Optional
+
+from munch import Munch
+
+from .utils.logging import get_logger
+from .utils.metrics import JOBS, JOBS_FINISHED
+from .utils.tracing import span
+
+logger = get_logger(__name__)
+
+# finished jobs kept per chat for /jobs
+JOB_HISTORY_SIZE = 10
+
+
+class JobState(Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+@dataclass
+class Job:
+    id: int
+    chat_id: int | str
+    description: str
+    cpu: bool
+    state: JobState = JobState.QUEUED
+    created_at: float = field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    task: Optional[asyncio.Task] = None
+
+    @property
+    def is_active(self) -> bool:
+        return self.state in (JobState.QUEUED, JobState.RUNNING)
+
+    @property
+    def elapsed(self) -> Optional[float]:
+        if self.started_at is None:
+            return None
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def describe(self) -> str:
+        elapsed = self.elapsed
+        if elapsed is None:
+            elapsed_text = ""
+        elif self.state == JobState.RUNNING:
+            elapsed_text = f", {elapsed:.0f}s"
+        else:
+            elapsed_text = f", took {elapsed:.1f}s"
+        return f"#{self.id} {self.description} ({self.state.value}{elapsed_text})"
+
+
+class JobExecutor:
+    def __init__(
+        self,
+        notify: Callable[[int | str, str], None],
+        io_workers: int = 4,
+        cpu_workers: int = 1,
+        per_chat: int = 2,
+    ) -> None:
+        self.notify = notify
+        self.io_workers = io_workers
+        self.cpu_workers = cpu_workers
+        self.per_chat = per_chat
+
+        self._thread_pool = ThreadPoolExecutor(
+            max_workers=io_workers, thread_name_prefix="ehh-job"
+        )
+        # created on first use; whisper and torch do not survive fork(), so
+        # workers are always spawned
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._ids = itertools.count(1)
+        self._jobs: dict[int | str, list[Job]] = {}
+        self._slots: dict[int | str, asyncio.Semaphore] = {}
+        self._closing = False
+        for state in (JobState.QUEUED, JobState.RUNNING):
+            JOBS.set_function(functools.partial(self._count, state), state=state.value)
+
+    @classmethod
+    def from_config(
+        cls, notify: Callable[[int | str, str], None], config: Munch
+    ) -> "JobExecutor":
+        jobs_config = getattr(config, "jobs", None)
+        return cls(
+            notify,
+            io_workers=getattr(jobs_config, "io_workers", None) or 4,
+            cpu_workers=getattr(jobs_config, "cpu_workers", None) or 1,
+            per_chat=getattr(jobs_config, "per_chat", None) or 2,
+        )
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=self.cpu_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._process_pool
+
+    async def run_blocking(self, func: Callable, *args) -> Any:
+        # short blocking calls whose result the handler replies with directly;
+        # they run off the event loop but are not tracked as jobs
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(self._thread_pool, ctx.run, func, *args)
+
+    def submit(
+        self,
+        chat_id: int | str,
+        description: str,
+        func: Callable,
+        *args,
+        cpu: bool = False,
+        on_done: Optional[Callable[[Any], Awaitable[None]]] = None,
+    ) -> Job:
+        job = Job(id=next(self._ids), chat_id=chat_id, description=description, cpu=cpu)
+        history = self._jobs.setdefault(chat_id, [])
+        history.append(job)
+        self._trim_history(history)
+
+        job.task = asyncio.get_running_loop().create_task(
+            self._run(job, func, args, on_done)
+        )
+        return job
+
+    async def _run(
+        self,
+        job: Job,
+        func: Callable,
+        args: tuple,
+        on_done: Optional[Callable[[Any], Awaitable[None]]],
+    ) -> None:
+        slots = self._slots.get(job.chat_id, None)
+        if slots is None:
+            slots = asyncio.Semaphore(self.per_chat)
+            self._slots[job.chat_id] = slots
+
+        try:
+            async with slots:
+                job.state = JobState.RUNNING
+                job.started_at = time.monotonic()
+                logger.debug("job %d started: %s", job.id, job.description)
+
+                loop = asyncio.get_running_loop()
+                # jobs get a track of their own in the trace, since process
+                # pool work leaves no spans of its own
+                with span(
+                    job.description,
+                    "job",
+                    track=f"job #{job.id}",
+                    chat_id=job.chat_id,
+                    cpu=job.cpu,
+                ):
+                    if job.cpu:
+                        # arguments and results are pickled; func must be a
+                        # plain module-level function that does not need the
+                        # context
+                        result = await loop.run_in_executor(
+                            self._get_process_pool(), func, *args
+                        )
+                    else:
+                        ctx = contextvars.copy_context()
+                        result = await loop.run_in_executor(
+                            self._thread_pool, ctx.run, func, *args
+                        )
+
+                if on_done is not None:
+                    await on_done(result)
+        except asyncio.CancelledError:
+            job.state = JobState.CANCELLED
+            job.finished_at = time.monotonic()
+            JOBS_FINISHED.inc(state=job.state.value)
+            if not self._closing:
+                self.notify(job.chat_id, f"🚫 Job {job.describe()}")
+            return
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                # a worker died (e.g. out of memory); start fresh next time
+                self._process_pool = None
+            job.state = JobState.FAILED
+            job.error = str(e)
+            job.finished_at = time.monotonic()
+            JOBS_FINISHED.inc(state=job.state.value)
+            logger.warning("job %d failed: %s", job.id, e)
+            self.notify(job.chat_id, f"❌ Job {job.describe()}: {e}")
+            return
+
+        job.state = JobState.DONE
+        job.finished_at = time.monotonic()
+        JOBS_FINISHED.inc(state=job.state.value)
+        logger.debug("job %d finished: %s", job.id, job.description)
+        self.notify(job.chat_id, f"✅ Job {job.describe()}")
+
+    def _count(self, state: JobState) -> int:
+        return sum(
+            job.state == state for history in self._jobs.values() for job in history
+        )
+
+    def _trim_history(self, history: list[Job]) -> None:
+        finished = [job for job in history if not job.is_active]
+        for job in finished[: max(0, len(finished) - JOB_HISTORY_SIZE)]:
+            history.remove(job)
+
+    def list_jobs(self, chat_id: int | str) -> list[Job]:
+        return list(self._jobs.get(chat_id, []))
+
+    def cancel(self, chat_id: int | str, job_id: Optional[int] = None) -> list[Job]:
+        # a queued job is dropped before it starts; a running one is detached
+        # and its result discarded, since threads and pool workers cannot be
+        # interrupted mid-call
+        cancelled = []
+        for job in self._jobs.get(chat_id, []):
+            if not job.is_active or (job_id is not None and job.id != job_id):
+                continue
+            if job.task is not None and job.task.cancel():
+                cancelled.append(job)
+        return cancelled
+
+    def shutdown(self) -> None:
+        self._closing = True
+        for history in self._jobs.values():
+            for job in history:
+                if job.task is not None:
+                    job.task.cancel()
+        self._thread_pool.shutdown(wait=False, cancel_futures=True)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
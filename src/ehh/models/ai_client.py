@@ -1,8 +1,12 @@
+from typing import TYPE_CHECKING, Optional
+
 from munch import Munch
-from openai import OpenAI
 
 from ..utils.convert import mask_string_middle
 
+if TYPE_CHECKING:
+    from openai import OpenAI
+
 
 # TODO: add multiple types of AIClient: ollama, openai
 class AIClient:
@@ -11,7 +15,6 @@ class AIClient:
     api_key: str
     models: list[str]
     selected_model_index: int
-    client: OpenAI
 
     def __init__(
         self, kind: str, api_url: str, api_key: str, models: list[str], sel_model: int
@@ -21,7 +24,17 @@ class AIClient:
         self.api_key = api_key
         self.models = models
         self.selected_model_index = sel_model
-        self.client = OpenAI(api_key=self.api_key, base_url=self.api_url)
+        self._client: Optional["OpenAI"] = None
+
+    @property
+    def client(self) -> "OpenAI":
+        # the openai package takes a good while to import; only pay for it
+        # when a request is actually made
+        if self._client is None:
+            from openai import OpenAI
+
+            self._client = OpenAI(api_key=self.api_key, base_url=self.api_url)
+        return self._client
 
     @classmethod
     def from_dict(cls, data: Munch):
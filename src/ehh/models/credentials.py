@@ -14,5 +14,9 @@ class Credentials:
     def from_dict(cls, data: Munch):
         return cls(data.school, data.username, data.password)
 
+    def account_key(self) -> str:
+        # identifies the account in local state (saved sessions, the store)
+        return f"{self.school}/{self.username}"
+
     def describe(self) -> str:
         return f"{self.school} / {self.username} / {mask_string_middle(self.password)}"
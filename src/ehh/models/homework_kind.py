@@ -4,3 +4,10 @@ from enum import Enum
 class HomeworkKind(Enum):
     QUESTIONS = "Questions"
     TRANSLATION = "Translation"
+
+    @classmethod
+    def from_name(cls, name: str):
+        for member in cls:
+            if member.value.lower() == name.lower():
+                return member
+        return None
@@ -20,5 +20,7 @@ class HomeworkRecord:
     api_task_paper_id: str | None = None
     api_batch_id: str | None = None
     api_sentence_id: str | None = None
+    # stable id assigned by the local homework store
+    store_id: int | None = None
     # start_time: str | None = None
     # end_time: str | None = None
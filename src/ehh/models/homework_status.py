@@ -7,3 +7,10 @@ class HomeworkStatus(Enum):
     NOT_COMPLETED = (0, "未完成")
     MAKE_UP = (5, "需补做")
     UNKNOWN = (None, "未知")
+
+    @classmethod
+    def from_name(cls, name: str):
+        for member in cls:
+            if name.lower() in (member.name.lower(), member.value[1]):
+                return member
+        return None
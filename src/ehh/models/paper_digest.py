@@ -0,0 +1,18 @@
+from dataclasses import dataclass, field
+
+
+@dataclass
+class PaperDigest:
+    text: str
+    audio_urls: list[str] = field(default_factory=list)
+    media_urls: list[str] = field(default_factory=list)
+    question_anchors: list[str] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(
+            data["text"],
+            data.get("audio_urls", []),
+            data.get("media_urls", []),
+            data.get("question_anchors", []),
+        )
@@ -0,0 +1,147 @@
+import contextvars
+import itertools
+import queue
+import threading
+from typing import Optional
+
+from munch import Munch
+
+from .models.homework_record import HomeworkRecord
+from .models.homework_status import HomeworkStatus
+from .models.token import Token
+from .tasks import cache_audio, cache_text_content
+from .utils.logging import get_logger, print
+from .utils.rate_limit import TokenBucket
+
+logger = get_logger(__name__)
+
+STAGE_TEXT = 0
+STAGE_AUDIO = 1
+
+_STATUS_PRIORITY = {
+    HomeworkStatus.NOT_COMPLETED: 0,
+    HomeworkStatus.MAKE_UP: 0,
+    HomeworkStatus.IN_PROGRESS: 1,
+}
+
+
+def _get_priority(record: HomeworkRecord, stage: int) -> tuple:
+    # open homework first, newest first, and text before audio since it is
+    # cheap and usually what gets asked for first
+    return (
+        _STATUS_PRIORITY.get(record.status, 2),  # type: ignore
+        stage,
+        -record.publish_time.timestamp(),
+    )
+
+
+class Prefetcher:
+    def __init__(
+        self,
+        token: Token,
+        concurrency: int = 2,
+        bandwidth_kbps: Optional[float] = None,
+        include_audio: bool = True,
+        max_items: Optional[int] = None,
+    ) -> None:
+        self.token = token
+        self.concurrency = concurrency
+        self.include_audio = include_audio
+        self.max_items = max_items
+        self.rate_limiter = (
+            TokenBucket(bandwidth_kbps * 1024) if bandwidth_kbps else None
+        )
+
+        self._queue: queue.PriorityQueue = queue.PriorityQueue()
+        self._counter = itertools.count()
+        self._seen: set[tuple[int, str]] = set()
+        self._seen_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._workers: list[threading.Thread] = []
+
+    @classmethod
+    def from_config(cls, token: Token, config: Munch) -> Optional["Prefetcher"]:
+        prefetch_config = getattr(config, "prefetch", None)
+        if prefetch_config is None or not getattr(prefetch_config, "enabled", False):
+            return None
+
+        return cls(
+            token,
+            concurrency=getattr(prefetch_config, "concurrency", None) or 2,
+            bandwidth_kbps=getattr(prefetch_config, "bandwidth_kbps", None),
+            include_audio=getattr(prefetch_config, "audio", True),
+            max_items=getattr(prefetch_config, "max_items", None),
+        )
+
+    def start(self) -> None:
+        if len(self._workers) > 0:
+            return
+
+        for index in range(self.concurrency):
+            # each worker runs in its own copy of the starting context, so it
+            # reports through the messenger of whoever started the prefetcher
+            worker = threading.Thread(
+                target=contextvars.copy_context().run,
+                args=(self._run,),
+                name=f"ehh-prefetch-{index}",
+                daemon=True,
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        for _ in self._workers:
+            self._queue.put(((-1,), next(self._counter), None, None))
+        for worker in self._workers:
+            worker.join(timeout=1)
+        self._workers.clear()
+
+    def schedule(self, hw_list: list[HomeworkRecord]) -> int:
+        records = sorted(hw_list, key=lambda r: _get_priority(r, STAGE_TEXT))
+        if self.max_items is not None:
+            records = records[: self.max_items]
+
+        stages = [STAGE_TEXT, STAGE_AUDIO] if self.include_audio else [STAGE_TEXT]
+        scheduled_count = 0
+        with self._seen_lock:
+            for record in records:
+                for stage in stages:
+                    key = (stage, record.title)
+                    if key in self._seen:
+                        continue
+                    self._seen.add(key)
+                    self._queue.put(
+                        (
+                            _get_priority(record, stage),
+                            next(self._counter),
+                            stage,
+                            record,
+                        )
+                    )
+                    scheduled_count += 1
+
+        return scheduled_count
+
+    @property
+    def pending_count(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            _, _, stage, record = self._queue.get()
+            if record is None:
+                return
+
+            try:
+                if stage == STAGE_TEXT:
+                    if cache_text_content(self.token, record):
+                        logger.debug("prefetched text for '%s'", record.title)
+                elif stage == STAGE_AUDIO:
+                    if cache_audio(self.token, record, self.rate_limiter):
+                        logger.debug("prefetched audio for '%s'", record.title)
+            except Exception as e:
+                # allow a later schedule() call to retry this item
+                with self._seen_lock:
+                    self._seen.discard((stage, record.title))
+                print(f"<warning> prefetch failed for '{record.title}': {e}")
@@ -2,21 +2,29 @@
 # -*- coding: utf-8 -*-
 
 
+import argparse
+import asyncio
 import json
 import shlex
-from typing import Optional
+import signal
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Optional
 
 import httpx
 from prompt_toolkit import PromptSession
-from prompt_toolkit.shortcuts import choice
-from rich import traceback
+from prompt_toolkit.patch_stdout import patch_stdout
 
 from . import globalvars
+from .export import ExportOptions, export_records, get_export_path, parse_export_args
+from .jobs import Job, JobExecutor
 from .models.ai_client import AIClient
 from .models.credentials import Credentials
+from .models.homework_kind import HomeworkKind
 from .models.homework_record import HomeworkRecord
 from .models.homework_status import HomeworkStatus
 from .models.token import Token
+from .prefetch import Prefetcher
 from .tasks import (
     download_audio,
     download_text_content,
@@ -28,24 +36,958 @@ from .tasks import (
     get_text_content,
     login,
     print_hw_list,
+    print_search_hits,
     start_hw,
     submit_answers,
+    sync_search_index,
     transcribe_audio,
 )
 from .utils.config import load_config, migrate_config_if_needed, save_config
 from .utils.constants import BASE_URL, COMPLETION_WORD_MAP
 from .utils.context.impl.api_context import APIContext
 from .utils.context.impl.console_messenger import ConsoleMessenger
-from .utils.convert import try_parse_int
+from .utils.context.impl.job_messenger import JobMessenger
+from .utils.convert import split_flags, try_parse_date, try_parse_int
 from .utils.crypto import encodeb64_safe
 from .utils.fs import CACHE_DIR
-from .utils.logging import patch_whisper_transcribe_progress, print, print_and_copy_path
-from .utils.prompt import ReplCompleter, prompt_for_yn
+from .utils.homework_store import (
+    count_records,
+    get_hw_ids,
+    get_record,
+    parse_record_filters,
+    query_records,
+)
+from .utils.http import create_http_client
+from .utils.logging import (
+    configure_logging,
+    patch_whisper_transcribe_progress,
+    print,
+    print_and_copy_path,
+)
+from .utils.metrics import REGISTRY
+from .utils.profiling import (
+    ProfileBusyError,
+    ProfileResult,
+    describe_profile,
+    profile_call,
+)
+from .utils.prompt import (
+    ReplCompleter,
+    prompt,
+    prompt_async,
+    prompt_choice,
+    prompt_for_yn,
+)
+from .utils.search_index import search
+from .utils.session_state import clear_sessions, load_session
+from .utils.tracing import disable_tracing, enable_tracing, get_trace_path, span
+
+# owner key for the repl's jobs in the shared job executor
+REPL_JOB_OWNER = "repl"
+# rows per page of the list command
+LIST_PAGE_SIZE = 20
+
+# commands, or (command, subcommand) pairs, that run as background jobs;
+# everything else, including anything that prompts, stays in the foreground
+BACKGROUND_COMMANDS = {
+    ("export",),
+    ("audio", "download"),
+    ("audio", "transcribe"),
+    ("text", "download"),
+    ("answers", "download"),
+    ("answers", "download_from_paper"),
+    ("answers", "generate"),
+}
+
+
+@dataclass
+class ReplState:
+    session: PromptSession
+    jobs: JobExecutor
+    hw_list: list[HomeworkRecord] = field(default_factory=list)
+    ai_client: Optional[AIClient] = None
+    token: Optional[Token] = None
+    # Credentials.account_key of the selected account; scopes the store
+    account: Optional[str] = None
+    prefetcher: Optional[Prefetcher] = None
+    job_messengers: dict[int, JobMessenger] = field(default_factory=dict)
+    running: bool = True
+    # started from persisted state; logins then persist their session
+    warm_start: bool = False
+
+
+def _refresh_hw_list(state: ReplState) -> bool:
+    _hw_list = get_hw_list(state.token, state.account)  # type: ignore
+    if _hw_list is None:
+        print("<error> failed to retrieve homework list")
+        return False
+
+    print("<info> updated homework list")
+    state.hw_list = _hw_list
+
+    if state.prefetcher is None:
+        state.prefetcher = Prefetcher.from_config(
+            state.token, globalvars.get_context().config  # type: ignore
+        )
+        if state.prefetcher is not None:
+            state.prefetcher.start()
+            print("<info> background prefetch enabled")
+    if state.prefetcher is not None:
+        state.prefetcher.token = state.token  # type: ignore
+        state.prefetcher.schedule(state.hw_list)
+    return True
+
+
+def _refresh_session(state: ReplState, credentials: Credentials, relogin: bool) -> None:
+    # runs as a background job after a warm start
+    if not relogin:
+        if _refresh_hw_list(state):
+            return
+        # the gateway can revoke a token before its expiry time
+        print("<info> restored session rejected; logging in")
+    token = login(credentials, persist_session=True)
+    if token is None:
+        print("<error> failed to login; keeping the restored session")
+        return
+    state.token = token
+    print(f"<success> logged in with credentials: {credentials.describe()}")
+    _refresh_hw_list(state)
+
+
+def _warm_start(state: ReplState, credentials: Credentials) -> None:
+    session = load_session(credentials)
+    if session is not None:
+        state.token = session.token
+    state.account = credentials.account_key()
+    state.hw_list = query_records(state.account)
+    state.warm_start = True
+    print(
+        f"<info> warm start: restored {'no ' if session is None else ''}session and "
+        f"{len(state.hw_list)} stored homework item(s) for {credentials.describe()}"
+    )
+
+    _submit_background(
+        state,
+        "refresh session",
+        _refresh_session,
+        state,
+        credentials,
+        session is None or session.is_expired,
+    )
 
 
-def main():
-    globalvars.context = APIContext(
-        messenger=ConsoleMessenger(), http_client=httpx.Client(base_url=BASE_URL)
+def page_hw_list(state: ReplState, filters: dict, page: int, interactive: bool) -> None:
+    # only the rows of the current page are queried and rendered, so a page
+    # costs the same however much history the store holds
+    total = count_records(state.account, **filters)
+    if total == 0:
+        print("<info> no homework items found")
+        return
+    page_count = (total + LIST_PAGE_SIZE - 1) // LIST_PAGE_SIZE
+    page = min(max(page, 1), page_count)
+
+    while True:
+        records = query_records(
+            state.account,
+            limit=LIST_PAGE_SIZE,
+            offset=(page - 1) * LIST_PAGE_SIZE,
+            **filters,
+        )
+        print_hw_list(
+            records, f"Homework List (page {page}/{page_count}, {total} items)"
+        )
+        if not interactive or page_count == 1:
+            return
+
+        while True:
+            answer = (
+                prompt(state.session, f"page [n]ext/[p]rev/[1-{page_count}]/[q]uit: ")
+                .strip()
+                .lower()
+            )
+            if answer in ("q", "quit"):
+                return
+            if answer in ("", "n", "next"):
+                if page == page_count:
+                    return
+                page += 1
+            elif answer in ("p", "prev"):
+                page = max(page - 1, 1)
+            else:
+                target = try_parse_int(answer)
+                if target is None or not 1 <= target <= page_count:
+                    print("<error> argument invalid")
+                    continue
+                page = target
+            break
+
+
+def _get_record(state: ReplState, arg: str) -> Optional[HomeworkRecord]:
+    if state.account is None:
+        print("<error> no account selected; run 'account login' first")
+        return None
+    store_id = try_parse_int(arg.lstrip("#"))
+    if store_id is None:
+        print("<error> argument invalid")
+        return None
+    record = get_record(state.account, store_id)
+    if record is None:
+        print(f"<error> no homework with id {store_id}; run 'list' to fetch it")
+    return record
+
+
+def _is_background(state: ReplState, input_parts: list[str]) -> bool:
+    if (
+        tuple(input_parts[:1]) not in BACKGROUND_COMMANDS
+        and tuple(input_parts[:2]) not in BACKGROUND_COMMANDS
+    ):
+        return False
+    # generating without a login asks whether the homework has audio
+    if input_parts[1:2] == ["generate"] and state.token is None:
+        return False
+    return True
+
+
+def _describe_progress(messenger: Optional[JobMessenger]) -> str:
+    task = messenger.current_progress if messenger is not None else None
+    if task is None:
+        return "-"
+    fraction = task.fraction
+    if fraction is None:
+        return f"{task.description} {task.completed:.0f}"
+    return f"{task.description} {fraction * 100:.0f}%"
+
+
+def print_jobs(state: ReplState) -> None:
+    jobs = state.jobs.list_jobs(REPL_JOB_OWNER)
+    # forget messengers of jobs that dropped out of the history
+    job_ids = {job.id for job in jobs}
+    for job_id in list(state.job_messengers):
+        if job_id not in job_ids:
+            del state.job_messengers[job_id]
+
+    if len(jobs) == 0:
+        print("<info> no background jobs")
+        return
+
+    rows = []
+    for job in jobs:
+        elapsed = job.elapsed
+        rows.append(
+            (
+                str(job.id),
+                job.description,
+                job.state.value,
+                _describe_progress(state.job_messengers.get(job.id, None)),
+                f"{elapsed:.0f}s" if elapsed is not None else "-",
+            )
+        )
+
+    globalvars.get_context().messenger.send_table(
+        title="Background Jobs",
+        columns=[
+            ("ID", "cyan", "right"),
+            ("Command", "white"),
+            ("State", "magenta"),
+            ("Progress", "green"),
+            ("Time", "yellow", "right"),
+        ],
+        rows=rows,
+    )
+
+
+def _select_jobs(state: ReplState, args: list[str]) -> Optional[list[Job]]:
+    jobs = [job for job in state.jobs.list_jobs(REPL_JOB_OWNER) if job.is_active]
+    if len(args) < 1:
+        return jobs
+
+    job_id = try_parse_int(args[0].lstrip("#"))
+    if job_id is None:
+        print("<error> argument invalid")
+        return None
+    return [job for job in jobs if job.id == job_id]
+
+
+async def wait_jobs(state: ReplState, args: list[str]) -> None:
+    jobs = _select_jobs(state, args)
+    if jobs is None:
+        return
+    if len(jobs) == 0:
+        print("<info> no matching active jobs")
+        return
+
+    waiter = asyncio.ensure_future(asyncio.wait([job.task for job in jobs]))  # type: ignore
+    loop = asyncio.get_running_loop()
+    # ctrl-c stops waiting; the jobs keep running
+    try:
+        loop.add_signal_handler(signal.SIGINT, waiter.cancel)
+    except (NotImplementedError, RuntimeError):
+        pass
+    try:
+        await waiter
+    except asyncio.CancelledError:
+        print("<warning> stopped waiting; jobs are still running")
+    finally:
+        try:
+            loop.remove_signal_handler(signal.SIGINT)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+
+def cancel_jobs(state: ReplState, args: list[str]) -> None:
+    jobs = _select_jobs(state, args)
+    if jobs is None:
+        return
+
+    cancelled = 0
+    for job in jobs:
+        cancelled += len(state.jobs.cancel(REPL_JOB_OWNER, job.id))
+    if cancelled == 0:
+        print("<info> no matching active jobs")
+        return
+    print(f"<info> cancelling {cancelled} job(s)")
+
+
+def print_stats() -> None:
+    rows = REGISTRY.summarize()
+    if len(rows) == 0:
+        print("<info> no metrics recorded yet")
+        return
+
+    globalvars.get_context().messenger.send_table(
+        title="Metrics",
+        columns=[
+            ("Metric", "cyan"),
+            ("Labels", "magenta"),
+            ("Value", "green", "right"),
+        ],
+        rows=rows,
+    )
+
+
+def print_profile(result: ProfileResult) -> None:
+    messenger = globalvars.get_context().messenger
+    messenger.send_table(
+        title="Top Functions (cumulative)",
+        columns=[
+            ("Function", "cyan"),
+            ("Calls", "white", "right"),
+            ("Own", "yellow", "right"),
+            ("Cumulative", "green", "right"),
+        ],
+        rows=result.top_functions,
+    )
+    messenger.send_table(
+        title="Top Allocation Sites (still allocated)",
+        columns=[
+            ("Site", "cyan"),
+            ("Size", "yellow", "right"),
+            ("Blocks", "white", "right"),
+        ],
+        rows=result.top_allocations,
+    )
+    print(f"<info> {describe_profile(result)}")
+    print(f"<info> profile saved to '{result.prof_path}'")
+    print(f"<info> allocation snapshot saved to '{result.snapshot_path}'")
+
+
+def profile_command(state: ReplState, input_parts: list[str], user_input: str) -> None:
+    if len(input_parts) == 0 or input_parts[0] in (
+        "profile",
+        "jobs",
+        "wait",
+        "cancel",
+        "stats",
+    ):
+        print("<error> usage: profile <command ...>")
+        return
+
+    # in the foreground, so the tables are about this command; background
+    # jobs running meanwhile still show up in them
+    command = user_input.split(None, 1)[1]
+    try:
+        result = profile_call(command, run_command_guarded, state, input_parts, command)
+    except ProfileBusyError as e:
+        print(f"<error> {e}")
+        return
+    print_profile(result)
+
+
+async def dispatch(state: ReplState, input_parts: list[str], user_input: str) -> None:
+    match input_parts[0]:
+        case "jobs":
+            print_jobs(state)
+            return
+        case "stats":
+            print_stats()
+            return
+        case "profile":
+            profile_command(state, input_parts[1:], user_input)
+            return
+        case "wait":
+            await wait_jobs(state, input_parts[1:])
+            return
+        case "cancel":
+            cancel_jobs(state, input_parts[1:])
+            return
+
+    if not _is_background(state, input_parts):
+        run_command_guarded(state, input_parts, user_input)
+        return
+
+    _submit_background(state, user_input, run_command, state, input_parts, user_input)
+
+
+def _submit_background(
+    state: ReplState, description: str, func: Callable, *args
+) -> Job:
+    context = globalvars.get_context()
+    messenger = JobMessenger(context.messenger)
+    with globalvars.use_context(context.derive(messenger=messenger)):
+        job = state.jobs.submit(REPL_JOB_OWNER, description, func, *args)
+    # the job only starts on the next loop iteration, so the label is in
+    # place before it can print anything
+    messenger.label = f"(#{job.id})"
+    state.job_messengers[job.id] = messenger
+    print(f"<info> started background job #{job.id}: {description}")
+    return job
+
+
+def run_command_guarded(
+    state: ReplState, input_parts: list[str], user_input: str
+) -> None:
+    try:
+        with span(user_input, "command"):
+            run_command(state, input_parts, user_input)
+
+    except NotImplementedError:
+        print("<error> feature not yet implemented")
+
+    except KeyboardInterrupt:
+        print("<warning> interrupted")
+
+    except Exception:
+        print("<error> an unexpected error occurred")
+        globalvars.get_context().messenger.send_exception(None)  # type: ignore
+
+
+def run_command(state: ReplState, input_parts: list[str], user_input: str) -> None:
+    match input_parts[0]:
+        case "help":
+            print("available commands:")
+            print("  audio - download/transcribe audio of a homework item")
+            print("  text - display/download text content of a homework item")
+            print(
+                "  answers - fill in/download (from paper)/generate/submit answers for a homework item"
+            )
+            print("  help - show this help message")
+            print(
+                "  list - page through homework items by id (--status, --kind, --publisher, --since, --until, --cached, --page)"
+            )
+            print(
+                "  jobs/wait/cancel - show, wait for or cancel background jobs (downloads, transcription, generation)"
+            )
+            print("  stats - show request latencies, cache hit rates and job counts")
+            print(
+                "  profile <command> - run a command under cProfile and tracemalloc and show the hot spots"
+            )
+            print(
+                "  search - full-text search cached text & transcripts (--kind, --since, --until)"
+            )
+            print(
+                "  export [ids] - archive text, transcripts & audio with a manifest (list filters, --format zip|tar|tar.gz, --no-audio, --no-fetch)"
+            )
+            print("  account - login/logout/select default account")
+            print("  ai - select AI client & model")
+            print("  config - reload/save configuration")
+            print("  exit - exit the program")
+
+        case "list":
+            _, flags = split_flags(input_parts[1:])
+            try:
+                filters = parse_record_filters(flags)
+            except ValueError as e:
+                print(f"<error> {e}")
+                return
+
+            if state.account is None:
+                print("<error> no account selected; run 'account login' first")
+                return
+
+            # the only place the list is synced on its own; --cached (or no
+            # login) answers from the local store alone
+            if "cached" not in flags:
+                if state.token is None:
+                    print("<warning> not logged in; listing stored homework")
+                else:
+                    try:
+                        if not _refresh_hw_list(state):
+                            return
+                    except httpx.HTTPError as e:
+                        print(
+                            f"<warning> gateway unreachable ({e}); listing stored homework"
+                        )
+
+            page = try_parse_int(flags["page"]) if "page" in flags else 1
+            if page is None:
+                print("<error> argument invalid")
+                return
+            # --page shows that one page; otherwise the pager prompts
+            page_hw_list(state, filters, page, "page" not in flags)
+
+        case "search":
+            query_parts, flags = split_flags(input_parts[1:])
+            if len(query_parts) < 1:
+                print("<error> argument not enough")
+                return
+
+            kind = None
+            if "kind" in flags:
+                kind = HomeworkKind.from_name(flags["kind"])
+                if kind is None:
+                    print(f"<error> unknown kind: {flags['kind']}")
+                    return
+            since = try_parse_date(flags["since"]) if "since" in flags else None
+            until = try_parse_date(flags["until"]) if "until" in flags else None
+            if ("since" in flags and since is None) or (
+                "until" in flags and until is None
+            ):
+                print("<error> invalid date; expected format: yyyy-mm-dd")
+                return
+
+            indexed_count = sync_search_index(
+                state.hw_list or query_records(state.account)
+            )
+            if indexed_count > 0:
+                print(f"<info> indexed {indexed_count} cached file(s)")
+
+            hits = search(
+                " ".join(query_parts),
+                kind,
+                since,
+                until,
+                hw_ids=get_hw_ids(state.account),
+            )
+            if len(hits) == 0:
+                print("<info> no matches found")
+                return
+            print_search_hits(hits, state.account)
+
+        case "audio":
+            if len(input_parts) < 3:
+                print("<error> argument not enough")
+                return
+            record = _get_record(state, input_parts[2])
+            if record is None:
+                return
+
+            match input_parts[1]:
+                case "download":
+                    if state.token is None:
+                        print("<error> not logged in; cannot download audio")
+                        return
+
+                    download_audio(state.token, record)
+
+                case "transcribe":
+                    audio_file = (
+                        CACHE_DIR / f"homework_{encodeb64_safe(record.title)}_audio.mp3"
+                    )
+                    if not audio_file.is_file():
+                        print(
+                            f"<error> audio file for id {record.store_id} not found; please download it first"
+                        )
+                        return
+                    transcribe_audio(record)
+                case _:
+                    print("<error> argument invalid")
+
+        case "text":
+            if len(input_parts) < 3:
+                print("<error> argument not enough")
+                return
+            record = _get_record(state, input_parts[2])
+            if record is None:
+                return
+
+            match input_parts[1]:
+                case "display":
+                    if state.token is None:
+                        print("<error> not logged in; cannot display text")
+                        return
+
+                    print(get_text_content(state.token, record))
+                case "download":
+                    if state.token is None:
+                        print("<error> not logged in; cannot download text")
+                        return
+
+                    download_text_content(state.token, record)
+                case _:
+                    print("<error> argument invalid")
+
+        case "answers":
+            if len(input_parts) < 3:
+                print("<error> argument not enough")
+                return
+            record = _get_record(state, input_parts[2])
+            if record is None:
+                return
+
+            match input_parts[1]:
+                case "fill_in":
+                    if state.token is None:
+                        print("<error> not logged in; cannot fill in answers")
+                        return
+
+                    if record.status in [
+                        HomeworkStatus.NOT_COMPLETED,
+                        HomeworkStatus.MAKE_UP,
+                    ]:
+                        should_start = prompt_for_yn(
+                            state.session,
+                            "homework not completed or needs makeup; start it now? ",
+                        )
+                        if should_start:
+                            start_hw(state.token, record)
+
+                    answers_input = prompt(
+                        state.session, "answers file (relative path is ok): "
+                    ).strip()
+                    with open(answers_input, "rt", encoding="utf-8") as f:
+                        answers = json.load(f)
+                    expected_correct_rate_input = prompt(
+                        state.session,
+                        "expected correct rate (0.0-1.0, default 1.0): ",
+                    ).strip()
+                    expected_correct_rate = None
+                    if expected_correct_rate_input != "":
+                        try:
+                            expected_correct_rate = float(expected_correct_rate_input)
+                        except ValueError:
+                            print("<error> invalid correct rate input")
+                            return
+                        if (
+                            not (0.0 <= expected_correct_rate <= 1.0)
+                            or expected_correct_rate is None
+                        ):
+                            print("<error> correct rate out of range")
+                            return
+                    fill_in_answers(
+                        state.token,
+                        record,
+                        answers,
+                        expected_correct_rate,
+                    )
+
+                case "download":
+                    if state.token is None:
+                        print("<error> not logged in; cannot retrieve answers")
+                        return
+
+                    answers = get_answers(state.token, record)
+                    if answers is None:
+                        print("<error> no answers retrieved; cannot save to file")
+                        return
+
+                    answers_file = (
+                        CACHE_DIR
+                        / f"homework_{encodeb64_safe(record.title)}_answers.json"
+                    )
+                    with open(answers_file, "wt", encoding="utf-8") as f:
+                        f.write(json.dumps(answers, indent=4, ensure_ascii=False))
+                    print_and_copy_path(answers_file)
+
+                case "download_from_paper":
+                    if state.token is None:
+                        print("<error> not logged in; cannot retrieve answers")
+                        return
+
+                    answers = get_paper_answers(state.token, record)
+                    if answers is None:
+                        print("<error> no answers retrieved; cannot save to file")
+                        return
+
+                    answers_file = (
+                        CACHE_DIR
+                        / f"homework_{encodeb64_safe(record.title)}_answers_paper.json"
+                    )
+                    with open(answers_file, "wt", encoding="utf-8") as f:
+                        f.write(json.dumps(answers, indent=4, ensure_ascii=False))
+                    print_and_copy_path(answers_file)
+
+                case "generate":
+                    if state.ai_client is None:
+                        print("<error> no ai client selected")
+                        return
+
+                    if state.token is None:
+                        print(
+                            "<warning> not logged in, cannot determine whether hw has audio"
+                        )
+                        has_audio_manual = prompt_for_yn(
+                            state.session, "hw has audio? "
+                        )
+                    else:
+                        has_audio_manual = None
+
+                    answers = generate_answers(
+                        state.token,
+                        record,
+                        state.ai_client,
+                        has_audio_manual,
+                    )
+                    if answers is None:
+                        print("<error> failed to generate answers")
+                        return
+
+                    answers_file = (
+                        CACHE_DIR
+                        / f"homework_{encodeb64_safe(record.title)}_answers_gen.json"
+                    )
+                    with open(answers_file, "wt", encoding="utf-8") as f:
+                        f.write(json.dumps(answers, indent=4, ensure_ascii=False))
+                    print_and_copy_path(answers_file)
+
+                case "submit":
+                    if state.token is None:
+                        print("<error> not logged in; cannot submit homework")
+                        return
+
+                    submit_answers(state.token, record)
+
+                case "start":
+                    if state.token is None:
+                        print("<error> not logged in; cannot start homework")
+                        return
+
+                    start_hw(state.token, record)
+                    _hw_list = get_hw_list(state.token, state.account)  # type: ignore
+                    if _hw_list is None:
+                        print("<error> failed to retrieve homework list")
+                        return
+                    state.hw_list = _hw_list
+
+                case _:
+                    print("<error> argument invalid")
+
+        case "export":
+            positionals, flags = split_flags(input_parts[1:])
+            options = ExportOptions.from_config(globalvars.get_context().config)
+            try:
+                records = parse_export_args(state.account, positionals, flags, options)
+            except ValueError as e:
+                print(f"<error> {e}")
+                return
+            if len(records) == 0:
+                print("<info> no homework items to export")
+                return
+
+            path = get_export_path(options.format)
+            summary = export_records(state.token, records, path, options)
+            print(f"<success> {summary.describe()}")
+            print_and_copy_path(path)
+
+        case "account":
+            if len(input_parts) < 2:
+                print("<error> argument not enough")
+                return
+
+            match input_parts[1]:
+                case "login":
+                    options = list(
+                        map(
+                            lambda c: (
+                                c[0],
+                                c[1].describe(),
+                            ),
+                            enumerate(
+                                map(
+                                    lambda c: Credentials.from_dict(c),
+                                    globalvars.get_context().config.credentials.all,
+                                )
+                            ),
+                        )
+                    )  # type: ignore
+                    default = 0
+                    if isinstance(
+                        globalvars.get_context().config.credentials.selected,
+                        int,
+                    ):
+                        default = globalvars.get_context().config.credentials.selected
+                    cred_choice = prompt_choice(
+                        "select credentials to use:",
+                        options=options,
+                        default=default,
+                    )
+                    cred = Credentials.from_dict(
+                        globalvars.get_context().config.credentials.all[cred_choice]
+                    )
+                    state.token = login(cred, persist_session=state.warm_start)
+                    if state.token is None:
+                        print("<error> failed to login")
+                        return
+                    state.account = cred.account_key()
+
+                    _hw_list = get_hw_list(state.token, state.account)
+                    if _hw_list is None:
+                        print("<error> failed to retrieve homework list")
+                    # never keep showing the previous account's list
+                    state.hw_list = _hw_list or []
+
+                    print(f"<success> logged in with credentials: {cred.describe()}")
+                case "logout":
+                    state.token = None
+                    state.account = None
+                    state.hw_list = []
+                    clear_sessions()
+                    if state.prefetcher is not None:
+                        state.prefetcher.stop()
+                        state.prefetcher = None
+                    print("<success> logged out")
+
+                case "select_default":
+                    options = [("none", "disable auto login")]
+                    options.extend(
+                        map(
+                            lambda c: (
+                                c[0],
+                                c[1].describe(),
+                            ),
+                            enumerate(
+                                map(
+                                    lambda c: Credentials.from_dict(c),
+                                    globalvars.get_context().config.credentials.all,
+                                )
+                            ),
+                        )  # type: ignore
+                    )
+                    default = "none"
+                    if isinstance(
+                        globalvars.get_context().config.credentials.selected,
+                        int,
+                    ):
+                        default = globalvars.get_context().config.credentials.selected
+                    cred_choice = prompt_choice(
+                        "select default credentials to use:",
+                        options=options,
+                        default=default,
+                    )
+                    if cred_choice == "none":
+                        globalvars.get_context().config.credentials.selected = None
+                        print("<info> disabled auto login")
+                        return
+
+                    globalvars.get_context().config.credentials.selected = cred_choice
+                    cred = Credentials.from_dict(
+                        globalvars.get_context().config.credentials.all[cred_choice]
+                    )
+                    print(f"<info> selected default credentials: {cred.describe()}")
+                case _:
+                    print("<error> argument invalid")
+
+        case "ai":
+            if len(input_parts) < 2:
+                print("<error> argument not enough")
+                return
+
+            match input_parts[1]:
+                case "select_api":
+                    options = [("none", "disable AI features")]
+                    options.extend(
+                        map(
+                            lambda c: (
+                                c[0],
+                                c[1].describe(),
+                            ),
+                            enumerate(
+                                map(
+                                    lambda c: AIClient.from_dict(c),
+                                    globalvars.get_context().config.ai_client.all,
+                                )
+                            ),
+                        )  # type: ignore
+                    )
+                    default = "none"
+                    if isinstance(
+                        globalvars.get_context().config.ai_client.selected, int
+                    ):
+                        default = globalvars.get_context().config.ai_client.selected
+                    client_choice = prompt_choice(
+                        "select AI client to use:",
+                        options=options,
+                        default=default,
+                    )
+                    if client_choice == "none":
+                        state.ai_client = None
+                        globalvars.get_context().config.ai_client.selected = None
+                        print("<info> AI features disabled")
+                        return
+
+                    ai_client_conf = globalvars.get_context().config.ai_client.all[
+                        client_choice
+                    ]
+                    state.ai_client = AIClient.from_dict(ai_client_conf)
+                    globalvars.get_context().config.ai_client.selected = client_choice
+                    print(f"<info> selected AI client: {state.ai_client.describe()}")
+                case "select_model":
+                    if state.ai_client is None:
+                        print("<error> no ai client selected")
+                        return
+
+                    options = list(enumerate(state.ai_client.models))
+                    model_choice = prompt_choice(
+                        "select AI model to use:",
+                        options=options,
+                        default=state.ai_client.selected_model_index,
+                    )
+
+                    ai_client_conf = next(
+                        c
+                        for c in globalvars.get_context().config.ai_client.all
+                        if c.api_url == state.ai_client.api_url
+                        and c.api_key == state.ai_client.api_key
+                    )
+                    ai_client_conf.model.selected = model_choice
+                    state.ai_client.selected_model_index = model_choice
+                    print(f"<info> selected AI model: {state.ai_client.selected_model}")
+                case _:
+                    print("<error> argument invalid")
+
+        case "config":
+            if len(input_parts) < 2:
+                print("<error> argument not enough")
+                return
+
+            match input_parts[1]:
+                case "reload":
+                    globalvars.get_context().config = load_config()
+                    configure_logging(globalvars.get_context().config)
+                    print("<info> reloaded config file")
+                    print("<info> note: current states are not changed")
+                case "save":
+                    save_config(globalvars.get_context().config)
+                    print("<info> saved config to file")
+                case _:
+                    print("<error> argument invalid")
+
+        case "exit":
+            print("<info> exiting...")
+            if state.prefetcher is not None:
+                state.prefetcher.stop()
+            save_config(globalvars.get_context().config)
+            print("<info> saved config to file")
+            state.running = False
+
+        case _:
+            print(f"<error> unrecognized command: '{user_input}'")
+
+
+async def _main(warm_start: bool):
+    globalvars.set_default_context(
+        APIContext(
+            messenger=ConsoleMessenger(), http_client=httpx.Client(base_url=BASE_URL)
+        )
     )
 
     print("--- extensible homework helper ---")
@@ -53,24 +995,36 @@ def main():
     print("--- github: https://github.com/Ujhhgtg/extensible-homework-helper ---")
 
     print("--- step: initialize ---")
+    from rich import traceback
+
     traceback.install()
     print("<info> rich traceback installed")
     migrate_config_if_needed()
-    globalvars.context.config = load_config()
+    globalvars.get_context().config = load_config()
     print("<info> loaded config file")
+    configure_logging(globalvars.get_context().config)
+    globalvars.get_context().http_client.close()
+    globalvars.get_context().http_client = create_http_client(
+        globalvars.get_context().config
+    )
     patch_whisper_transcribe_progress()
-    print("<info> patched whisper.transcribe to use rich console")
+    print("<info> patched whisper.transcribe to report progress to the messenger")
 
-    hw_list: list[HomeworkRecord] = []
-    session: PromptSession = PromptSession()
-    ai_client: Optional[AIClient] = None
-    token: Optional[Token] = None
+    warm_start_config = getattr(globalvars.get_context().config, "warm_start", None)
+    warm_start = warm_start or getattr(warm_start_config, "enabled", False)
 
-    if globalvars.context.config.ai_client.selected is not None:
-        sel_index = globalvars.context.config.ai_client.selected
-        if 0 <= sel_index < len(globalvars.context.config.ai_client.all):
-            ai_client = AIClient.from_dict(
-                globalvars.context.config.ai_client.all[sel_index]
+    state = ReplState(
+        session=PromptSession(),
+        jobs=JobExecutor.from_config(
+            lambda _, text: print(text), globalvars.get_context().config
+        ),
+    )
+
+    if globalvars.get_context().config.ai_client.selected is not None:
+        sel_index = globalvars.get_context().config.ai_client.selected
+        if 0 <= sel_index < len(globalvars.get_context().config.ai_client.all):
+            state.ai_client = AIClient.from_dict(
+                globalvars.get_context().config.ai_client.all[sel_index]
             )
             print(f"<info> using default AI client at index {sel_index}")
         else:
@@ -78,493 +1032,97 @@ def main():
                 f"<warning> default AI client index {sel_index} out of range; falling back to no AI client"
             )
 
-    if globalvars.context.config.credentials.selected is not None:
-        sel_index = globalvars.context.config.credentials.selected
-        if 0 <= sel_index < len(globalvars.context.config.credentials.all):
+    if globalvars.get_context().config.credentials.selected is not None:
+        sel_index = globalvars.get_context().config.credentials.selected
+        if 0 <= sel_index < len(globalvars.get_context().config.credentials.all):
             cred = Credentials.from_dict(
-                globalvars.context.config.credentials.all[sel_index]
+                globalvars.get_context().config.credentials.all[sel_index]
             )
-            token = login(cred)
-            if token is None:
-                print(
-                    f"<error> login with default credentials at index {sel_index} failed"
-                )
+            if warm_start:
+                _warm_start(state, cred)
             else:
-                print(
-                    f"<info> using default credentials at index {sel_index}: {cred.describe()}"
-                )
+                # set even if login fails, so stored homework stays listable
+                state.account = cred.account_key()
+                state.token = login(cred)
+                if state.token is None:
+                    print(
+                        f"<error> login with default credentials at index {sel_index} failed"
+                    )
+                else:
+                    print(
+                        f"<info> using default credentials at index {sel_index}: {cred.describe()}"
+                    )
+                    _refresh_hw_list(state)
         else:
             print(
                 f"<warning> default credentials index {sel_index} out of range; resetting default creds and not logging in"
             )
-            globalvars.context.config.credentials.selected = None
+            globalvars.get_context().config.credentials.selected = None
     else:
         print("<warning> no default credentials provided; not logging in")
 
     print("--- entering interactive mode ---")
-    while True:
-        if token is not None:
-            _hw_list = get_hw_list(token)
-            if _hw_list is None:
-                print("<error> failed to retrieve homework list")
-            else:
-                print("<info> updated homework list")
-                hw_list = _hw_list
-
-        user_input = (
-            session.prompt(
-                "ehh> ",
-                completer=ReplCompleter(COMPLETION_WORD_MAP),
-            )
-            .strip()
-            .lower()
-        )
-        input_parts = shlex.split(user_input)
-        if len(input_parts) <= 0:
-            continue
-
+    # output from background jobs is printed above the prompt
+    with patch_stdout(raw=True):
         try:
-            match input_parts[0]:
-                case "help":
-                    print("available commands:")
-                    print("  audio - download/transcribe audio of a homework item")
-                    print("  text - display/download text content of a homework item")
-                    print(
-                        "  answers - fill in/download (from paper)/generate/submit answers for a homework item"
+            while state.running:
+                user_input = (
+                    (
+                        await prompt_async(
+                            state.session,
+                            "ehh> ",
+                            completer=ReplCompleter(COMPLETION_WORD_MAP),
+                        )
                     )
-                    print("  help - show this help message")
-                    print("  list - list all homework items")
-                    print("  account - login/logout/select default account")
-                    print("  ai - select AI client & model")
-                    print("  config - reload/save configuration")
-                    print("  exit - exit the program")
-
-                case "list":
-                    if token is None:
-                        print("<error> not logged in; cannot retrieve homework list")
-                        continue
-
-                    _hw_list = get_hw_list(token)
-                    if _hw_list is None:
-                        print("<error> failed to retrieve homework list")
-                        continue
-
-                    hw_list = _hw_list
-                    print_hw_list(hw_list)
-
-                case "audio":
-                    if len(input_parts) < 3:
-                        print("<error> argument not enough")
-                        continue
-                    index = try_parse_int(input_parts[2])
-                    if index is None:
-                        print("<error> argument invalid")
-                        continue
-
-                    if index < 0 or index >= len(hw_list):
-                        print(f"<error> index out of range: {index}")
-                        continue
-
-                    match input_parts[1]:
-                        case "download":
-                            if token is None:
-                                print("<error> not logged in; cannot download audio")
-                                continue
-
-                            download_audio(token, hw_list[index])
-
-                        case "transcribe":
-                            audio_file = (
-                                CACHE_DIR
-                                / f"homework_{encodeb64_safe(hw_list[index].title)}_audio.mp3"
-                            )
-                            if not audio_file.is_file():
-                                print(
-                                    f"<error> audio file for index {index} not found; please download it first"
-                                )
-                                continue
-                            transcribe_audio(hw_list[index])
-                        case _:
-                            print("<error> argument invalid")
-
-                case "text":
-                    if len(input_parts) < 3:
-                        print("<error> argument not enough")
-                        continue
-                    index = try_parse_int(input_parts[2])
-                    if index is None:
-                        print("<error> argument invalid")
-                        continue
-                    if index < 0 or index >= len(hw_list):
-                        print(f"<error> index out of range: {index}")
-                        continue
-
-                    match input_parts[1]:
-                        case "display":
-                            if token is None:
-                                print("<error> not logged in; cannot display text")
-                                continue
-
-                            print(get_text_content(token, hw_list[index]))
-                        case "download":
-                            if token is None:
-                                print("<error> not logged in; cannot download text")
-                                continue
-
-                            download_text_content(token, hw_list[index])
-                        case _:
-                            print("<error> argument invalid")
-
-                case "answers":
-                    if len(input_parts) < 3:
-                        print("<error> argument not enough")
-                        continue
-                    index = try_parse_int(input_parts[2])
-                    if index is None:
-                        print("<error> argument invalid")
-                        continue
-                    if index < 0 or index >= len(hw_list):
-                        print(f"<error> index out of range: {index}")
-                        continue
-
-                    match input_parts[1]:
-                        case "fill_in":
-                            if token is None:
-                                print("<error> not logged in; cannot fill in answers")
-                                continue
-
-                            hw = hw_list[index]
-                            if hw.status in [
-                                HomeworkStatus.NOT_COMPLETED,
-                                HomeworkStatus.MAKE_UP,
-                            ]:
-                                should_start = prompt_for_yn(
-                                    session,
-                                    "homework not completed or needs makeup; start it now? ",
-                                )
-                                if should_start:
-                                    start_hw(token, hw_list[index])
-
-                            answers_input = session.prompt(
-                                "answers file (relative path is ok): "
-                            ).strip()
-                            with open(answers_input, "rt", encoding="utf-8") as f:
-                                answers = json.load(f)
-                            expected_correct_rate_input = session.prompt(
-                                "expected correct rate (0.0-1.0, default 1.0): "
-                            ).strip()
-                            expected_correct_rate = None
-                            if expected_correct_rate_input != "":
-                                try:
-                                    expected_correct_rate = float(
-                                        expected_correct_rate_input
-                                    )
-                                except ValueError:
-                                    print("<error> invalid correct rate input")
-                                    continue
-                                if (
-                                    not (0.0 <= expected_correct_rate <= 1.0)
-                                    or expected_correct_rate is None
-                                ):
-                                    print("<error> correct rate out of range")
-                                    continue
-                            fill_in_answers(
-                                token, hw_list[index], answers, expected_correct_rate
-                            )
-
-                        case "download":
-                            if token is None:
-                                print("<error> not logged in; cannot retrieve answers")
-                                continue
-
-                            answers = get_answers(token, hw_list[index])
-                            if answers is None:
-                                print(
-                                    "<error> no answers retrieved; cannot save to file"
-                                )
-                                continue
-
-                            answers_file = (
-                                CACHE_DIR
-                                / f"homework_{encodeb64_safe(hw_list[index].title)}_answers.json"
-                            )
-                            with open(answers_file, "wt", encoding="utf-8") as f:
-                                f.write(
-                                    json.dumps(answers, indent=4, ensure_ascii=False)
-                                )
-                            print_and_copy_path(answers_file)
-
-                        case "download_from_paper":
-                            if token is None:
-                                print("<error> not logged in; cannot retrieve answers")
-                                continue
-
-                            answers = get_paper_answers(token, hw_list[index])
-                            if answers is None:
-                                print(
-                                    "<error> no answers retrieved; cannot save to file"
-                                )
-                                continue
-
-                            answers_file = (
-                                CACHE_DIR
-                                / f"homework_{encodeb64_safe(hw_list[index].title)}_answers_paper.json"
-                            )
-                            with open(answers_file, "wt", encoding="utf-8") as f:
-                                f.write(
-                                    json.dumps(answers, indent=4, ensure_ascii=False)
-                                )
-                            print_and_copy_path(answers_file)
-
-                        case "generate":
-                            if ai_client is None:
-                                print("<error> no ai client selected")
-                                continue
-
-                            if token is None:
-                                print(
-                                    "<warning> not logged in, cannot determine whether hw has audio"
-                                )
-                                has_audio_manual = prompt_for_yn(
-                                    session, "hw has audio? "
-                                )
-                            else:
-                                has_audio_manual = None
-
-                            answers = generate_answers(
-                                token, hw_list[index], ai_client, has_audio_manual
-                            )
-                            if answers is None:
-                                print("<error> failed to generate answers")
-                                continue
-
-                            answers_file = (
-                                CACHE_DIR
-                                / f"homework_{encodeb64_safe(hw_list[index].title)}_answers_gen.json"
-                            )
-                            with open(answers_file, "wt", encoding="utf-8") as f:
-                                f.write(
-                                    json.dumps(answers, indent=4, ensure_ascii=False)
-                                )
-                            print_and_copy_path(answers_file)
-
-                        case "submit":
-                            if token is None:
-                                print("<error> not logged in; cannot submit homework")
-                                continue
-
-                            submit_answers(token, hw_list[index])
-
-                        case "start":
-                            if token is None:
-                                print("<error> not logged in; cannot start homework")
-                                continue
-
-                            start_hw(token, hw_list[index])
-                            _hw_list = get_hw_list(token)
-                            if _hw_list is None:
-                                print("<error> failed to retrieve homework list")
-                                continue
-                            hw_list = _hw_list
-
-                        case _:
-                            print("<error> argument invalid")
-
-                case "account":
-                    if len(input_parts) < 2:
-                        print("<error> argument not enough")
-                        continue
-
-                    match input_parts[1]:
-                        case "login":
-                            options = list(
-                                map(
-                                    lambda c: (
-                                        c[0],
-                                        c[1].describe(),
-                                    ),
-                                    enumerate(
-                                        map(
-                                            lambda c: Credentials.from_dict(c),
-                                            globalvars.context.config.credentials.all,
-                                        )
-                                    ),
-                                )
-                            )  # type: ignore
-                            default = 0
-                            if isinstance(
-                                globalvars.context.config.credentials.selected, int
-                            ):
-                                default = globalvars.context.config.credentials.selected
-                            cred_choice = choice(
-                                "select credentials to use:",
-                                options=options,
-                                default=default,
-                            )
-                            cred = Credentials.from_dict(
-                                globalvars.context.config.credentials.all[cred_choice]
-                            )
-                            token = login(cred)
-                            if token is None:
-                                print("<error> failed to login")
-                                continue
-
-                            _hw_list = get_hw_list(token)
-                            if _hw_list is None:
-                                print("<error> failed to retrieve homework list")
-
-                            print(
-                                f"<success> logged in with credentials: {cred.describe()}"
-                            )
-                        case "logout":
-                            token = None
-                            print("<success> logged out")
-
-                        case "select_default":
-                            options = [("none", "disable auto login")]
-                            options.extend(
-                                map(
-                                    lambda c: (
-                                        c[0],
-                                        c[1].describe(),
-                                    ),
-                                    enumerate(
-                                        map(
-                                            lambda c: Credentials.from_dict(c),
-                                            globalvars.context.config.credentials.all,
-                                        )
-                                    ),
-                                )  # type: ignore
-                            )
-                            default = "none"
-                            if isinstance(
-                                globalvars.context.config.credentials.selected, int
-                            ):
-                                default = globalvars.context.config.credentials.selected
-                            cred_choice = choice(
-                                "select default credentials to use:",
-                                options=options,
-                                default=default,
-                            )
-                            if cred_choice == "none":
-                                globalvars.context.config.credentials.selected = None
-                                print("<info> disabled auto login")
-                                continue
-
-                            globalvars.context.config.credentials.selected = cred_choice
-                            cred = Credentials.from_dict(
-                                globalvars.context.config.credentials.all[cred_choice]
-                            )
-                            print(
-                                f"<info> selected default credentials: {cred.describe()}"
-                            )
-                        case _:
-                            print("<error> argument invalid")
-
-                case "ai":
-                    if len(input_parts) < 2:
-                        print("<error> argument not enough")
-                        continue
-
-                    match input_parts[1]:
-                        case "select_api":
-                            options = [("none", "disable AI features")]
-                            options.extend(
-                                map(
-                                    lambda c: (
-                                        c[0],
-                                        c[1].describe(),
-                                    ),
-                                    enumerate(
-                                        map(
-                                            lambda c: AIClient.from_dict(c),
-                                            globalvars.context.config.ai_client.all,
-                                        )
-                                    ),
-                                )  # type: ignore
-                            )
-                            default = "none"
-                            if isinstance(
-                                globalvars.context.config.ai_client.selected, int
-                            ):
-                                default = globalvars.context.config.ai_client.selected
-                            client_choice = choice(
-                                "select AI client to use:",
-                                options=options,
-                                default=default,
-                            )
-                            if client_choice == "none":
-                                ai_client = None
-                                globalvars.context.config.ai_client.selected = None
-                                print("<info> AI features disabled")
-                                continue
-
-                            ai_client_conf = globalvars.context.config.ai_client.all[
-                                client_choice
-                            ]
-                            ai_client = AIClient.from_dict(ai_client_conf)
-                            globalvars.context.config.ai_client.selected = client_choice
-                            print(f"<info> selected AI client: {ai_client.describe()}")
-                        case "select_model":
-                            if ai_client is None:
-                                print("<error> no ai client selected")
-                                continue
-
-                            options = list(enumerate(ai_client.models))
-                            model_choice = choice(
-                                "select AI model to use:",
-                                options=options,
-                                default=ai_client.selected_model_index,
-                            )
-
-                            ai_client_conf = next(
-                                c
-                                for c in globalvars.context.config.ai_client.all
-                                if c.api_url == ai_client.api_url
-                                and c.api_key == ai_client.api_key
-                            )
-                            ai_client_conf.model.selected = model_choice
-                            ai_client.selected_model_index = model_choice
-                            print(
-                                f"<info> selected AI model: {ai_client.selected_model}"
-                            )
-                        case _:
-                            print("<error> argument invalid")
-
-                case "config":
-                    if len(input_parts) < 2:
-                        print("<error> argument not enough")
-                        continue
-
-                    match input_parts[1]:
-                        case "reload":
-                            globalvars.context.config = load_config()
-                            print("<info> reloaded config file")
-                            print("<info> note: current states are not changed")
-                        case "save":
-                            save_config(globalvars.context.config)
-                            print("<info> saved config to file")
-                        case _:
-                            print("<error> argument invalid")
-
-                case "exit":
-                    print("<info> exiting...")
-                    save_config(globalvars.context.config)
-                    print("<info> saved config to file")
-                    break
-
-                case _:
-                    print(f"<error> unrecognized command: '{user_input}'")
+                    .strip()
+                    .lower()
+                )
+                input_parts = shlex.split(user_input)
+                if len(input_parts) <= 0:
+                    continue
 
-        except NotImplementedError:
-            print("<error> feature not yet implemented")
+                await dispatch(state, input_parts, user_input)
+        finally:
+            active_jobs = [
+                job for job in state.jobs.list_jobs(REPL_JOB_OWNER) if job.is_active
+            ]
+            if len(active_jobs) > 0:
+                print(f"<warning> cancelling {len(active_jobs)} background job(s)")
+            state.jobs.shutdown()
 
-        except KeyboardInterrupt:
-            print("<warning> interrupted")
 
-        except Exception:
-            print("<error> an unexpected error occurred")
-            globalvars.context.messenger.send_exception(None)  # type: ignore
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m ehh.repl", description="extensible homework helper repl"
+    )
+    parser.add_argument(
+        "--trace",
+        nargs="?",
+        const="",
+        metavar="PATH",
+        help="record spans of every step and write a chrome trace to PATH on exit",
+    )
+    parser.add_argument(
+        "--warm-start",
+        action="store_true",
+        help="start from the saved session and stored homework, refreshing in the background",
+    )
+    args = parser.parse_args()
+    if args.trace is not None:
+        enable_tracing()
+
+    # not asyncio.run(): its SIGINT handling would cancel the whole repl,
+    # while ctrl-c should only interrupt the command in the foreground
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(_main(args.warm_start))
+    finally:
+        loop.close()
+        tracer = disable_tracing()
+        if tracer is not None:
+            path = Path(args.trace or get_trace_path("repl"))
+            count = tracer.write(path)
+            print(f"<info> wrote {count} trace event(s) to '{path}'")
 
 
 if __name__ == "__main__":
@@ -1,12 +1,13 @@
+import functools
+import json
 import random
-import re
 import time
+from dataclasses import asdict
 from datetime import datetime
+from pathlib import Path
 from typing import Optional
 
-import json5
-import openai
-from bs4 import BeautifulSoup
+from munch import Munch
 
 from ehh.models.homework_kind import HomeworkKind
 
@@ -15,9 +16,11 @@ from .models.ai_client import AIClient
 from .models.credentials import Credentials
 from .models.homework_record import HomeworkRecord
 from .models.homework_status import HomeworkStatus
+from .models.paper_digest import PaperDigest
 from .models.school_info import SchoolInfo
 from .models.token import Token
 from .models.user_info import UserInfo
+from .utils import feature_flags
 from .utils.constants import (
     FIND_SCHOOLS_URL,
     GENERATE_ANSWERS_PROMPT,
@@ -37,7 +40,41 @@ from .utils.constants import (
 )
 from .utils.crypto import encodeb64_safe, get_md5_str_of_str
 from .utils.fs import CACHE_DIR, read_file_text
-from .utils.logging import download_file_with_progress, print, print_and_copy_path
+from .utils.homework_store import get_store_ids, upsert_records
+from .utils.http import is_replaying
+from .utils.logging import (
+    download_file_with_progress,
+    get_logger,
+    print,
+    print_and_copy_path,
+)
+from .utils.metrics import TRANSCRIPTION_RTF, record_cache
+from .utils.paper_digest import digest_paper_html
+from .utils.rate_limit import TokenBucket
+from .utils.search_index import (
+    SOURCE_TEXT,
+    SOURCE_TRANSCRIPT,
+    SearchHit,
+    index_document,
+    index_file,
+)
+from .utils.session_state import save_session
+from .utils.tracing import span, traced
+from .utils.whisper_model import (
+    get_audio_duration,
+    get_whisper_model,
+    is_whisper_model_loaded,
+)
+
+logger = get_logger(__name__)
+
+
+def _record_attrs(*args, **kwargs) -> dict:
+    # span attributes for task functions that take a homework record
+    for arg in (*args, *kwargs.values()):
+        if isinstance(arg, HomeworkRecord):
+            return {"homework": arg.title, "kind": arg.kind.name}
+    return {}
 
 
 def _get_status_enum(status_int: int) -> HomeworkStatus:
@@ -49,7 +86,7 @@ def _get_status_enum(status_int: int) -> HomeworkStatus:
 
 
 def _get_school(name: str) -> Optional[SchoolInfo]:
-    response = globalvars.context.http_client.post(
+    response = globalvars.get_context().http_client.post(
         FIND_SCHOOLS_URL, json={"name": name}
     )
     data = response.json()
@@ -65,7 +102,8 @@ def _get_school(name: str) -> Optional[SchoolInfo]:
     return SchoolInfo(id=first_school["id"], name=first_school["name"])
 
 
-def login(credentials: Credentials) -> Optional[Token]:
+@traced()
+def login(credentials: Credentials, persist_session: bool = False) -> Optional[Token]:
     school = _get_school(credentials.school)
     if school is None:
         print(f"<error> school '{credentials.school}' not found")
@@ -79,13 +117,13 @@ def login(credentials: Credentials) -> Optional[Token]:
         "client_secret": "fyll2020",
         "randomCode": "",
     }
-    response = globalvars.context.http_client.post(GET_TOKEN_URL, params=payload)
+    response = globalvars.get_context().http_client.post(GET_TOKEN_URL, params=payload)
     data = response.json()
     if data.get("success", False) is False:
         print(f"<error> login failed: {data}")
         return None
 
-    return Token(
+    token = Token(
         access_token=data["access_token"],
         type=data["token_type"],
         refresh_token=data["refresh_token"],
@@ -100,6 +138,12 @@ def login(credentials: Credentials) -> Optional[Token]:
             school=school,
         ),
     )
+    # lets a warm start pick the session up without logging in again. the
+    # file holds bearer tokens, so it is only written when a warm start will
+    # read it, and never from a replayed login, whose tokens are redacted
+    if persist_session and not is_replaying(globalvars.get_context().config):
+        save_session(credentials, token)
+    return token
 
 
 def _get_headers(token: Token) -> Optional[dict[str, str]]:
@@ -123,13 +167,13 @@ def _get_all_kind_hw_score(item: dict) -> int:
 
 def _get_kind_hw_list(
     url: str, headers: dict[str, str], kind: HomeworkKind
-) -> list[HomeworkRecord]:
+) -> Optional[list[HomeworkRecord]]:
     hw_list: list[HomeworkRecord] = []
 
     max_page_index = 0
     cur_page_index = 0
     while cur_page_index <= max_page_index:
-        response = globalvars.context.http_client.post(
+        response = globalvars.get_context().http_client.post(
             url,
             headers=headers,
             json={"pageIndex": cur_page_index + 1, "pageSize": 50},
@@ -137,7 +181,8 @@ def _get_kind_hw_list(
         data = response.json()
         if data.get("success", False) is False:
             print(f"<error> get homework list failed: {data}")
-            break
+            # a rejected token also lands here; a partial list is not a list
+            return None
 
         max_page_index = data["data"]["pageCount"]
 
@@ -171,7 +216,8 @@ def _get_kind_hw_list(
     return hw_list
 
 
-def get_hw_list(token: Token) -> Optional[list[HomeworkRecord]]:
+@traced()
+def get_hw_list(token: Token, account: str) -> Optional[list[HomeworkRecord]]:
     print("--- step: retrieve homework list ---")
 
     headers = _get_headers(token)
@@ -181,13 +227,19 @@ def get_hw_list(token: Token) -> Optional[list[HomeworkRecord]]:
 
     hw_list: list[HomeworkRecord] = []
 
-    hw_list.extend(_get_kind_hw_list(GET_HW_LIST_URL, headers, HomeworkKind.QUESTIONS))
-    hw_list.extend(
-        _get_kind_hw_list(
-            GET_TRANSLATION_HW_LIST_URL, headers, HomeworkKind.TRANSLATION
-        )
-    )
+    for url, kind in (
+        (GET_HW_LIST_URL, HomeworkKind.QUESTIONS),
+        (GET_TRANSLATION_HW_LIST_URL, HomeworkKind.TRANSLATION),
+    ):
+        kind_list = _get_kind_hw_list(url, headers, kind)
+        if kind_list is None:
+            return None
+        hw_list.extend(kind_list)
     hw_list.sort(key=lambda r: r.publish_time, reverse=True)
+    # assigns the stable ids commands address homework by
+    new_count = upsert_records(account, hw_list)
+    if new_count > 0:
+        print(f"<info> {new_count} new homework item(s)")
 
     return hw_list
 
@@ -198,7 +250,7 @@ def _get_hw_details(token: Token, record: HomeworkRecord) -> Optional[dict]:
         print("<error> authorization failed")
         return None
 
-    response = globalvars.context.http_client.post(
+    response = globalvars.get_context().http_client.post(
         GET_HW_DETAILS_URL,
         headers=headers,
         json={"id": record.api_id},
@@ -211,6 +263,7 @@ def _get_hw_details(token: Token, record: HomeworkRecord) -> Optional[dict]:
     return data.get("data", None)
 
 
+@traced(attrs=_record_attrs)
 def get_answers(
     token: Token, record: HomeworkRecord
 ) -> Optional[list[dict[str, str | int]]]:
@@ -250,20 +303,46 @@ def get_answers(
                 "content": answer_content,
             }
         )
-        print(
-            f"<info> extracted answer {index + 1}: Kind='{answer_kind}', Content='{answer_content}'"
+        logger.info(
+            "extracted answer %d: Kind='%s', Content='%s'",
+            index + 1,
+            answer_kind,
+            answer_content,
         )
 
     return answers
 
 
-def _get_hw_paper(token: Token, record: HomeworkRecord) -> Optional[dict]:
+def _get_paper_path(record: HomeworkRecord) -> Path:
+    return CACHE_DIR / f"homework_{encodeb64_safe(record.title)}_paper.json"
+
+
+def get_audio_path(record: HomeworkRecord) -> Path:
+    return CACHE_DIR / f"homework_{encodeb64_safe(record.title)}_audio.mp3"
+
+
+def get_transcription_path(record: HomeworkRecord) -> Path:
+    return CACHE_DIR / f"homework_{encodeb64_safe(record.title)}_audio.mp3.txt"
+
+
+def get_text_path(record: HomeworkRecord) -> Path:
+    return CACHE_DIR / f"homework_{encodeb64_safe(record.title)}_text.txt"
+
+
+@traced("fetch_paper", attrs=_record_attrs)
+def _get_hw_paper_entry(token: Token, record: HomeworkRecord) -> Optional[dict]:
+    paper_file = _get_paper_path(record)
+    record_cache("paper", paper_file.is_file())
+    if paper_file.is_file():
+        with open(paper_file, "rt", encoding="utf-8") as f:
+            return json.load(f)
+
     headers = _get_headers(token)
     if headers is None:
         print("<error> authorization failed")
         return None
 
-    response = globalvars.context.http_client.post(
+    response = globalvars.get_context().http_client.post(
         GET_HW_CONTENT_URL,
         headers=headers,
         json={"id": record.api_task_paper_id},
@@ -273,7 +352,33 @@ def _get_hw_paper(token: Token, record: HomeworkRecord) -> Optional[dict]:
         print(f"<error> failed to get homework paper: {data}")
         return None
 
-    return data["data"]
+    # the paper html is parsed exactly once, here; text and audio commands
+    # read the cached digest afterwards
+    paper = data["data"]
+    entry = {
+        "paper": paper,
+        "digest": asdict(digest_paper_html(paper.get("content", None) or "")),
+    }
+    with open(paper_file, "wt", encoding="utf-8") as f:
+        json.dump(entry, f, ensure_ascii=False)
+
+    return entry
+
+
+def _get_hw_paper(token: Token, record: HomeworkRecord) -> Optional[dict]:
+    entry = _get_hw_paper_entry(token, record)
+    if entry is None:
+        return None
+
+    return entry["paper"]
+
+
+def _get_paper_digest(token: Token, record: HomeworkRecord) -> Optional[PaperDigest]:
+    entry = _get_hw_paper_entry(token, record)
+    if entry is None:
+        return None
+
+    return PaperDigest.from_dict(entry["digest"])
 
 
 def _get_questions(token: Token, record: HomeworkRecord) -> Optional[list[dict]]:
@@ -306,72 +411,85 @@ def _get_questions(token: Token, record: HomeworkRecord) -> Optional[list[dict]]
 def _get_audio_url(token: Token, record: HomeworkRecord) -> Optional[str]:
     print(f"--- step: retrive audio url for '{record.title}' ---")
 
-    paper = _get_hw_paper(token, record)
-    if paper is None:
+    return _fetch_audio_url(token, record)
+
+
+def _fetch_audio_url(token: Token, record: HomeworkRecord) -> Optional[str]:
+    digest = _get_paper_digest(token, record)
+    if digest is None:
         print("<error> failed to get homework paper")
         return None
 
-    soup = BeautifulSoup(paper["content"], "html.parser")
-    audio_tag = soup.find("audio")
-    if audio_tag is None:
+    if len(digest.audio_urls) == 0:
         print("<warning> audio tag not found in homework paper")
         return None
 
-    return str(audio_tag.get("src"))
+    return digest.audio_urls[0]
 
 
+@traced(attrs=_record_attrs)
 def download_audio(token: Token, record: HomeworkRecord) -> None:
     print(f"--- step: download audio for '{record.title}' ---")
 
+    # checked before the paper, so cached audio needs no gateway at all
+    path = get_audio_path(record)
+    record_cache("audio", path.is_file())
+    if path.is_file():
+        print("<info> audio already downloaded; using cached file")
+        print_and_copy_path(path)
+        return
+
     audio_url = _get_audio_url(token, record)
     if audio_url is None:
         print("<error> failed to retrive audio url")
         return
 
-    path = CACHE_DIR / f"homework_{encodeb64_safe(record.title)}_audio.mp3"
     try:
         print(f"<info> downloading audio from: {audio_url}")
-        globalvars.context.messenger.send_progress(
-            download_file_with_progress, audio_url, path
-        )
+        download_file_with_progress(audio_url, path)
         print_and_copy_path(path)
     except Exception as download_e:
         print("<error> failed to download audio:")
-        globalvars.context.messenger.send_exception(download_e)
+        globalvars.get_context().messenger.send_exception(download_e)
         return
 
 
-WHITESPACE_PATTERN = re.compile(r"[^\S\n]+")
-
-
+@traced(attrs=_record_attrs)
 def get_text_content(token: Token, record: HomeworkRecord) -> Optional[str]:
     print(f"--- step: retrieve text content for '{record.title}' ---")
 
+    text_content = _fetch_text_content(token, record)
+    if text_content is not None:
+        print(
+            f"<success> extracted text content for '{record.title}'; totaling {len(text_content)} chars in length"
+        )
+    return text_content
+
+
+def _fetch_text_content(token: Token, record: HomeworkRecord) -> Optional[str]:
     if record.kind == HomeworkKind.QUESTIONS:
-        paper = _get_hw_paper(token, record)
-        if paper is None:
+        digest = _get_paper_digest(token, record)
+        if digest is None:
             print("<error> failed to get homework paper")
             return None
 
-        soup = BeautifulSoup(paper["content"], "html.parser")
-        text_content = (
-            WHITESPACE_PATTERN.sub(" ", soup.get_text(separator="\n").strip())
-            .strip()
-            .replace("\n \n", "\n")
-            .replace("\n\n", "\n")
-        )
-        print(
-            f"<success> extracted text content for '{record.title}'; totaling {len(text_content)} chars in length"
-        )
+        text_content = digest.text
+        index_document(record, SOURCE_TEXT, text_content)
         return text_content
 
     elif record.kind == HomeworkKind.TRANSLATION:
+        # translations have no paper to cache; a downloaded text file stands in
+        text_file = get_text_path(record)
+        record_cache("text", text_file.is_file())
+        if text_file.is_file():
+            return read_file_text(text_file)
+
         headers = _get_headers(token)
         if headers is None:
             print("<error> authorization failed")
             return None
 
-        response = globalvars.context.http_client.post(
+        response = globalvars.get_context().http_client.post(
             GET_TRANSLATION_HW_CONTENT_URL,
             headers=headers,
             json={"id": record.api_id},
@@ -382,14 +500,17 @@ def get_text_content(token: Token, record: HomeworkRecord) -> Optional[str]:
             print(f"<error> failed to get homework text content: {data}")
             return None
 
-        return "\n".join(
+        text_content = "\n".join(
             map(
                 lambda e: f"{e['questionNumber']}. {e['question']}",
                 data["data"],
             )
         )
+        index_document(record, SOURCE_TEXT, text_content)
+        return text_content
 
 
+@traced(attrs=_record_attrs)
 def download_text_content(token: Token, record: HomeworkRecord) -> None:
     print(f"--- step: download text content for '{record.title}' ---")
 
@@ -398,21 +519,79 @@ def download_text_content(token: Token, record: HomeworkRecord) -> None:
         print("<error> failed to get text content")
         return
 
-    text_file = CACHE_DIR / f"homework_{encodeb64_safe(record.title)}_text.txt"
+    text_file = get_text_path(record)
     with open(text_file, "w", encoding="utf-8") as f:
         f.write(text_content)
     print_and_copy_path(text_file)
 
 
+@traced(attrs=_record_attrs)
+def cache_text_content(token: Token, record: HomeworkRecord) -> bool:
+    text_file = get_text_path(record)
+    record_cache("text", text_file.is_file())
+    if text_file.is_file():
+        return False
+
+    text_content = _fetch_text_content(token, record)
+    if text_content is None:
+        return False
+
+    with open(text_file, "w", encoding="utf-8") as f:
+        f.write(text_content)
+    return True
+
+
+@traced(attrs=_record_attrs)
+def cache_audio(
+    token: Token, record: HomeworkRecord, rate_limiter: Optional[TokenBucket] = None
+) -> bool:
+    if record.kind != HomeworkKind.QUESTIONS:
+        return False
+    path = get_audio_path(record)
+    record_cache("audio", path.is_file())
+    if path.is_file():
+        return False
+
+    # unlike _fetch_audio_url, papers without listening are skipped silently
+    digest = _get_paper_digest(token, record)
+    if digest is None or len(digest.audio_urls) == 0:
+        return False
+
+    download_file_with_progress(
+        digest.audio_urls[0], path, rate_limiter, show_progress=False
+    )
+    return True
+
+
+def get_whisper_options(config: Munch) -> dict:
+    whisper_device = None
+    if config.whisper.device == "cuda":
+        whisper_device = "cuda"
+    elif config.whisper.device == "cpu":
+        whisper_device = "cpu"
+    elif config.whisper.device != "auto":
+        print(
+            f"<warning> unrecognized whisper device '{config.whisper.device}'; falling back to 'auto'..."
+        )
+
+    return {
+        "model_name": config.whisper.model,
+        "device": whisper_device,
+        "in_memory": config.whisper.in_memory,
+        "mmap": getattr(config.whisper, "mmap", False),
+    }
+
+
+@traced(attrs=_record_attrs)
 def transcribe_audio(record: HomeworkRecord):
     print(f"--- step: transcribe audio for '{record.title}' ---")
 
-    path = CACHE_DIR / f"homework_{encodeb64_safe(record.title)}_audio.mp3"
+    path = get_audio_path(record)
 
     # if whisper_model is None:
     #     print("<info> loading Whisper model (this may take a while)...")
     #     whisper_model = faster_whisper.WhisperModel(
-    #         globalvars.context.config.whisper.model, device="cuda", compute_type="float16"
+    #         globalvars.get_context().config.whisper.model, device="cuda", compute_type="float16"
     #     )
     # else:
     #     print("<info> Whisper model already loaded")
@@ -433,48 +612,41 @@ def transcribe_audio(record: HomeworkRecord):
 
     # print(f"<success> transcription saved to '{transcription_file}'")
 
-    try:
-        import whisper
-    except ImportError:
+    if not feature_flags.WHISPER:
         print(
             "<error> whisper not installed; install the 'transcription' extra requirement"
         )
         return
 
-    if globalvars.context.whisper_model is None:
-        print(
-            f"<info> loading Whisper model{' into memory' if globalvars.context.config.whisper.in_memory else ''} (this may take a while)..."
-        )
-        whisper_device = None
-        if globalvars.context.config.whisper.device == "cuda":
-            whisper_device = "cuda"
-        elif globalvars.context.config.whisper.device == "cpu":
-            whisper_device = "cpu"
-        elif globalvars.context.config.whisper.device != "auto":
-            print(
-                f"<warning> unrecognized whisper device '{globalvars.context.config.whisper.device}'; falling back to 'auto'..."
-            )
-        globalvars.context.whisper_model = whisper.load_model(
-            globalvars.context.config.whisper.model,
-            device=whisper_device,
-            in_memory=globalvars.context.config.whisper.in_memory,
-        )
+    whisper_options = get_whisper_options(globalvars.get_context().config)
+    if not is_whisper_model_loaded(**whisper_options):
+        if whisper_options["mmap"]:
+            load_mode = " memory-mapped"
+        elif whisper_options["in_memory"]:
+            load_mode = " into memory"
+        else:
+            load_mode = ""
+        print(f"<info> loading Whisper model{load_mode} (this may take a while)...")
     else:
         print("<info> Whisper model already loaded")
+    with span("whisper.load", "whisper", model=whisper_options["model_name"]):
+        whisper_model = get_whisper_model(**whisper_options)
 
     start = time.perf_counter()
     print(f"<info> transcribing audio file: {path} (this may take a while)...")
-    result = globalvars.context.whisper_model.transcribe(
-        str(path), language="en", verbose=False
-    )
+    with span("whisper.transcribe", "whisper", path=path):
+        result = whisper_model.transcribe(str(path), language="en", verbose=False)
     end = time.perf_counter()
+    audio_seconds = get_audio_duration(result)
+    if audio_seconds:
+        TRANSCRIPTION_RTF.observe((end - start) / audio_seconds)
     print(f"<info> transcription completed in {end - start:.2f} seconds")
     transcription = result.get("text", None)
     if transcription is None or (transcription is str and transcription.strip() == ""):
         print("<error> transcription failed or returned empty result")
         return
 
-    transcription_file = f"{path}.txt"
+    transcription_file = get_transcription_path(record)
     with open(transcription_file, "w", encoding="utf-8") as f:
         if isinstance(transcription, str):
             f.write(transcription)
@@ -487,8 +659,10 @@ def transcribe_audio(record: HomeworkRecord):
             print(
                 f"<success> transcription saved to '{transcription_file}'; totallin {len(trans_str)} chars in length"
             )
+    index_file(record, SOURCE_TRANSCRIPT, transcription_file)
 
 
+@traced(attrs=_record_attrs)
 def generate_answers(
     token: Token | None,
     record: HomeworkRecord,
@@ -511,9 +685,7 @@ def generate_answers(
     else:
         has_audio = False
 
-    transcription_file = (
-        CACHE_DIR / f"homework_{encodeb64_safe(record.title)}_audio.mp3.txt"
-    )
+    transcription_file = get_transcription_path(record)
     if has_audio:
         if not transcription_file.is_file():
             print(
@@ -523,7 +695,7 @@ def generate_answers(
     else:
         print("<info> homework item seems not to have listening part; skipping that")
 
-    text_file = CACHE_DIR / f"homework_{encodeb64_safe(record.title)}_text.txt"
+    text_file = get_text_path(record)
     if not text_file.is_file():
         print("<error> text content does not exist; please download it first")
         return None
@@ -545,6 +717,9 @@ def generate_answers(
 
     print(f"<info> current AI client: {client.describe()}")
     print("<info> requesting model for a response (this may take a while)...")
+    import json5
+    import openai
+
     try:
         response = client.client.chat.completions.create(
             model=client.selected_model,
@@ -622,6 +797,7 @@ def _create_answers_payload(record: HomeworkRecord, answers: list[dict]) -> dict
     }
 
 
+@traced(attrs=_record_attrs)
 def fill_in_answers(
     token: Token,
     record: HomeworkRecord,
@@ -686,8 +862,11 @@ def fill_in_answers(
                         [opt for opt in ["A", "B", "C", "D"] if opt != original_answer]
                     )
                     answers[i]["content"] = wrong_option
-                    print(
-                        f"<info> changed answer for question {q['index']} from '{original_answer}' to '{a['content']}' to reduce correctness rate"
+                    logger.info(
+                        "changed answer for question %s from '%s' to '%s' to reduce correctness rate",
+                        q["index"],
+                        original_answer,
+                        a["content"],
                     )
 
     answers_payload = []
@@ -696,8 +875,10 @@ def fill_in_answers(
 
         if isinstance(answer_content, list):
             answer_content = random.choice(answer_content)
-            print(
-                f"<info> randomly selected answer '{answer_content}' from list of answers {a['content']}"
+            logger.info(
+                "randomly selected answer '%s' from list of answers %s",
+                answer_content,
+                a["content"],
             )
 
         answers_payload.append(
@@ -710,7 +891,7 @@ def fill_in_answers(
 
     payload = {"answers": answers_payload, "id": record.api_id}
 
-    response = globalvars.context.http_client.post(
+    response = globalvars.get_context().http_client.post(
         SAVE_ANSWERS_CACHE_URL, json=payload, headers=headers
     )
     data = response.json()
@@ -738,7 +919,7 @@ def _get_answers_cache(token: Token, record: HomeworkRecord) -> Optional[list[di
         return
 
     payload = {"id": record.api_id}
-    response = globalvars.context.http_client.post(
+    response = globalvars.get_context().http_client.post(
         LOAD_ANSWERS_CACHE_URL, json=payload, headers=headers
     )
     data = response.json()
@@ -759,6 +940,7 @@ def _get_answers_cache(token: Token, record: HomeworkRecord) -> Optional[list[di
     )
 
 
+@traced(attrs=_record_attrs)
 def get_paper_answers(token: Token, record: HomeworkRecord) -> Optional[list[dict]]:
     print(f"--- step: retrieve answers from paper for '{record.title}' ---")
 
@@ -783,8 +965,11 @@ def get_paper_answers(token: Token, record: HomeworkRecord) -> Optional[list[dic
         ):
             answer_content = answer_content.split("/")
 
-        print(
-            f"<info> extracted answer {q['index']}: Type='{answer_type}', Content='{answer_content}'"
+        logger.info(
+            "extracted answer %s: Type='%s', Content='%s'",
+            q["index"],
+            answer_type,
+            answer_content,
         )
         result.append(
             {
@@ -797,6 +982,7 @@ def get_paper_answers(token: Token, record: HomeworkRecord) -> Optional[list[dic
     return result
 
 
+@traced(attrs=_record_attrs)
 def submit_answers(token: Token, record: HomeworkRecord) -> None:
     print(f"--- step: submit answers from paper for '{record.title}' ---")
 
@@ -811,7 +997,7 @@ def submit_answers(token: Token, record: HomeworkRecord) -> None:
         return
 
     payload = _create_answers_payload(record, answers)
-    response = globalvars.context.http_client.post(
+    response = globalvars.get_context().http_client.post(
         SUBMIT_ANSWERS_URL, json=payload, headers=headers
     )
     data = response.json()
@@ -822,6 +1008,7 @@ def submit_answers(token: Token, record: HomeworkRecord) -> None:
     print("<success> answers submitted")
 
 
+@traced(attrs=_record_attrs)
 def start_hw(token: Token, record: HomeworkRecord) -> None:
     print(f"--- step: start homework for '{record.title}' ---")
 
@@ -831,7 +1018,7 @@ def start_hw(token: Token, record: HomeworkRecord) -> None:
         return
 
     payload = {"id": record.api_id}
-    response = globalvars.context.http_client.post(
+    response = globalvars.get_context().http_client.post(
         START_HW_URL, json=payload, headers=headers
     )
     data = response.json()
@@ -842,12 +1029,46 @@ def start_hw(token: Token, record: HomeworkRecord) -> None:
     print("<success> homework started")
 
 
-def print_hw_list(hw_list: list[HomeworkRecord]) -> None:
-    globalvars.context.messenger.send_table(
-        title="Homework List",
+@traced()
+def sync_search_index(hw_list: list[HomeworkRecord]) -> int:
+    indexed_count = 0
+    for record in hw_list:
+        indexed_count += index_file(record, SOURCE_TEXT, get_text_path(record))
+        indexed_count += index_file(
+            record, SOURCE_TRANSCRIPT, get_transcription_path(record)
+        )
+    return indexed_count
+
+
+@functools.lru_cache(maxsize=4096)
+def _format_hw_row(
+    store_id: Optional[int],
+    publish_time: datetime,
+    title: str,
+    status: Optional[HomeworkStatus],
+    publisher_name: str,
+    kind: HomeworkKind,
+    current_score: Optional[float],
+    total_score: float,
+) -> tuple[str, ...]:
+    # keyed on every displayed field, so a refreshed record formats anew
+    return (
+        str(store_id),
+        publish_time.strftime(TIME_FORMAT),
+        title,
+        status.value[1] if status is not None else "-",
+        publisher_name,
+        kind.value,
+        f"{current_score}/{total_score}",
+    )
+
+
+def print_hw_list(hw_list: list[HomeworkRecord], title: str = "Homework List") -> None:
+    globalvars.get_context().messenger.send_table(
+        title=title,
         show_header=True,
         columns=[
-            ("Index", "cyan", "right"),
+            ("ID", "cyan", "right"),
             ("Publish Time", "white", "center"),
             ("Title", "magenta", "left"),
             ("Status", "yellow"),
@@ -855,18 +1076,46 @@ def print_hw_list(hw_list: list[HomeworkRecord]) -> None:
             ("Kind", "blue", "center"),
             ("Score", "red", "center"),
         ],
+        rows=[
+            _format_hw_row(
+                record.store_id,
+                record.publish_time,
+                record.title,
+                record.status,
+                record.publisher_name,
+                record.kind,
+                record.current_score,
+                record.total_score,
+            )
+            for record in hw_list
+        ],
+    )
+
+
+def print_search_hits(hits: list[SearchHit], account: Optional[str]) -> None:
+    store_ids = get_store_ids(account, (hit.hw_id for hit in hits))
+    globalvars.get_context().messenger.send_table(
+        title="Search Results",
+        show_header=True,
+        columns=[
+            ("ID", "cyan", "right"),
+            ("Publish Time", "white", "center"),
+            ("Title", "magenta", "left"),
+            ("Kind", "blue", "center"),
+            ("Source", "yellow", "center"),
+            ("Snippet", "white", "left"),
+        ],
         rows=list(
             map(
-                lambda enum_obj: (
-                    str(enum_obj[0]),
-                    enum_obj[1].publish_time.strftime(TIME_FORMAT),
-                    enum_obj[1].title,
-                    enum_obj[1].status.value[1],  # type: ignore
-                    enum_obj[1].publisher_name,
-                    enum_obj[1].kind.value,
-                    f"{enum_obj[1].current_score}/{enum_obj[1].total_score}",
+                lambda hit: (
+                    str(store_ids.get(hit.hw_id, "-")),
+                    hit.publish_time.strftime(TIME_FORMAT),
+                    hit.title,
+                    hit.kind,
+                    hit.source,
+                    hit.snippet,
                 ),
-                enumerate(hw_list),
+                hits,
             )
         ),
     )
@@ -1,55 +1,247 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import asyncio
+import collections
+import functools
+import hmac
 import json
-from typing import Optional
+import secrets
+import signal
+from pathlib import Path
+from typing import Callable, Optional
 
 import httpx
 from munch import Munch
-from telegram import Update
-from telegram.ext import Application, CommandHandler, ContextTypes
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.error import BadRequest
+from telegram.ext import (
+    Application,
+    CallbackQueryHandler,
+    CommandHandler,
+    ContextTypes,
+    ExtBot,
+)
 
 from . import globalvars
+from .export import (
+    ExportOptions,
+    ExportSummary,
+    estimate_export_size,
+    export_records,
+    get_export_path,
+    parse_export_args,
+)
+from .jobs import Job, JobExecutor
 from .models.ai_client import AIClient
 from .models.credentials import Credentials
+from .models.homework_kind import HomeworkKind
 from .models.homework_record import HomeworkRecord
 from .models.homework_status import HomeworkStatus
 from .models.token import Token
+from .prefetch import Prefetcher
 from .tasks import (
     download_audio,
     download_text_content,
     generate_answers,
     get_answers,
+    get_audio_path,
     get_hw_list,
     get_paper_answers,
+    get_text_content,
+    get_text_path,
+    get_transcription_path,
+    get_whisper_options,
     login,
     start_hw,
     submit_answers,
-    transcribe_audio,
+    sync_search_index,
 )
+from .utils import feature_flags
+from .utils.audio import find_ffmpeg, get_opus_path, transcode_to_opus
 from .utils.config import load_config, migrate_config_if_needed, save_config
-from .utils.constants import BASE_URL
+from .utils.constants import BASE_URL, TIME_FORMAT
 from .utils.context.impl.api_context import APIContext
 from .utils.context.impl.console_messenger import ConsoleMessenger
 from .utils.context.impl.telegram_messenger import TelegramMessenger
+from .utils.convert import capitalize_first, split_flags, try_parse_date
 from .utils.crypto import encodeb64_safe
 from .utils.fs import CACHE_DIR
-from .utils.logging import print
+from .utils.homework_store import (
+    count_records,
+    get_hw_ids,
+    get_record,
+    get_store_ids,
+    parse_record_filters,
+    query_records,
+)
+from .utils.http import create_http_client
+from .utils.http_server import HttpRequest, HttpResponse, HttpServer
+from .utils.logging import configure_logging, print
+from .utils.metrics import REGISTRY, record_cache
+from .utils.profiling import (
+    ProfileResult,
+    describe_profile,
+    is_profiling,
+    profile_call,
+)
+from .utils.search_index import SOURCE_TRANSCRIPT, index_file, search
+from .utils.session_state import clear_sessions, load_session
+from .utils.telegram_file_cache import TelegramFileCache
+from .utils.tracing import (
+    MAX_TRACE_EVENTS,
+    disable_tracing,
+    enable_tracing,
+    get_trace_path,
+)
+from .utils.whisper_model import (
+    TranscriptionResult,
+    report_transcription,
+    transcribe_audio_file,
+)
+
+# /list pages are edited in place, so the message stays the same size however
+# much history the store holds
+LIST_PAGE_SIZE = 10
+# bots may upload files of up to 50 MB
+TELEGRAM_UPLOAD_LIMIT = 50 * 1024 * 1024
+LIST_TITLE_LIMIT = 80
+LIST_CALLBACK_PREFIX = "hw_list"
+MAX_LIST_VIEWS = 256
 
 hw_list: list[HomeworkRecord] = []
 token: Optional[Token] = None
+# Credentials.account_key of the logged-in account; scopes the store
+account: Optional[str] = None
 config: Munch = None
+prefetcher: Optional[Prefetcher] = None
+jobs: JobExecutor = None  # type: ignore
+file_cache: TelegramFileCache = None  # type: ignore
+metrics_server: Optional[HttpServer] = None
+# set by a warm start: the account to refresh once the event loop runs, and
+# whether its restored token needs a fresh login
+pending_refresh: Optional[tuple[Credentials, bool]] = None
+session_refresh: Optional[asyncio.Task] = None
+# filters of recent /list messages, keyed by the id their page buttons carry
+# (callback data is capped at 64 bytes, too small for the filters themselves)
+list_views: collections.OrderedDict[str, dict] = collections.OrderedDict()
+
+
+def _schedule_prefetch() -> None:
+    global prefetcher
+    if token is None or not hw_list:
+        return
+
+    if prefetcher is None:
+        prefetcher = Prefetcher.from_config(token, config)
+        if prefetcher is None:
+            return
+        # prefetch output belongs on the console, not in whichever chat
+        # happened to trigger it
+        with globalvars.use_context(globalvars.get_default_context()):
+            prefetcher.start()
+        print("<info> telegram bot: background prefetch enabled")
+
+    prefetcher.token = token
+    prefetcher.schedule(hw_list)
 
 
-def _ensure_hw_list() -> bool:
+async def _ensure_hw_list() -> bool:
     global hw_list, token
     if token is None:
         return False
     if not hw_list:
-        hw_list = get_hw_list(token) or []
+        hw_list = await jobs.run_blocking(get_hw_list, token, account) or []
+        _schedule_prefetch()
     return len(hw_list) > 0
 
 
+def _get_voice_bitrate() -> Optional[int]:
+    # audio goes out as a low-bitrate opus voice note when enabled, which is
+    # several times smaller than the source mp3
+    voice_config = getattr(config, "telegram_voice", None)
+    if voice_config is None or not getattr(voice_config, "enabled", False):
+        return None
+    if find_ffmpeg() is None:
+        print("<warning> telegram bot: ffmpeg not found; sending original audio")
+        return None
+    return getattr(voice_config, "bitrate_kbps", None) or 24
+
+
+def _prepare_audio(
+    token: Token, record: HomeworkRecord, bitrate_kbps: Optional[int]
+) -> Path:
+    download_audio(token, record)
+    audio_path = get_audio_path(record)
+    if not audio_path.exists():
+        raise FileNotFoundError("audio file not found after download")
+
+    if bitrate_kbps is None:
+        return audio_path
+    return transcode_to_opus(audio_path, bitrate_kbps)
+
+
+def _save_answers(
+    path: Path, fetch: Callable[..., Optional[list[dict]]], *args
+) -> Optional[list[dict]]:
+    answers = fetch(*args)
+    if answers is not None:
+        path.write_text(
+            json.dumps(answers, indent=4, ensure_ascii=False), encoding="utf-8"
+        )
+    return answers
+
+
+async def _send_file(
+    bot: ExtBot, chat_id: int | str, kind: str, path: Path, caption: str
+) -> None:
+    # kind is the telegram media kind: 'audio', 'document' or 'voice'
+    send = getattr(bot, f"send_{kind}")
+    digest = await jobs.run_blocking(file_cache.get_digest, path)
+
+    file_id = file_cache.get(kind, digest)
+    record_cache("telegram_file_id", file_id is not None)
+    if file_id is not None:
+        try:
+            await send(chat_id=chat_id, caption=caption, **{kind: file_id})
+            return
+        except BadRequest:
+            # the id is no longer valid (e.g. the bot token changed)
+            file_cache.discard(kind, digest)
+
+    with open(path, "rb") as f:
+        message = await send(
+            chat_id=chat_id, caption=caption, filename=path.name, **{kind: f}
+        )
+
+    attachment = getattr(message, kind, None) or message.effective_attachment
+    if attachment is not None and hasattr(attachment, "file_id"):
+        file_cache.put(kind, digest, attachment.file_id)
+
+
+async def _reply_queued(update: Update, context: ContextTypes.DEFAULT_TYPE, job: Job):
+    await context.bot.send_message(
+        chat_id=update.effective_chat.id,
+        text=f"Queued job #{job.id}: {job.description}. Use /jobs to check on it or /cancel {job.id} to cancel it.",
+    )
+
+
+def _in_chat_context(callback: Callable) -> Callable:
+    # runs a handler, and everything it starts (jobs, threads via
+    # copy_context), in a context whose messenger talks to the update's chat
+    @functools.wraps(callback)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        chat_context = globalvars.get_default_context().derive(
+            messenger=TelegramMessenger.for_chat(
+                bot=context.bot, chat_id=update.effective_chat.id
+            )
+        )
+        with globalvars.use_context(chat_context):
+            await callback(update, context)
+
+    return wrapper
+
+
 def _get_ai_client_from_config() -> Optional[AIClient]:
     sel = getattr(config.ai_client, "selected", None)
     if isinstance(sel, int) and 0 <= sel < len(config.ai_client.all):
@@ -57,62 +249,214 @@ def _get_ai_client_from_config() -> Optional[AIClient]:
     return None
 
 
+@functools.lru_cache(maxsize=4096)
+def _format_hw_entry(
+    store_id: Optional[int],
+    title: str,
+    status: Optional[HomeworkStatus],
+    current_score: Optional[float],
+    total_score: float,
+) -> str:
+    status_text = status.value[1] if status else "Unknown"
+    if status == HomeworkStatus.COMPLETED:
+        status_emoji = "✅"
+    elif (
+        status == HomeworkStatus.NOT_COMPLETED
+        or status == HomeworkStatus.MAKE_UP
+        or status == HomeworkStatus.IN_PROGRESS
+    ):
+        status_emoji = "⏳"
+    else:
+        status_emoji = "❓"
+
+    if len(title) > LIST_TITLE_LIMIT:
+        title = title[: LIST_TITLE_LIMIT - 1] + "…"
+    # inside code spans MarkdownV2 only reserves '`' and '\'
+    safe_title = title.replace("\\", "\\\\").replace("`", "\\`")
+    status_score_info = (
+        f"Status: `{status_text}` \\| Score: `{current_score}/{total_score}`"
+    )
+    return f"{store_id}\\. {status_emoji} `{safe_title}`\n    {status_score_info}"
+
+
+def _render_list_page(filters: dict, page: int) -> Optional[tuple[str, int, int]]:
+    # (text, page, page count) of one /list page, or None when nothing
+    # matches; only that page's rows are queried
+    total = count_records(account, **filters)
+    if total == 0:
+        return None
+    page_count = (total + LIST_PAGE_SIZE - 1) // LIST_PAGE_SIZE
+    page = min(max(page, 1), page_count)
+    records = query_records(
+        account, limit=LIST_PAGE_SIZE, offset=(page - 1) * LIST_PAGE_SIZE, **filters
+    )
+
+    message_lines = [f"*📚 Homework List 📋* \\({page}/{page_count}, {total} items\\)"]
+    for hw in records:
+        message_lines.append(
+            _format_hw_entry(
+                hw.store_id, hw.title, hw.status, hw.current_score, hw.total_score
+            )
+        )
+    return "\n\n".join(message_lines), page, page_count
+
+
+def _remember_list_view(filters: dict) -> str:
+    view_id = secrets.token_urlsafe(6)
+    list_views[view_id] = filters
+    while len(list_views) > MAX_LIST_VIEWS:
+        list_views.popitem(last=False)
+    return view_id
+
+
+def _get_list_keyboard(
+    view_id: str, page: int, page_count: int
+) -> Optional[InlineKeyboardMarkup]:
+    if page_count <= 1:
+        return None
+
+    def button(text: str, target: int) -> InlineKeyboardButton:
+        return InlineKeyboardButton(
+            text, callback_data=f"{LIST_CALLBACK_PREFIX}:{view_id}:{target}"
+        )
+
+    buttons = []
+    if page > 1:
+        buttons.append(button("◀️ Prev", page - 1))
+    buttons.append(button(f"{page}/{page_count}", page))
+    if page < page_count:
+        buttons.append(button("Next ▶️", page + 1))
+    return InlineKeyboardMarkup([buttons])
+
+
 async def command_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     global hw_list, token
 
-    if not isinstance(globalvars.context.messenger, TelegramMessenger):
-        globalvars.context = APIContext(
-            messenger=TelegramMessenger(
-                bot=context.bot, chat_id=update.effective_chat.id
-            ),
-            http_client=httpx.Client(base_url=BASE_URL),
+    # usage: /list [--status make_up] [--kind questions|translation] [--publisher name]
+    #              [--since yyyy-mm-dd] [--until yyyy-mm-dd] [--cached]
+    _, flags = split_flags(context.args or [])
+    try:
+        filters = parse_record_filters(flags)
+    except ValueError as e:
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id, text=f"{capitalize_first(str(e))}."
         )
-
-    if token is None:
-        print("<error> not logged in; cannot retrive homework list")
         return
 
-    hw_list = get_hw_list(token)
-    if not hw_list:
+    # --cached (or no login) answers from the local store alone
+    if token is not None and "cached" not in flags:
+        try:
+            hw_list = await jobs.run_blocking(get_hw_list, token, account) or []
+        except httpx.HTTPError as e:
+            print(
+                f"<warning> telegram bot: gateway unreachable ({e}); listing stored homework"
+            )
+        else:
+            _schedule_prefetch()
+
+    rendered = await jobs.run_blocking(_render_list_page, filters, 1)
+    if rendered is None:
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
             text="No homework items found.",
         )
         return
 
-    message_lines = ["*📚 Homework List 📋*"]
+    text, page, page_count = rendered
+    await context.bot.send_message(
+        chat_id=update.effective_chat.id,
+        text=text,
+        parse_mode="MarkdownV2",
+        reply_markup=_get_list_keyboard(_remember_list_view(filters), page, page_count),
+    )
 
-    for i, hw in enumerate(hw_list):
-        status_text = hw.status.value if hw.status else "Unknown"
-        if hw.status == HomeworkStatus.COMPLETED:
-            status_emoji = "✅"
-        elif (
-            hw.status == HomeworkStatus.NOT_COMPLETED
-            or hw.status == HomeworkStatus.MAKE_UP
-            or hw.status == HomeworkStatus.IN_PROGRESS
-        ):
-            status_emoji = "⏳"
-        else:
-            status_emoji = "❓"
 
-        # Escape characters for MarkdownV2 minimally
-        safe_title = (
-            hw.title.replace("-", "\\-").replace(".", "\\.").replace("_", "\\_")
+async def callback_list_page(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> None:
+    query = update.callback_query
+    _, view_id, page_text = query.data.split(":")
+    filters = list_views.get(view_id, None)
+    if filters is None:
+        await query.answer("This list has expired; send /list again.")
+        return
+    list_views.move_to_end(view_id)
+
+    # pages come from the local store; paging never waits on the gateway
+    rendered = await jobs.run_blocking(_render_list_page, filters, int(page_text))
+    await query.answer()
+    if rendered is None:
+        await query.edit_message_text("No homework items found.")
+        return
+
+    text, page, page_count = rendered
+    try:
+        await query.edit_message_text(
+            text,
+            parse_mode="MarkdownV2",
+            reply_markup=_get_list_keyboard(view_id, page, page_count),
         )
-        status_score_info = (
-            f"Status: `{status_text}` \\| Score: `{hw.current_score}/{hw.total_score}`"
+    except BadRequest as e:
+        # pressing the current page's button again changes nothing
+        if "not modified" not in str(e):
+            raise
+
+
+async def command_search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    global hw_list
+
+    # usage: /search <query> [--kind questions|translation] [--since yyyy-mm-dd] [--until yyyy-mm-dd]
+    query_parts, flags = split_flags(context.args or [])
+    if len(query_parts) < 1:
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text="Provide a search query, e.g. /search photosynthesis --since 2026-09-01",
         )
+        return
 
-        message_lines.append(
-            f"{i+1}\\. {status_emoji} `{safe_title}`\n    {status_score_info}"
+    kind = None
+    if "kind" in flags:
+        kind = HomeworkKind.from_name(flags["kind"])
+        if kind is None:
+            await context.bot.send_message(
+                chat_id=update.effective_chat.id, text=f"Unknown kind: {flags['kind']}"
+            )
+            return
+    since = try_parse_date(flags["since"]) if "since" in flags else None
+    until = try_parse_date(flags["until"]) if "until" in flags else None
+    if ("since" in flags and since is None) or ("until" in flags and until is None):
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text="Invalid date; expected format: yyyy-mm-dd",
+        )
+        return
+
+    # without a fetched list, index whatever the store knows about
+    records = hw_list or await jobs.run_blocking(query_records, account)
+    await jobs.run_blocking(sync_search_index, records)
+    hw_ids = await jobs.run_blocking(get_hw_ids, account)
+    hits = await jobs.run_blocking(
+        search, " ".join(query_parts), kind, since, until, 10, hw_ids
+    )
+    if len(hits) == 0:
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id, text="No matches found."
         )
+        return
 
-    message = "\n\n".join(message_lines)
+    store_ids = await jobs.run_blocking(
+        get_store_ids, account, [hit.hw_id for hit in hits]
+    )
+    message_lines = []
+    for hit in hits:
+        store_id = store_ids.get(hit.hw_id, None)
+        index_text = f"{store_id}. " if store_id is not None else ""
+        message_lines.append(
+            f"{index_text}{hit.title} ({hit.kind}, {hit.source}, {hit.publish_time.strftime(TIME_FORMAT)})\n{hit.snippet}"
+        )
 
     await context.bot.send_message(
-        chat_id=update.effective_chat.id,
-        text=message,
-        parse_mode="MarkdownV2",
+        chat_id=update.effective_chat.id, text="\n\n".join(message_lines)
     )
 
 
@@ -133,53 +477,53 @@ async def command_download_audio(
     if not context.args:
         await context.bot.send_message(
             chat_id=chat_id,
-            text="Please provide a homework index after the command, e.g., /download_audio 1",
+            text="Please provide a homework id after the command, e.g., /download_audio 1",
         )
         return
 
     try:
-        idx = int(context.args[0]) - 1
+        hw_id = int(context.args[0])
     except ValueError:
-        await context.bot.send_message(chat_id=chat_id, text="Invalid index.")
+        await context.bot.send_message(chat_id=chat_id, text="Invalid homework id.")
         return
 
-    if not _ensure_hw_list():
+    if not await _ensure_hw_list():
         await context.bot.send_message(
             chat_id=chat_id, text="No homework items available."
         )
         return
 
-    if idx < 0 or idx >= len(hw_list):
+    record = await jobs.run_blocking(get_record, account, hw_id)
+    if record is None:
         await context.bot.send_message(
-            chat_id=chat_id, text=f"Index out of range: {idx+1}"
+            chat_id=chat_id, text=f"No homework with id {hw_id}."
         )
         return
+    bitrate_kbps = _get_voice_bitrate()
+    audio_path = get_audio_path(record)
+    if bitrate_kbps is not None:
+        deliverable_path = get_opus_path(audio_path, bitrate_kbps)
+    else:
+        deliverable_path = audio_path
 
-    record = hw_list[idx]
+    async def send_audio(path: Path) -> None:
+        kind = "voice" if path.suffix == ".ogg" else "audio"
+        await _send_file(context.bot, chat_id, kind, path, f"Audio: {record.title}")
 
-    try:
-        download_audio(token, record)
-    except Exception as e:
-        await context.bot.send_message(
-            chat_id=chat_id, text=f"Failed to download audio: {e}"
-        )
+    if deliverable_path.exists():
+        await send_audio(deliverable_path)
         return
 
-    audio_path = CACHE_DIR / f"homework_{encodeb64_safe(record.title)}_audio.mp3"
-    if not audio_path.exists():
-        await context.bot.send_message(
-            chat_id=chat_id, text="Audio file not found after download."
-        )
-        return
-
-    await context.bot.send_message(
-        chat_id=chat_id, text=f"Audio for homework '{record.title}' downloaded."
-    )
-    await context.bot.send_audio(
-        chat_id=chat_id,
-        audio=audio_path,
-        caption=f"Audio: {record.title}",
+    job = jobs.submit(
+        chat_id,
+        f"download audio for '{record.title}'",
+        _prepare_audio,
+        token,
+        record,
+        bitrate_kbps,
+        on_done=send_audio,
     )
+    await _reply_queued(update, context, job)
 
 
 async def command_transcribe_audio(
@@ -190,32 +534,31 @@ async def command_transcribe_audio(
     if not context.args:
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
-            text="Provide homework index, e.g. /transcribe_audio 1",
+            text="Provide homework id, e.g. /transcribe_audio 1",
         )
         return
 
     try:
-        idx = int(context.args[0]) - 1
+        hw_id = int(context.args[0])
     except ValueError:
         await context.bot.send_message(
-            chat_id=update.effective_chat.id, text="Invalid index."
+            chat_id=update.effective_chat.id, text="Invalid homework id."
         )
         return
 
-    if not _ensure_hw_list():
+    if not await _ensure_hw_list():
         await context.bot.send_message(
             chat_id=update.effective_chat.id, text="No homework items available."
         )
         return
 
-    if idx < 0 or idx >= len(hw_list):
+    record = await jobs.run_blocking(get_record, account, hw_id)
+    if record is None:
         await context.bot.send_message(
-            chat_id=update.effective_chat.id, text=f"Index out of range: {idx+1}"
+            chat_id=update.effective_chat.id, text=f"No homework with id {hw_id}."
         )
         return
-
-    record = hw_list[idx]
-    audio_file = CACHE_DIR / f"homework_{encodeb64_safe(record.title)}_audio.mp3"
+    audio_file = get_audio_path(record)
     if not audio_file.exists():
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
@@ -223,27 +566,40 @@ async def command_transcribe_audio(
         )
         return
 
-    try:
-        transcribe_audio(record)
-    except Exception as e:
+    if not feature_flags.WHISPER:
         await context.bot.send_message(
-            chat_id=update.effective_chat.id, text=f"Transcription failed: {e}"
+            chat_id=update.effective_chat.id,
+            text="Whisper is not installed on the bot host.",
         )
         return
 
-    txt_path = audio_file.with_suffix(audio_file.suffix + ".txt")
-    if txt_path.exists():
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id, text=f"Transcription saved: {txt_path}"
-        )
-        await context.bot.send_document(
-            chat_id=update.effective_chat.id, document=open(str(txt_path), "rb")
-        )
-    else:
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id,
-            text="Transcription file not found after transcribe.",
-        )
+    txt_path = get_transcription_path(record)
+
+    async def send_transcription(result: TranscriptionResult) -> None:
+        # the worker's spans belong under this job's span in the trace
+        report_transcription(result, track=f"job #{job.id}")
+        await jobs.run_blocking(index_file, record, SOURCE_TRANSCRIPT, txt_path)
+        await _send_file(
+            context.bot,
+            update.effective_chat.id,
+            "document",
+            txt_path,
+            f"Transcription: {record.title}",
+        )
+
+    # whisper is CPU-bound and holds the GIL for long stretches, so it runs in
+    # a worker process with its own copy of the model
+    job = jobs.submit(
+        update.effective_chat.id,
+        f"transcribe audio for '{record.title}'",
+        transcribe_audio_file,
+        str(audio_file),
+        str(txt_path),
+        *get_whisper_options(config).values(),
+        cpu=True,
+        on_done=send_transcription,
+    )
+    await _reply_queued(update, context, job)
 
 
 async def command_download_text(
@@ -260,45 +616,54 @@ async def command_download_text(
     if not context.args:
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
-            text="Provide homework index, e.g. /download_text 1",
+            text="Provide homework id, e.g. /download_text 1",
         )
         return
     try:
-        idx = int(context.args[0]) - 1
+        hw_id = int(context.args[0])
     except ValueError:
         await context.bot.send_message(
-            chat_id=update.effective_chat.id, text="Invalid index."
+            chat_id=update.effective_chat.id, text="Invalid homework id."
         )
         return
-    if not _ensure_hw_list():
+    if not await _ensure_hw_list():
         await context.bot.send_message(
             chat_id=update.effective_chat.id, text="No homework items."
         )
         return
-    if idx < 0 or idx >= len(hw_list):
+    record = await jobs.run_blocking(get_record, account, hw_id)
+    if record is None:
         await context.bot.send_message(
-            chat_id=update.effective_chat.id, text=f"Index out of range: {idx+1}"
+            chat_id=update.effective_chat.id, text=f"No homework with id {hw_id}."
         )
         return
-    record = hw_list[idx]
-    try:
-        download_text_content(token, record)
-    except Exception as e:
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id, text=f"Failed to download text: {e}"
+    txt_path = get_text_path(record)
+
+    async def send_text(_) -> None:
+        if not txt_path.exists():
+            raise FileNotFoundError("text file not found after download")
+
+        await _send_file(
+            context.bot,
+            update.effective_chat.id,
+            "document",
+            txt_path,
+            f"Text: {record.title}",
         )
-        return
-    txt_path = CACHE_DIR / f"homework_{encodeb64_safe(record.title)}_text.txt"
+
     if txt_path.exists():
-        await context.bot.send_document(
-            chat_id=update.effective_chat.id,
-            document=open(str(txt_path), "rb"),
-            caption=f"Text: {record.title}",
-        )
-    else:
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id, text="Text file not found after download."
-        )
+        await send_text(None)
+        return
+
+    job = jobs.submit(
+        update.effective_chat.id,
+        f"download text for '{record.title}'",
+        download_text_content,
+        token,
+        record,
+        on_done=send_text,
+    )
+    await _reply_queued(update, context, job)
 
 
 async def command_download_answers(
@@ -315,42 +680,52 @@ async def command_download_answers(
     if not context.args:
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
-            text="Provide homework index, e.g. /download_answers 1",
+            text="Provide homework id, e.g. /download_answers 1",
         )
         return
     try:
-        idx = int(context.args[0]) - 1
+        hw_id = int(context.args[0])
     except ValueError:
         await context.bot.send_message(
-            chat_id=update.effective_chat.id, text="Invalid index."
+            chat_id=update.effective_chat.id, text="Invalid homework id."
         )
         return
-    if not _ensure_hw_list():
+    if not await _ensure_hw_list():
         await context.bot.send_message(
             chat_id=update.effective_chat.id, text="No homework items."
         )
         return
-    if idx < 0 or idx >= len(hw_list):
+    record = await jobs.run_blocking(get_record, account, hw_id)
+    if record is None:
         await context.bot.send_message(
-            chat_id=update.effective_chat.id, text=f"Index out of range: {idx+1}"
-        )
-        return
-    record = hw_list[idx]
-    answers = get_answers(token, record)
-    if answers is None:
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id, text="No answers retrieved."
+            chat_id=update.effective_chat.id, text=f"No homework with id {hw_id}."
         )
         return
     answers_file = CACHE_DIR / f"homework_{encodeb64_safe(record.title)}_answers.json"
-    answers_file.write_text(
-        json.dumps(answers, indent=4, ensure_ascii=False), encoding="utf-8"
-    )
-    await context.bot.send_document(
-        chat_id=update.effective_chat.id,
-        document=open(str(answers_file), "rb"),
-        caption=f"Answers: {record.title}",
+
+    async def send_answers(answers: Optional[list[dict]]) -> None:
+        if answers is None:
+            raise RuntimeError("no answers retrieved")
+
+        await _send_file(
+            context.bot,
+            update.effective_chat.id,
+            "document",
+            answers_file,
+            f"Answers: {record.title}",
+        )
+
+    job = jobs.submit(
+        update.effective_chat.id,
+        f"download answers for '{record.title}'",
+        _save_answers,
+        answers_file,
+        get_answers,
+        token,
+        record,
+        on_done=send_answers,
     )
+    await _reply_queued(update, context, job)
 
 
 async def command_download_answers_paper(
@@ -367,45 +742,54 @@ async def command_download_answers_paper(
     if not context.args:
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
-            text="Provide homework index, e.g. /download_answers_paper 1",
+            text="Provide homework id, e.g. /download_answers_paper 1",
         )
         return
     try:
-        idx = int(context.args[0]) - 1
+        hw_id = int(context.args[0])
     except ValueError:
         await context.bot.send_message(
-            chat_id=update.effective_chat.id, text="Invalid index."
+            chat_id=update.effective_chat.id, text="Invalid homework id."
         )
         return
-    if not _ensure_hw_list():
+    if not await _ensure_hw_list():
         await context.bot.send_message(
             chat_id=update.effective_chat.id, text="No homework items."
         )
         return
-    if idx < 0 or idx >= len(hw_list):
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id, text=f"Index out of range: {idx+1}"
-        )
-        return
-    record = hw_list[idx]
-    answers = get_paper_answers(token, record)
-    if answers is None:
+    record = await jobs.run_blocking(get_record, account, hw_id)
+    if record is None:
         await context.bot.send_message(
-            chat_id=update.effective_chat.id, text="No answers retrieved."
+            chat_id=update.effective_chat.id, text=f"No homework with id {hw_id}."
         )
         return
     answers_file = (
         CACHE_DIR / f"homework_{encodeb64_safe(record.title)}_answers_paper.json"
     )
 
-    answers_file.write_text(
-        json.dumps(answers, indent=4, ensure_ascii=False), encoding="utf-8"
-    )
-    await context.bot.send_document(
-        chat_id=update.effective_chat.id,
-        document=open(str(answers_file), "rb"),
-        caption=f"Paper Answers: {record.title}",
+    async def send_answers(answers: Optional[list[dict]]) -> None:
+        if answers is None:
+            raise RuntimeError("no answers retrieved")
+
+        await _send_file(
+            context.bot,
+            update.effective_chat.id,
+            "document",
+            answers_file,
+            f"Paper Answers: {record.title}",
+        )
+
+    job = jobs.submit(
+        update.effective_chat.id,
+        f"download paper answers for '{record.title}'",
+        _save_answers,
+        answers_file,
+        get_paper_answers,
+        token,
+        record,
+        on_done=send_answers,
     )
+    await _reply_queued(update, context, job)
 
 
 async def command_generate_answers(
@@ -416,14 +800,14 @@ async def command_generate_answers(
     if not context.args:
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
-            text="Provide homework index, e.g. /generate_answers 1",
+            text="Provide homework id, e.g. /generate_answers 1",
         )
         return
     try:
-        idx = int(context.args[0]) - 1
+        hw_id = int(context.args[0])
     except ValueError:
         await context.bot.send_message(
-            chat_id=update.effective_chat.id, text="Invalid index."
+            chat_id=update.effective_chat.id, text="Invalid homework id."
         )
         return
     ai_client = _get_ai_client_from_config()
@@ -432,17 +816,17 @@ async def command_generate_answers(
             chat_id=update.effective_chat.id, text="No AI client configured in config."
         )
         return
-    if not _ensure_hw_list():
+    if not await _ensure_hw_list():
         await context.bot.send_message(
             chat_id=update.effective_chat.id, text="No homework items."
         )
         return
-    if idx < 0 or idx >= len(hw_list):
+    record = await jobs.run_blocking(get_record, account, hw_id)
+    if record is None:
         await context.bot.send_message(
-            chat_id=update.effective_chat.id, text=f"Index out of range: {idx+1}"
+            chat_id=update.effective_chat.id, text=f"No homework with id {hw_id}."
         )
         return
-    record = hw_list[idx]
     # if token not present, we cannot auto-detect audio; ask user via argument 'has_audio=yes'
     has_audio_manual = None
     if token is None:
@@ -455,24 +839,35 @@ async def command_generate_answers(
             has_audio_manual = True
         else:
             has_audio_manual = False
-    answers = generate_answers(token, record, ai_client, has_audio_manual)
-    if answers is None:
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id, text="Failed to generate answers."
-        )
-        return
     answers_file = (
         CACHE_DIR / f"homework_{encodeb64_safe(record.title)}_answers_gen.json"
     )
 
-    answers_file.write_text(
-        json.dumps(answers, indent=4, ensure_ascii=False), encoding="utf-8"
-    )
-    await context.bot.send_document(
-        chat_id=update.effective_chat.id,
-        document=open(str(answers_file), "rb"),
-        caption=f"Generated Answers: {record.title}",
+    async def send_answers(answers: Optional[list[dict]]) -> None:
+        if answers is None:
+            raise RuntimeError("failed to generate answers")
+
+        await _send_file(
+            context.bot,
+            update.effective_chat.id,
+            "document",
+            answers_file,
+            f"Generated Answers: {record.title}",
+        )
+
+    job = jobs.submit(
+        update.effective_chat.id,
+        f"generate answers for '{record.title}'",
+        _save_answers,
+        answers_file,
+        generate_answers,
+        token,
+        record,
+        ai_client,
+        has_audio_manual,
+        on_done=send_answers,
     )
+    await _reply_queued(update, context, job)
 
 
 async def command_submit_answers(
@@ -489,28 +884,28 @@ async def command_submit_answers(
     if not context.args:
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
-            text="Provide homework index, e.g. /submit_answers 1",
+            text="Provide homework id, e.g. /submit_answers 1",
         )
         return
     try:
-        idx = int(context.args[0]) - 1
+        hw_id = int(context.args[0])
     except ValueError:
         await context.bot.send_message(
-            chat_id=update.effective_chat.id, text="Invalid index."
+            chat_id=update.effective_chat.id, text="Invalid homework id."
         )
         return
-    if not _ensure_hw_list():
+    if not await _ensure_hw_list():
         await context.bot.send_message(
             chat_id=update.effective_chat.id, text="No homework items."
         )
         return
-    if idx < 0 or idx >= len(hw_list):
+    record = await jobs.run_blocking(get_record, account, hw_id)
+    if record is None:
         await context.bot.send_message(
-            chat_id=update.effective_chat.id, text=f"Index out of range: {idx+1}"
+            chat_id=update.effective_chat.id, text=f"No homework with id {hw_id}."
         )
         return
-    record = hw_list[idx]
-    submit_answers(token, record)
+    await jobs.run_blocking(submit_answers, token, record)
     await context.bot.send_message(
         chat_id=update.effective_chat.id, text=f"Submit attempted for: {record.title}"
     )
@@ -528,30 +923,30 @@ async def command_start_hw(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     if not context.args:
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
-            text="Provide homework index, e.g. /start_hw 1",
+            text="Provide homework id, e.g. /start_hw 1",
         )
         return
     try:
-        idx = int(context.args[0]) - 1
+        hw_id = int(context.args[0])
     except ValueError:
         await context.bot.send_message(
-            chat_id=update.effective_chat.id, text="Invalid index."
+            chat_id=update.effective_chat.id, text="Invalid homework id."
         )
         return
-    if not _ensure_hw_list():
+    if not await _ensure_hw_list():
         await context.bot.send_message(
             chat_id=update.effective_chat.id, text="No homework items."
         )
         return
-    if idx < 0 or idx >= len(hw_list):
+    record = await jobs.run_blocking(get_record, account, hw_id)
+    if record is None:
         await context.bot.send_message(
-            chat_id=update.effective_chat.id, text=f"Index out of range: {idx+1}"
+            chat_id=update.effective_chat.id, text=f"No homework with id {hw_id}."
         )
         return
-    record = hw_list[idx]
-    start_hw(token, record)
+    await jobs.run_blocking(start_hw, token, record)
     # refresh list
-    new_list = get_hw_list(token)
+    new_list = await jobs.run_blocking(get_hw_list, token, account)
     if new_list:
         hw_list = new_list
     await context.bot.send_message(
@@ -562,7 +957,7 @@ async def command_start_hw(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 async def command_account_login(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
-    global token, hw_list
+    global token, account, hw_list
     # usage: /account_login [index]
     sel_index = None
     if context.args:
@@ -586,13 +981,15 @@ async def command_account_login(
             chat_id=update.effective_chat.id, text="No credentials configured."
         )
         return
-    token = login(cred_obj)
+    token = await jobs.run_blocking(login, cred_obj, _is_warm_start_enabled())
     if token is None:
         await context.bot.send_message(
             chat_id=update.effective_chat.id, text="Login failed."
         )
         return
-    hw_list = get_hw_list(token) or []
+    account = cred_obj.account_key()
+    hw_list = await jobs.run_blocking(get_hw_list, token, account) or []
+    _schedule_prefetch()
     await context.bot.send_message(
         chat_id=update.effective_chat.id, text=f"Logged in as: {cred_obj.describe()}"
     )
@@ -601,9 +998,14 @@ async def command_account_login(
 async def command_account_logout(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
-    global token, hw_list
+    global token, account, hw_list, prefetcher
     token = None
+    account = None
     hw_list = []
+    await jobs.run_blocking(clear_sessions)
+    if prefetcher is not None:
+        prefetcher.stop()
+        prefetcher = None
     await context.bot.send_message(chat_id=update.effective_chat.id, text="Logged out.")
 
 
@@ -685,12 +1087,248 @@ async def command_ai_select_model(
     )
 
 
+async def command_jobs(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    chat_jobs = jobs.list_jobs(update.effective_chat.id)
+    if len(chat_jobs) == 0:
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id, text="No jobs in this chat."
+        )
+        return
+
+    await context.bot.send_message(
+        chat_id=update.effective_chat.id,
+        text="\n".join(job.describe() for job in chat_jobs),
+    )
+
+
+async def command_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    # usage: /cancel [job id]; without an id every active job in the chat is cancelled
+    job_id = None
+    if context.args:
+        try:
+            job_id = int(context.args[0].lstrip("#"))
+        except ValueError:
+            await context.bot.send_message(
+                chat_id=update.effective_chat.id, text="Invalid job id."
+            )
+            return
+
+    cancelled = jobs.cancel(update.effective_chat.id, job_id)
+    if len(cancelled) == 0:
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id, text="No matching active jobs."
+        )
+        return
+
+    await context.bot.send_message(
+        chat_id=update.effective_chat.id,
+        text=f"Cancelling {len(cancelled)} job(s).",
+    )
+
+
+async def command_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    rows = REGISTRY.summarize()
+    if len(rows) == 0:
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id, text="No metrics recorded yet."
+        )
+        return
+
+    # the chat messenger splits long output over several messages
+    globalvars.get_context().messenger.send_text(
+        "\n".join(
+            f"{name}{{{labels}}} {value}" if labels else f"{name} {value}"
+            for name, labels, value in rows
+        )
+    )
+
+
+async def command_export(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    # usage: /export [id ...] [list filters] [--format zip|tar|tar.gz] [--audio] [--no-fetch]
+    chat_id = update.effective_chat.id
+    positionals, flags = split_flags(context.args or [])
+    options = ExportOptions.from_config(config)
+    # audio makes up most of an archive and rarely fits telegram's upload
+    # limit, so the bot only includes it on request
+    options.include_audio = False
+    try:
+        records = await jobs.run_blocking(
+            parse_export_args, account, positionals, flags, options
+        )
+    except ValueError as e:
+        await context.bot.send_message(
+            chat_id=chat_id, text=f"{capitalize_first(str(e))}."
+        )
+        return
+    if len(records) == 0:
+        await context.bot.send_message(
+            chat_id=chat_id, text="No homework items to export."
+        )
+        return
+
+    # fetching everything only to find the archive too big wastes minutes of
+    # downloads; what is already cached gives a lower bound up front
+    estimate = await jobs.run_blocking(
+        estimate_export_size, records, options.include_audio
+    )
+    if estimate > TELEGRAM_UPLOAD_LIMIT:
+        await context.bot.send_message(
+            chat_id=chat_id,
+            text=f"The cached files alone are {estimate / 1024 / 1024:.0f} MiB, over "
+            f"Telegram's {TELEGRAM_UPLOAD_LIMIT // 1024 // 1024} MiB upload limit; "
+            "narrow the selection"
+            + (" or leave out --audio." if options.include_audio else "."),
+        )
+        return
+
+    # the archive is spooled to disk, not piped into the upload: the bot
+    # api client reads an upload into memory, and telegram needs its size
+    # checked against the upload limit before sending
+    path = get_export_path(options.format)
+
+    async def send_export(summary: ExportSummary) -> None:
+        try:
+            size = path.stat().st_size
+            if size > TELEGRAM_UPLOAD_LIMIT:
+                await context.bot.send_message(
+                    chat_id=chat_id,
+                    text=f"The archive is {size / 1024 / 1024:.0f} MiB, over Telegram's "
+                    f"{TELEGRAM_UPLOAD_LIMIT // 1024 // 1024} MiB upload limit; "
+                    "narrow the selection"
+                    + (" or leave out --audio." if options.include_audio else "."),
+                )
+                return
+            with open(path, "rb") as f:
+                await context.bot.send_document(
+                    chat_id=chat_id,
+                    document=f,
+                    filename=path.name,
+                    caption=capitalize_first(summary.describe()),
+                )
+        finally:
+            path.unlink(missing_ok=True)
+
+    job = jobs.submit(
+        chat_id,
+        f"export {len(records)} homework item(s)",
+        export_records,
+        token,
+        records,
+        path,
+        options,
+        on_done=send_export,
+    )
+    await _reply_queued(update, context, job)
+
+
+def _is_admin(update: Update) -> bool:
+    admins = getattr(config, "telegram_admins", None) or []
+    user = update.effective_user
+    return user is not None and user.id in admins
+
+
+# /profile targets: the blocking task behind a bot command, and whether it
+# needs a homework id
+PROFILE_TARGETS: dict[str, tuple[Callable, bool]] = {
+    "list": (get_hw_list, False),
+    "text": (get_text_content, True),
+    "audio": (download_audio, True),
+    "answers": (get_answers, True),
+}
+
+
+async def command_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    # usage: /profile <list|text|audio|answers> [homework id]
+    if not _is_admin(update):
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text="This command is restricted to bot admins.",
+        )
+        return
+    if token is None:
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id, text="Not logged in; cannot profile."
+        )
+        return
+
+    if is_profiling():
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id, text="A profile is already running."
+        )
+        return
+
+    target = PROFILE_TARGETS.get(context.args[0], None) if context.args else None
+    if target is None:
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text=f"Usage: /profile <{'|'.join(PROFILE_TARGETS)}> [id], e.g. /profile text 1",
+        )
+        return
+    func, needs_record = target
+
+    args: tuple = (token, account)
+    label = context.args[0]
+    if needs_record:
+        try:
+            hw_id = int(context.args[1])
+        except (IndexError, ValueError):
+            await context.bot.send_message(
+                chat_id=update.effective_chat.id, text="Invalid homework id."
+            )
+            return
+        if not await _ensure_hw_list():
+            await context.bot.send_message(
+                chat_id=update.effective_chat.id, text="No homework items."
+            )
+            return
+        record = await jobs.run_blocking(get_record, account, hw_id)
+        if record is None:
+            await context.bot.send_message(
+                chat_id=update.effective_chat.id, text=f"No homework with id {hw_id}."
+            )
+            return
+        args = (token, record)
+        label = f"{label} {hw_id}"
+
+    async def send_profile(result: ProfileResult) -> None:
+        lines = [describe_profile(result), "", "Top functions (cumulative):"]
+        lines.extend(
+            f"{cumulative} {calls}x {function}"
+            for function, calls, _, cumulative in result.top_functions
+        )
+        lines.extend(["", "Top allocation sites (still allocated):"])
+        lines.extend(
+            f"{size} in {blocks} block(s) at {site}"
+            for site, size, blocks in result.top_allocations
+        )
+        globalvars.get_context().messenger.send_text("\n".join(lines))
+        for path in (result.prof_path, result.snapshot_path):
+            await _send_file(
+                context.bot, update.effective_chat.id, "document", path, path.name
+            )
+
+    # profile_call raises ProfileBusyError if another profile started since
+    # the check above, which fails the job with that message
+    job = jobs.submit(
+        update.effective_chat.id,
+        f"profile {label}",
+        profile_call,
+        label,
+        func,
+        *args,
+        on_done=send_profile,
+    )
+    await _reply_queued(update, context, job)
+
+
 async def command_config_reload(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
     global config
 
     config = load_config()
+    globalvars.get_default_context().config = config
+    configure_logging(config)
     await context.bot.send_message(
         chat_id=update.effective_chat.id, text="Config reloaded."
     )
@@ -705,18 +1343,221 @@ async def command_config_save(
     )
 
 
+def _get_allowed_updates() -> list[str]:
+    # command handlers see messages; the /list pager's buttons arrive as
+    # callback queries, so those are always let through
+    allowed_updates = list(
+        getattr(config, "telegram_allowed_updates", None) or ["message"]
+    )
+    if "callback_query" not in allowed_updates:
+        allowed_updates.append("callback_query")
+    return allowed_updates
+
+
+async def _run_webhook(
+    application: Application, webhook_config: Munch, allowed_updates: list[str]
+) -> None:
+    path = getattr(webhook_config, "path", None) or "/telegram"
+    url = getattr(webhook_config, "url", None)
+    secret_token = getattr(webhook_config, "secret_token", None)
+    if not secret_token:
+        if not url:
+            # without a url the webhook is registered elsewhere, and that
+            # registration has to carry a token this process knows
+            print(
+                "<error> telegram bot: telegram_webhook.secret_token is required when no webhook url is configured; aborting"
+            )
+            return
+        # telegram echoes the token registered with set_webhook in every
+        # request, so a fresh one per run is enough when nothing else posts
+        secret_token = secrets.token_urlsafe(32)
+
+    async def handle_update(request: HttpRequest) -> HttpResponse:
+        received_token = request.headers.get("x-telegram-bot-api-secret-token", "")
+        if not hmac.compare_digest(received_token, secret_token):
+            return HttpResponse.error(403)
+
+        try:
+            update = Update.de_json(request.json(), application.bot)
+        except (ValueError, TypeError, KeyError):
+            return HttpResponse.error(400)
+        if update is None:
+            return HttpResponse.error(400)
+
+        # answer right away; handlers run from the update queue
+        await application.update_queue.put(update)
+        return HttpResponse()
+
+    server = HttpServer(
+        getattr(webhook_config, "listen", None) or "127.0.0.1",
+        getattr(webhook_config, "port", None) or 8443,
+    )
+    server.route("POST", path, handle_update)
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            pass
+
+    await application.initialize()
+    if url:
+        await application.bot.set_webhook(
+            url=url.rstrip("/") + path,
+            secret_token=secret_token,
+            allowed_updates=allowed_updates,
+            max_connections=getattr(webhook_config, "max_connections", None) or 40,
+        )
+        print(f"<info> telegram bot: webhook registered at {url.rstrip('/')}{path}")
+    else:
+        print(
+            "<warning> telegram bot: no webhook url configured; not registering with Telegram (local mode)"
+        )
+
+    await application.start()
+    await server.start()
+    await _start_metrics_server()
+    _start_session_refresh()
+    try:
+        await stop_event.wait()
+    finally:
+        print("<info> telegram bot: shutting down")
+        # stop taking updates first, then let queued ones drain through the
+        # handlers before the application goes away
+        await server.stop()
+        await _stop_metrics_server()
+        await application.stop()
+        if url and getattr(webhook_config, "delete_on_exit", False):
+            await application.bot.delete_webhook()
+        jobs.shutdown()
+        await application.shutdown()
+
+
+def _is_warm_start_enabled() -> bool:
+    return getattr(getattr(config, "warm_start", None), "enabled", False)
+
+
+async def _refresh_session(credentials: Credentials, relogin: bool) -> None:
+    # runs once after a warm start; until it finishes, commands are served
+    # from the restored token and the stored homework
+    global token, hw_list
+
+    try:
+        new_list = None
+        if not relogin:
+            new_list = await jobs.run_blocking(get_hw_list, token, account)
+            if new_list is None:
+                # the gateway can revoke a token before its expiry time
+                print("<info> telegram bot: restored session rejected; logging in")
+        if new_list is None:
+            new_token = await jobs.run_blocking(login, credentials, True)
+            if new_token is None:
+                print(
+                    "<warning> telegram bot: login failed; keeping the restored session"
+                )
+                return
+            token = new_token
+            new_list = await jobs.run_blocking(get_hw_list, token, account)
+    except httpx.HTTPError as e:
+        print(
+            f"<warning> telegram bot: gateway unreachable ({e}); serving from local state"
+        )
+        return
+
+    if new_list is None:
+        print(
+            "<warning> telegram bot: failed to retrieve homework list; serving from local state"
+        )
+        return
+
+    hw_list = new_list
+    _schedule_prefetch()
+    print("<info> telegram bot: session refreshed")
+
+
+def _start_session_refresh() -> None:
+    global pending_refresh, session_refresh
+
+    if pending_refresh is None:
+        return
+    credentials, relogin = pending_refresh
+    pending_refresh = None
+    session_refresh = asyncio.get_running_loop().create_task(
+        _refresh_session(credentials, relogin)
+    )
+
+
+async def _start_metrics_server() -> None:
+    # serves the metrics registry in the prometheus text format
+    global metrics_server
+
+    metrics_config = getattr(config, "metrics", None)
+    if not getattr(metrics_config, "enabled", False):
+        return
+
+    async def handle_metrics(_: HttpRequest) -> HttpResponse:
+        return HttpResponse(
+            body=REGISTRY.render_prometheus().encode("utf-8"),
+            content_type="text/plain; version=0.0.4; charset=utf-8",
+        )
+
+    metrics_server = HttpServer(
+        getattr(metrics_config, "listen", None) or "127.0.0.1",
+        getattr(metrics_config, "port", None) or 9464,
+    )
+    metrics_server.route(
+        "GET", getattr(metrics_config, "path", None) or "/metrics", handle_metrics
+    )
+    await metrics_server.start()
+
+
+async def _stop_metrics_server() -> None:
+    global metrics_server
+
+    if metrics_server is not None:
+        await metrics_server.stop()
+        metrics_server = None
+
+
+def _write_trace() -> None:
+    tracer = disable_tracing()
+    if tracer is None:
+        return
+
+    path = Path(
+        getattr(getattr(config, "tracing", None), "path", None)
+        or get_trace_path("telegram_bot")
+    )
+    count = tracer.write(path)
+    print(f"<info> telegram bot: wrote {count} trace event(s) to '{path}'")
+
+
 def main():
-    global globalvars, token, config
+    global globalvars, token, account, hw_list, config, jobs, file_cache
+    global pending_refresh
 
     print("--- step: start telegram bot ---")
 
-    globalvars.context = APIContext(
-        messenger=ConsoleMessenger(),
-        http_client=httpx.Client(base_url=BASE_URL),
+    globalvars.set_default_context(
+        APIContext(
+            messenger=ConsoleMessenger(),
+            http_client=httpx.Client(base_url=BASE_URL),
+        )
     )
 
     migrate_config_if_needed()
     config = load_config()
+    globalvars.get_context().config = config
+    configure_logging(config)
+    tracing_config = getattr(config, "tracing", None)
+    if getattr(tracing_config, "enabled", False):
+        enable_tracing(getattr(tracing_config, "max_events", None) or MAX_TRACE_EVENTS)
+        print("<info> telegram bot: tracing enabled; trace is written on exit")
+    globalvars.get_context().http_client.close()
+    globalvars.get_context().http_client = create_http_client(config)
+    file_cache = TelegramFileCache()
     token = None
     try:
         sel = config.credentials.selected
@@ -726,7 +1567,21 @@ def main():
         elif len(config.credentials.all) > 0:
             cred_obj = Credentials.from_dict(config.credentials.all[0])
 
-        if cred_obj is not None:
+        if cred_obj is not None and _is_warm_start_enabled():
+            # no network before polling starts; the refresh runs afterwards
+            session = load_session(cred_obj)
+            if session is not None:
+                token = session.token
+            account = cred_obj.account_key()
+            hw_list = query_records(account)
+            pending_refresh = (cred_obj, session is None or session.is_expired)
+            print(
+                f"<info> telegram bot: warm start with {'no ' if session is None else ''}"
+                f"saved session and {len(hw_list)} stored homework item(s)"
+            )
+        elif cred_obj is not None:
+            # set even if login fails, so stored homework stays listable
+            account = cred_obj.account_key()
             token = login(cred_obj)
             if token is None:
                 print("<warning> telegram bot: login failed with provided credentials")
@@ -740,38 +1595,104 @@ def main():
         print("<error> no telegram bot token configured; aborting")
         return
 
-    application = Application.builder().token(telegram_token).build()
+    async def start_background(_: Application) -> None:
+        await _start_metrics_server()
+        _start_session_refresh()
+
+    async def shutdown_jobs(_: Application) -> None:
+        jobs.shutdown()
+        await _stop_metrics_server()
+
+    # post_init only runs for polling; the webhook path starts the metrics
+    # server and the session refresh itself
+    application = (
+        Application.builder()
+        .token(telegram_token)
+        .post_init(start_background)
+        .post_shutdown(shutdown_jobs)
+        .build()
+    )
+    jobs = JobExecutor.from_config(
+        lambda chat_id, text: TelegramMessenger.for_chat(
+            application.bot, chat_id
+        ).send_text(text),
+        config,
+    )
 
     # basic functionality
-    application.add_handler(CommandHandler("list", command_list))
-    application.add_handler(CommandHandler("download_audio", command_download_audio))
+    application.add_handler(CommandHandler("list", _in_chat_context(command_list)))
+    application.add_handler(
+        CallbackQueryHandler(
+            _in_chat_context(callback_list_page),
+            pattern=f"^{LIST_CALLBACK_PREFIX}:",
+        )
+    )
+    application.add_handler(
+        CommandHandler("download_audio", _in_chat_context(command_download_audio))
+    )
+    application.add_handler(
+        CommandHandler("transcribe_audio", _in_chat_context(command_transcribe_audio))
+    )
+    application.add_handler(
+        CommandHandler("download_text", _in_chat_context(command_download_text))
+    )
+    application.add_handler(CommandHandler("search", _in_chat_context(command_search)))
+    application.add_handler(CommandHandler("jobs", _in_chat_context(command_jobs)))
+    application.add_handler(CommandHandler("cancel", _in_chat_context(command_cancel)))
+    application.add_handler(CommandHandler("stats", _in_chat_context(command_stats)))
+    application.add_handler(CommandHandler("export", _in_chat_context(command_export)))
     application.add_handler(
-        CommandHandler("transcribe_audio", command_transcribe_audio)
+        CommandHandler("profile", _in_chat_context(command_profile))
     )
-    application.add_handler(CommandHandler("download_text", command_download_text))
 
     # answers
     application.add_handler(
-        CommandHandler("download_answers", command_download_answers)
+        CommandHandler("download_answers", _in_chat_context(command_download_answers))
+    )
+    application.add_handler(
+        CommandHandler(
+            "download_answers_paper", _in_chat_context(command_download_answers_paper)
+        )
+    )
+    application.add_handler(
+        CommandHandler("generate_answers", _in_chat_context(command_generate_answers))
     )
     application.add_handler(
-        CommandHandler("download_answers_paper", command_download_answers_paper)
+        CommandHandler("submit_answers", _in_chat_context(command_submit_answers))
     )
     application.add_handler(
-        CommandHandler("generate_answers", command_generate_answers)
+        CommandHandler("start_hw", _in_chat_context(command_start_hw))
     )
-    application.add_handler(CommandHandler("submit_answers", command_submit_answers))
-    application.add_handler(CommandHandler("start_hw", command_start_hw))
 
     # account / ai / config
-    application.add_handler(CommandHandler("account_login", command_account_login))
-    application.add_handler(CommandHandler("account_logout", command_account_logout))
-    application.add_handler(CommandHandler("ai_select_api", command_ai_select_api))
-    application.add_handler(CommandHandler("ai_select_model", command_ai_select_model))
-    application.add_handler(CommandHandler("config_reload", command_config_reload))
-    application.add_handler(CommandHandler("config_save", command_config_save))
-
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    application.add_handler(
+        CommandHandler("account_login", _in_chat_context(command_account_login))
+    )
+    application.add_handler(
+        CommandHandler("account_logout", _in_chat_context(command_account_logout))
+    )
+    application.add_handler(
+        CommandHandler("ai_select_api", _in_chat_context(command_ai_select_api))
+    )
+    application.add_handler(
+        CommandHandler("ai_select_model", _in_chat_context(command_ai_select_model))
+    )
+    application.add_handler(
+        CommandHandler("config_reload", _in_chat_context(command_config_reload))
+    )
+    application.add_handler(
+        CommandHandler("config_save", _in_chat_context(command_config_save))
+    )
+
+    allowed_updates = _get_allowed_updates()
+    webhook_config = getattr(config, "telegram_webhook", None)
+    try:
+        if webhook_config is not None and getattr(webhook_config, "enabled", False):
+            asyncio.run(_run_webhook(application, webhook_config, allowed_updates))
+        else:
+            application.run_polling(allowed_updates=allowed_updates)
+    finally:
+        _write_trace()
 
 
 if __name__ == "__main__":
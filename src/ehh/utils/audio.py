@@ -0,0 +1,68 @@
+import os
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Optional
+
+from .metrics import record_cache
+
+
+def find_ffmpeg() -> Optional[str]:
+    return shutil.which("ffmpeg")
+
+
+def get_opus_path(audio_path: Path, bitrate_kbps: int) -> Path:
+    return audio_path.with_name(f"{audio_path.stem}.{bitrate_kbps}k.ogg")
+
+
+def transcode_to_opus(audio_path: Path, bitrate_kbps: int) -> Path:
+    # blocking; produces a mono ogg/opus file tuned for speech, the format
+    # telegram plays inline as a voice note. the result is cached next to the
+    # source and reused while it is newer than the source
+    opus_path = get_opus_path(audio_path, bitrate_kbps)
+    cached = (
+        opus_path.is_file() and opus_path.stat().st_mtime >= audio_path.stat().st_mtime
+    )
+    record_cache("voice", cached)
+    if cached:
+        return opus_path
+
+    ffmpeg = find_ffmpeg()
+    if ffmpeg is None:
+        raise FileNotFoundError("ffmpeg not found in PATH")
+
+    part_path = opus_path.with_name(f"{opus_path.name}.{os.getpid()}.part")
+    try:
+        subprocess.run(
+            [
+                ffmpeg,
+                "-nostdin",
+                "-loglevel",
+                "error",
+                "-y",
+                "-i",
+                str(audio_path),
+                "-vn",
+                "-ac",
+                "1",
+                "-c:a",
+                "libopus",
+                "-b:a",
+                f"{bitrate_kbps}k",
+                "-application",
+                "voip",
+                "-f",
+                "ogg",
+                str(part_path),
+            ],
+            check=True,
+            capture_output=True,
+        )
+    except subprocess.CalledProcessError as e:
+        part_path.unlink(missing_ok=True)
+        raise RuntimeError(
+            f"ffmpeg failed: {e.stderr.decode('utf-8', 'replace').strip()}"
+        ) from e
+
+    os.replace(part_path, opus_path)
+    return opus_path
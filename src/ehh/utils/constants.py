@@ -1,6 +1,7 @@
 COMPLETION_WORD_MAP = {
     (): [
         "list",
+        "search",
         "audio",
         "text",
         "answers",
@@ -8,6 +9,12 @@ COMPLETION_WORD_MAP = {
         "account",
         "ai",
         "config",
+        "jobs",
+        "wait",
+        "cancel",
+        "stats",
+        "profile",
+        "export",
         "exit",
     ],
     ("audio",): ["download", "transcribe"],
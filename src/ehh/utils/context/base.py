@@ -1,32 +1,57 @@
+import copy
+import threading
 from typing import Optional
 
 import httpx
 from munch import Munch
 
-from .. import feature_flags
-
-if feature_flags.WHISPER:
-    from whisper.model import Whisper
+from ..progress import ProgressBus, ProgressTask
 
 
 class Messenger:
+    progress_fps: float = 10.0
+    _progress_bus: Optional[ProgressBus] = None
+    _progress_bus_lock = threading.Lock()
+
     def send_text(self, *args, **kwargs) -> None:
         raise NotImplementedError
 
     def send_table(self, *args, **kwargs) -> None:
         raise NotImplementedError
 
-    def send_progress(self, *args, **kwargs) -> None:
-        raise NotImplementedError
-
     def send_exception(self, exception: Exception) -> None:
         raise NotImplementedError
 
+    def flush_output(self) -> None:
+        pass
+
+    def track_progress(
+        self, description: str, total: Optional[float] = None
+    ) -> ProgressTask:
+        with Messenger._progress_bus_lock:
+            if self._progress_bus is None:
+                self._progress_bus = ProgressBus(
+                    self.render_progress, self.end_progress, self.progress_fps
+                )
+        return self._progress_bus.add_task(description, total)
+
+    def render_progress(self, tasks: list[ProgressTask]) -> None:
+        pass
+
+    def end_progress(self) -> None:
+        pass
+
 
 class Context:
     def __init__(self, messenger: Messenger) -> None:
         self.messenger = messenger
         self.config: Munch = None  # type: ignore
-        if feature_flags.WHISPER:
-            self.whisper_model: Optional[Whisper] = None  # type: ignore
         self.http_client: httpx.Client = httpx.Client(timeout=30)
+
+    def derive(self, **overrides) -> "Context":
+        # a shallow copy sharing config and clients, e.g. with the messenger
+        # swapped for one that talks to a specific chat
+        derived = copy.copy(self)
+        for name, value in overrides.items():
+            setattr(derived, name, value)
+        return derived
@@ -1,10 +1,16 @@
+from typing import Optional
+
 from rich.console import Console as RichConsole
+from rich.errors import MarkupError
 from rich.highlighter import ReprHighlighter as RichHighlighter
 from rich.progress import Progress as RichProgress
+from rich.progress import TaskID
 from rich.table import Table as RichTable
 from rich.theme import Theme as RichTheme
 
+from ...progress import ProgressTask
 from ..base import Messenger
+from ..log_sink import BufferedLogSink
 
 
 class ConsoleMessenger(Messenger):
@@ -32,10 +38,31 @@ class ConsoleMessenger(Messenger):
             }
         )
         self.rich_console = RichConsole(highlighter=highlighter, theme=theme)
+        self._rich_progress: Optional[RichProgress] = None
+        self._rich_task_ids: dict[ProgressTask, TaskID] = {}
+        self._log_sink = BufferedLogSink(self._write_lines)
 
     def send_text(self, *args, **kwargs):
+        # plain single-string lines are batched; anything carrying print()
+        # options or rich renderables goes out directly, after the backlog
+        if not kwargs and len(args) == 1 and isinstance(args[0], str):
+            self._log_sink.append(args[0])
+            return
+
+        self._log_sink.flush()
         self.rich_console.print(*args, **kwargs)
 
+    def flush_output(self) -> None:
+        self._log_sink.flush()
+
+    def _write_lines(self, lines: list[str]) -> None:
+        text = "\n".join(lines)
+        try:
+            self.rich_console.print(text)
+        except MarkupError:
+            # one bad line must not swallow the rest of the batch
+            self.rich_console.print(text, markup=False)
+
     def send_table(
         self,
         title: str,
@@ -44,6 +71,7 @@ class ConsoleMessenger(Messenger):
         show_header: bool = True,
         header_style: str = "bold green",
     ):
+        self._log_sink.flush()
         table = RichTable(
             title=title, show_header=show_header, header_style=header_style
         )
@@ -64,9 +92,35 @@ class ConsoleMessenger(Messenger):
 
         self.rich_console.print(table)
 
-    def send_progress(self, func, *args, **kwargs):
-        with RichProgress(console=self.rich_console) as progress:
-            func(progress, *args, **kwargs)
+    def render_progress(self, tasks: list[ProgressTask]) -> None:
+        self._log_sink.flush()
+        if self._rich_progress is None:
+            self._rich_progress = RichProgress(
+                console=self.rich_console, auto_refresh=False
+            )
+            self._rich_progress.start()
+
+        for task in tasks:
+            task_id = self._rich_task_ids.get(task, None)
+            if task_id is None:
+                task_id = self._rich_progress.add_task(
+                    f"[cyan]{task.description}", total=task.total
+                )
+                self._rich_task_ids[task] = task_id
+            self._rich_progress.update(
+                task_id, completed=task.completed, total=task.total
+            )
+            if task.finished:
+                del self._rich_task_ids[task]
+
+        self._rich_progress.refresh()
+
+    def end_progress(self) -> None:
+        if self._rich_progress is not None:
+            self._rich_progress.stop()
+            self._rich_progress = None
+            self._rich_task_ids.clear()
 
     def send_exception(self, _: Exception) -> None:
+        self._log_sink.flush()
         self.rich_console.print_exception(show_locals=True)  # type: ignore
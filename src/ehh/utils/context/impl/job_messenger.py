@@ -0,0 +1,54 @@
+from typing import Optional
+
+from ...logging import TAG_PATTERN
+from ...progress import ProgressTask
+from ..base import Messenger
+
+
+class JobMessenger(Messenger):
+    # relays a background job's output to the parent messenger, labelled with
+    # the job id, and keeps its progress for the job table instead of drawing
+    # bars that would fight the prompt
+
+    def __init__(self, parent: Messenger, label: str = "") -> None:
+        self.parent = parent
+        self.label = label
+        self.progress: list[ProgressTask] = []
+
+    def send_text(self, *args, **kwargs) -> None:
+        if kwargs or len(args) != 1 or not isinstance(args[0], str):
+            self.parent.send_text(*args, **kwargs)
+            return
+
+        text: str = args[0]
+        # keep the tag in front, where the console highlights it
+        match = TAG_PATTERN.match(text)
+        if match is not None:
+            tag = text[: match.end()].rstrip()
+            text = f"{tag} {self.label} {text[match.end():]}"
+        else:
+            text = f"{self.label} {text}"
+        self.parent.send_text(text)
+
+    def send_table(self, *args, **kwargs) -> None:
+        self.parent.send_table(*args, **kwargs)
+
+    def send_exception(self, exception: Exception) -> None:
+        self.parent.send_exception(exception)
+
+    def flush_output(self) -> None:
+        self.parent.flush_output()
+
+    def track_progress(
+        self, description: str, total: Optional[float] = None
+    ) -> ProgressTask:
+        task = ProgressTask(description, total)
+        self.progress.append(task)
+        return task
+
+    @property
+    def current_progress(self) -> Optional[ProgressTask]:
+        for task in reversed(self.progress):
+            if not task.finished:
+                return task
+        return None
@@ -1,23 +1,246 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+import traceback
+from datetime import timedelta
+from typing import Optional
+
+from telegram.error import NetworkError, RetryAfter, TimedOut
 from telegram.ext import ExtBot
+
+from ...progress import ProgressTask
 from ..base import Messenger
 
+TELEGRAM_MESSAGE_LIMIT = 4096
+FLUSH_INTERVAL = 0.5
+MAX_SEND_ATTEMPTS = 5
+PROGRESS_BAR_WIDTH = 12
+
+
+class AsyncRateLimiter:
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._next_allowed = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def wait(self) -> None:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            now = time.monotonic()
+            if self._next_allowed > now:
+                await asyncio.sleep(self._next_allowed - now)
+                now = self._next_allowed
+            self._next_allowed = now + self.interval
+
+    def penalize(self, seconds: float) -> None:
+        self._next_allowed = max(self._next_allowed, time.monotonic() + seconds)
+
+
+# telegram allows roughly 30 messages per second per bot, 1 per second per
+# private chat and 20 per minute per group
+_global_limiter = AsyncRateLimiter(1 / 30)
+
+
+def _split_message(text: str) -> list[str]:
+    chunks = []
+    while len(text) > TELEGRAM_MESSAGE_LIMIT:
+        cut = text.rfind("\n", 0, TELEGRAM_MESSAGE_LIMIT)
+        if cut <= 0:
+            cut = TELEGRAM_MESSAGE_LIMIT
+        chunks.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    if text:
+        chunks.append(text)
+    return chunks
+
+
+def _get_retry_seconds(retry_after: int | timedelta) -> float:
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
 
 class TelegramMessenger(Messenger):
-    def __init__(self, bot: ExtBot, chat_id: str | int) -> None:
+    # every edit of the status message counts against telegram's rate limits
+    progress_fps = 0.5
+    _instances: dict[str | int, "TelegramMessenger"] = {}
+
+    def __init__(
+        self,
+        bot: ExtBot,
+        chat_id: str | int,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ) -> None:
         self.bot = bot
         self.chat_id = chat_id
+        self.loop = loop or asyncio.get_running_loop()
+        self._chat_limiter = AsyncRateLimiter(
+            3.0 if str(chat_id).startswith("-") else 1.0
+        )
+        # pending items are (text, parse_mode); plain lines get coalesced
+        self._pending: list[tuple[str, Optional[str]]] = []
+        self._pending_lock = threading.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._status_message_id: Optional[int] = None
+        self._status_text: Optional[str] = None
+        self._status_future: Optional[concurrent.futures.Future] = None
+
+    @classmethod
+    def for_chat(cls, bot: ExtBot, chat_id: str | int) -> "TelegramMessenger":
+        # one outbound queue per chat, shared by every context that talks to it
+        messenger = cls._instances.get(chat_id, None)
+        if messenger is None or messenger.loop.is_closed():
+            messenger = cls(bot, chat_id)
+            cls._instances[chat_id] = messenger
+        return messenger
 
     def send_text(self, *args, **kwargs):
-        format_mode = kwargs.get("format_mode")
+        text = kwargs.get("sep", " ").join(str(arg) for arg in args)
+        parse_mode = kwargs.get("parse_mode", None)
+        with self._pending_lock:
+            self._pending.append((text, parse_mode))
+        self.loop.call_soon_threadsafe(self._ensure_flush_task)
+
+    def send_exception(self, exception: Exception) -> None:
+        if exception is None:
+            text = traceback.format_exc()
+        else:
+            text = "".join(traceback.format_exception(exception))
+        self.send_text(f"<error> {text.strip()}")
+
+    def render_progress(self, tasks: list[ProgressTask]) -> None:
+        lines = []
+        for task in tasks:
+            fraction = task.fraction
+            if fraction is None:
+                lines.append(f"⏳ {task.description} {task.completed:.0f}")
+            else:
+                filled = int(fraction * PROGRESS_BAR_WIDTH)
+                bar = "█" * filled + "░" * (PROGRESS_BAR_WIDTH - filled)
+                icon = "✅" if task.finished else "⏳"
+                lines.append(f"{icon} {task.description} {bar} {fraction * 100:.0f}%")
+        self._submit_status("\n".join(lines))
+
+    def end_progress(self) -> None:
+        # let the last frame land before forgetting the status message
+        if self._status_future is not None and not self._status_future.done():
+            try:
+                self._status_future.result(timeout=10)
+            except Exception:
+                pass
+        self._submit_status(None)
+
+    def _submit_status(self, text: Optional[str]) -> None:
+        # called from the progress bus thread; frames are dropped while the
+        # previous edit is still in flight instead of piling up
+        if text is not None and self._status_future is not None:
+            if not self._status_future.done():
+                return
+        self._status_future = asyncio.run_coroutine_threadsafe(
+            self._update_status(text), self.loop
+        )
+
+    async def _update_status(self, text: Optional[str]) -> None:
+        if text is None:
+            self._status_message_id = None
+            self._status_text = None
+            return
+        if text == self._status_text or text == "":
+            return
+
+        await self._chat_limiter.wait()
+        await _global_limiter.wait()
         try:
-            if format_mode is None:
-                self.bot.send_message(chat_id=self.chat_id, text=args[0])
+            if self._status_message_id is None:
+                message = await self.bot.send_message(chat_id=self.chat_id, text=text)
+                self._status_message_id = message.message_id
             else:
-                self.bot.send_message(
-                    chat_id=self.chat_id, text=args[0], format_mode=format_mode
+                await self.bot.edit_message_text(
+                    chat_id=self.chat_id,
+                    message_id=self._status_message_id,
+                    text=text,
+                )
+            self._status_text = text
+        except RetryAfter as e:
+            retry_seconds = _get_retry_seconds(e.retry_after)
+            _global_limiter.penalize(retry_seconds)
+            self._chat_limiter.penalize(retry_seconds)
+        except Exception:
+            # a missed progress frame is harmless; the next one retries
+            pass
+
+    def _ensure_flush_task(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = self.loop.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        # wait a little so that consecutive print() lines end up in one message
+        await asyncio.sleep(FLUSH_INTERVAL)
+        while True:
+            await self.flush()
+            with self._pending_lock:
+                if not self._pending:
+                    return
+
+    def _take_messages(self) -> list[tuple[str, Optional[str]]]:
+        with self._pending_lock:
+            pending = self._pending
+            self._pending = []
+
+        messages: list[tuple[str, Optional[str]]] = []
+        buffer: list[str] = []
+        buffer_len = 0
+        for text, parse_mode in pending:
+            if parse_mode is not None:
+                if buffer:
+                    messages.append(("\n".join(buffer), None))
+                    buffer, buffer_len = [], 0
+                messages.append((text, parse_mode))
+                continue
+
+            if buffer and buffer_len + 1 + len(text) > TELEGRAM_MESSAGE_LIMIT:
+                messages.append(("\n".join(buffer), None))
+                buffer, buffer_len = [], 0
+            buffer.append(text)
+            buffer_len += len(text) + (1 if buffer_len else 0)
+        if buffer:
+            messages.append(("\n".join(buffer), None))
+
+        return [
+            (chunk, parse_mode)
+            for text, parse_mode in messages
+            for chunk in _split_message(text)
+        ]
+
+    async def flush(self) -> None:
+        for text, parse_mode in self._take_messages():
+            await self._send(text, parse_mode)
+
+    async def _send(self, text: str, parse_mode: Optional[str]) -> None:
+        backoff = 1.0
+        for _ in range(MAX_SEND_ATTEMPTS):
+            await self._chat_limiter.wait()
+            await _global_limiter.wait()
+            try:
+                await self.bot.send_message(
+                    chat_id=self.chat_id, text=text, parse_mode=parse_mode
                 )
-        except Exception as e:
-            print(f"<error> failed to send Telegram message: {e}")
+                return
+            except RetryAfter as e:
+                retry_seconds = _get_retry_seconds(e.retry_after)
+                # flood control applies to the whole bot, not only this chat
+                _global_limiter.penalize(retry_seconds)
+                self._chat_limiter.penalize(retry_seconds)
+            except (TimedOut, NetworkError):
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            except Exception as e:
+                print(f"<error> failed to send Telegram message: {e}")
+                return
 
-    def send_progress(self, func, *args, **kwargs) -> None:
-        func(None, *args, **kwargs)
+        print(
+            f"<error> failed to send Telegram message after {MAX_SEND_ATTEMPTS} attempts"
+        )
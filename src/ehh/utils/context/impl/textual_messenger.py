@@ -1,32 +1,92 @@
-from textual.widgets import RichLog
+import re
+from typing import Optional
+
 from textual.app import App
 from textual.css.query import NoMatches
+from textual.widgets import ProgressBar, RichLog
 
+from ...progress import ProgressTask
 from ..base import Messenger
+from ..log_sink import BufferedLogSink
+
+MARKUP_REPLACEMENTS = {
+    "[": "[[",
+    "]": "]]",
+    "<info>": "<[blue]info[/blue]>",
+    "<error>": "<[red]error[/red]>",
+    "<warning>": "<[yellow]warning[/yellow]>",
+    "<success>": "<[b][green]success[/green][/b]>",
+}
+MARKUP_PATTERN = re.compile("|".join(map(re.escape, MARKUP_REPLACEMENTS)))
+
+
+def _translate_markup(match: re.Match) -> str:
+    return MARKUP_REPLACEMENTS[match.group(0)]
 
 
 class TextualMessenger(Messenger):
     def __init__(self, app: App, widget_id: str) -> None:
         self.app = app
         self.widget_id = widget_id
+        self._progress_bars: dict[ProgressTask, ProgressBar] = {}
+        self._log_widget: Optional[RichLog] = None
+        self._log_sink = BufferedLogSink(self._write_lines, max_fps=20.0)
         super().__init__()
 
     def send_text(self, *args, **kwargs):
+        self._log_sink.append(str(args[0]))
+
+    def flush_output(self) -> None:
+        self._log_sink.flush()
+
+    def _get_log_widget(self) -> Optional[RichLog]:
+        if self._log_widget is None or not self._log_widget.is_attached:
+            try:
+                self._log_widget = self.app.query_one("#output-log", RichLog)
+            except NoMatches:
+                self._log_widget = None
+        return self._log_widget
+
+    def _write_lines(self, lines: list[str]) -> None:
+        message = "\n".join(
+            MARKUP_PATTERN.sub(_translate_markup, line) for line in lines
+        )
         try:
-            log_widget = self.app.query_one("#output-log", RichLog)
-        except NoMatches:
+            self.app.call_from_thread(self._write_message, message, lines)
+        except RuntimeError:
+            # already on the app thread
+            self._write_message(message, lines)
+
+    def _write_message(self, message: str, lines: list[str]) -> None:
+        log_widget = self._get_log_widget()
+        if log_widget is None:
             print(
-                f"<warning> could not following in app due to log widget not found:\n{args[0]}"
+                "<warning> could not following in app due to log widget not found:\n"
+                + "\n".join(lines)
             )
             return
 
-        message = (
-            args[0]
-            .replace("[", "[[")
-            .replace("]", "]]")
-            .replace("<info>", "<[blue]info[/blue]>")
-            .replace("<error>", "<[red]error[/red]>")
-            .replace("<warning>", "<[yellow]warning[/yellow]>")
-            .replace("<success>", "<[b][green]success[/green][/b]>")
-        )
         log_widget.write(message)
+
+    def render_progress(self, tasks: list[ProgressTask]) -> None:
+        # the bus renders from its own thread; widgets must be touched on the
+        # app thread
+        self.app.call_from_thread(self._render_progress_bars, tasks)
+
+    def _render_progress_bars(self, tasks: list[ProgressTask]) -> None:
+        try:
+            container = self.app.query_one("#progress-area")
+        except NoMatches:
+            return
+
+        for task in tasks:
+            bar = self._progress_bars.get(task, None)
+            if bar is None:
+                bar = ProgressBar(total=task.total, show_eta=True)
+                bar.tooltip = task.description
+                self._progress_bars[task] = bar
+                container.mount(bar)
+            bar.update(total=task.total, progress=task.completed)
+            if task.finished:
+                del self._progress_bars[task]
+                bar.remove()
@@ -0,0 +1,48 @@
+import atexit
+import threading
+import time
+from typing import Callable
+
+
+class BufferedLogSink:
+    def __init__(
+        self, write: Callable[[list[str]], None], max_fps: float = 30.0
+    ) -> None:
+        self.write = write
+        self.interval = 1.0 / max_fps
+        self._lines: list[str] = []
+        self._lock = threading.Lock()
+        # serializes writers, so batches never interleave or reorder
+        self._write_lock = threading.Lock()
+        self._has_lines = threading.Event()
+        self._thread: threading.Thread | None = None
+        atexit.register(self.flush)
+
+    def append(self, line: str) -> None:
+        with self._lock:
+            self._lines.append(line)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="ehh-log-sink", daemon=True
+                )
+                self._thread.start()
+        self._has_lines.set()
+
+    def flush(self) -> None:
+        with self._write_lock:
+            with self._lock:
+                lines = self._lines
+                self._lines = []
+            if lines:
+                self.write(lines)
+
+    def _run(self) -> None:
+        while True:
+            self._has_lines.wait()
+            # coalesce everything that arrives within one frame
+            time.sleep(self.interval)
+            self._has_lines.clear()
+            try:
+                self.flush()
+            except Exception:
+                pass
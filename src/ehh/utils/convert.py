@@ -1,3 +1,6 @@
+from datetime import datetime
+
+
 def try_parse_int(input_string: str) -> int | None:
     try:
         return int(input_string)
@@ -19,3 +22,35 @@ def mask_string_middle(input_string: str) -> str:
     masked_string = start_revealed + middle_stars + end_revealed
 
     return masked_string
+
+
+def capitalize_first(input_string: str) -> str:
+    # str.capitalize() also lowercases the rest, mangling names and ids
+    return input_string[:1].upper() + input_string[1:]
+
+
+def try_parse_date(input_string: str) -> datetime | None:
+    try:
+        return datetime.strptime(input_string, "%Y-%m-%d")
+    except ValueError:
+        return None
+
+
+def split_flags(args: list[str]) -> tuple[list[str], dict[str, str]]:
+    positionals: list[str] = []
+    flags: dict[str, str] = {}
+
+    index = 0
+    while index < len(args):
+        arg = args[index]
+        if arg.startswith("--") and len(arg) > 2:
+            if index + 1 < len(args) and not args[index + 1].startswith("--"):
+                flags[arg[2:]] = args[index + 1]
+                index += 2
+                continue
+            flags[arg[2:]] = ""
+        else:
+            positionals.append(arg)
+        index += 1
+
+    return positionals, flags
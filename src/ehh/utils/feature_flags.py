@@ -3,3 +3,4 @@ from importlib.util import find_spec
 WHISPER: bool = find_spec("whisper") is not None
 SELENIUM: bool = find_spec("selenium") is not None
 TEXTUAL: bool = find_spec("textual") is not None
+LXML: bool = find_spec("lxml") is not None
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 from platformdirs import PlatformDirs
@@ -5,7 +6,9 @@ from platformdirs import PlatformDirs
 PLATFORM_DIRS = PlatformDirs(appname="ehh", appauthor="ujhhgtg", ensure_exists=True)
 
 CONFIG_DIR = Path(PLATFORM_DIRS.user_config_dir)
-CACHE_DIR = Path(PLATFORM_DIRS.user_cache_dir)
+# EHH_CACHE_DIR relocates the cache, e.g. to run benchmarks against an empty one
+CACHE_DIR = Path(os.environ.get("EHH_CACHE_DIR", None) or PLATFORM_DIRS.user_cache_dir)
+CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
 
 def read_file_text(path: str | Path) -> str:
@@ -0,0 +1,327 @@
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from ..models.homework_kind import HomeworkKind
+from ..models.homework_record import HomeworkRecord
+from ..models.homework_status import HomeworkStatus
+from .constants import TIME_FORMAT
+from .convert import try_parse_date
+from .fs import CACHE_DIR
+from .search_index import get_hw_id
+
+HOMEWORK_STORE_FILE = CACHE_DIR / "homework.db"
+
+# ids come from AUTOINCREMENT and rows are never deleted, so an id keeps
+# pointing at the same homework however the remote list shifts. rows belong
+# to the account (Credentials.account_key) whose list they came from, and
+# every query is scoped to one account. the api_* columns are left untyped
+# so gateway ids come back as the type they were sent as; a TEXT column
+# would turn numeric ids into strings
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS homework (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    account TEXT NOT NULL,
+    hw_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    publisher_name TEXT NOT NULL,
+    publish_time TEXT NOT NULL,
+    status TEXT,
+    current_score REAL,
+    total_score REAL NOT NULL,
+    api_id,
+    api_task_id,
+    api_task_paper_id,
+    api_batch_id,
+    api_sentence_id,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    UNIQUE (account, hw_id)
+);
+CREATE INDEX IF NOT EXISTS homework_status
+    ON homework (account, status, publish_time);
+CREATE INDEX IF NOT EXISTS homework_kind ON homework (account, kind, publish_time);
+CREATE INDEX IF NOT EXISTS homework_publisher
+    ON homework (account, publisher_name COLLATE NOCASE, publish_time);
+CREATE INDEX IF NOT EXISTS homework_publish_time ON homework (account, publish_time);
+"""
+
+_COLUMNS = (
+    "id, title, kind, publisher_name, publish_time, status, current_score,"
+    " total_score, api_id, api_task_id, api_task_paper_id, api_batch_id,"
+    " api_sentence_id"
+)
+
+# bumped whenever _SCHEMA changes; stored in PRAGMA user_version
+SCHEMA_VERSION = 2
+# rows of stores from before the account column; the first account whose
+# list contains one claims it, so a single-account store keeps its ids
+UNOWNED_ACCOUNT = ""
+
+# rebuilds an older store straight into the current schema, keeping ids:
+# version 0 declared the api_* columns TEXT, and 0 and 1 had no account
+_REBUILD = (
+    """
+ALTER TABLE homework RENAME TO homework_old;
+DROP INDEX homework_status;
+DROP INDEX homework_kind;
+DROP INDEX homework_publisher;
+DROP INDEX homework_publish_time;
+"""
+    + _SCHEMA
+    + f"""
+INSERT INTO homework (id, account, hw_id, title, kind, publisher_name,
+    publish_time, status, current_score, total_score, api_id, api_task_id,
+    api_task_paper_id, api_batch_id, api_sentence_id, first_seen, last_seen)
+SELECT id, '{UNOWNED_ACCOUNT}', hw_id, title, kind, publisher_name,
+    publish_time, status, current_score, total_score, restore_int(api_id),
+    restore_int(api_task_id), restore_int(api_task_paper_id),
+    restore_int(api_batch_id), restore_int(api_sentence_id), first_seen,
+    last_seen
+FROM homework_old;
+DROP TABLE homework_old;
+"""
+)
+
+_lock = threading.Lock()
+_connection: Optional[sqlite3.Connection] = None
+
+
+def _restore_int(value):
+    # undoes TEXT affinity; the next list refresh rewrites the value anyway
+    if isinstance(value, str) and value.isdigit() and str(int(value)) == value:
+        return int(value)
+    return value
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    has_table = (
+        conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'homework'"
+        ).fetchone()
+        is not None
+    )
+    script = _REBUILD if has_table and version < SCHEMA_VERSION else ""
+    conn.create_function("restore_int", 1, _restore_int, deterministic=True)
+    try:
+        conn.executescript(
+            f"BEGIN; {script} {_SCHEMA} PRAGMA user_version = {SCHEMA_VERSION}; COMMIT;"
+        )
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+
+def _get_connection() -> sqlite3.Connection:
+    global _connection
+    if _connection is None:
+        conn = sqlite3.connect(HOMEWORK_STORE_FILE, check_same_thread=False)
+        _migrate(conn)
+        _connection = conn
+    return _connection
+
+
+def _from_row(row: tuple) -> HomeworkRecord:
+    return HomeworkRecord(
+        store_id=row[0],
+        title=row[1],
+        kind=HomeworkKind(row[2]),
+        publisher_name=row[3],
+        publish_time=datetime.strptime(row[4], TIME_FORMAT),
+        status=HomeworkStatus[row[5]] if row[5] is not None else None,
+        current_score=row[6],
+        total_score=row[7],
+        api_id=row[8],
+        api_task_id=row[9],
+        api_task_paper_id=row[10],
+        api_batch_id=row[11],
+        api_sentence_id=row[12],
+    )
+
+
+def upsert_records(account: str, records: Iterable[HomeworkRecord]) -> int:
+    # stores the account's records and sets store_id on each; returns how
+    # many were new
+    now = datetime.now().strftime(TIME_FORMAT)
+    new_count = 0
+    with _lock:
+        conn = _get_connection()
+        with conn:
+            for record in records:
+                hw_id = get_hw_id(record)
+                # the account's own row, else an unowned one to claim
+                row = conn.execute(
+                    "SELECT id FROM homework WHERE hw_id = ? AND account IN (?, ?)"
+                    " ORDER BY account = ? LIMIT 1",
+                    (hw_id, account, UNOWNED_ACCOUNT, UNOWNED_ACCOUNT),
+                ).fetchone()
+                values = (
+                    account,
+                    record.title,
+                    record.kind.value,
+                    record.publisher_name,
+                    record.publish_time.strftime(TIME_FORMAT),
+                    record.status.name if record.status is not None else None,
+                    record.current_score,
+                    record.total_score,
+                    record.api_id,
+                    record.api_task_id,
+                    record.api_task_paper_id,
+                    record.api_batch_id,
+                    record.api_sentence_id,
+                    now,
+                )
+                if row is not None:
+                    conn.execute(
+                        "UPDATE homework SET account = ?, title = ?, kind = ?,"
+                        " publisher_name = ?,"
+                        " publish_time = ?, status = ?, current_score = ?,"
+                        " total_score = ?, api_id = ?, api_task_id = ?,"
+                        " api_task_paper_id = ?, api_batch_id = ?,"
+                        " api_sentence_id = ?, last_seen = ? WHERE id = ?",
+                        values + (row[0],),
+                    )
+                    record.store_id = row[0]
+                    continue
+
+                cursor = conn.execute(
+                    "INSERT INTO homework (account, title, kind, publisher_name,"
+                    " publish_time, status, current_score, total_score, api_id,"
+                    " api_task_id, api_task_paper_id, api_batch_id,"
+                    " api_sentence_id, last_seen, hw_id, first_seen)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    values + (hw_id, now),
+                )
+                record.store_id = cursor.lastrowid
+                new_count += 1
+    return new_count
+
+
+# the read functions take Optional[str] accounts: None (no account selected)
+# matches nothing
+
+
+def get_record(account: Optional[str], store_id: int) -> Optional[HomeworkRecord]:
+    with _lock:
+        row = (
+            _get_connection()
+            .execute(
+                f"SELECT {_COLUMNS} FROM homework WHERE account = ? AND id = ?",
+                (account, store_id),
+            )
+            .fetchone()
+        )
+    return _from_row(row) if row is not None else None
+
+
+def get_hw_ids(account: Optional[str]) -> list[str]:
+    # served by the (account, hw_id) unique index alone
+    with _lock:
+        rows = (
+            _get_connection()
+            .execute("SELECT hw_id FROM homework WHERE account = ?", (account,))
+            .fetchall()
+        )
+    return [row[0] for row in rows]
+
+
+def get_store_ids(account: Optional[str], hw_ids: Iterable[str]) -> dict[str, int]:
+    hw_ids = list(hw_ids)
+    if len(hw_ids) == 0:
+        return {}
+    with _lock:
+        rows = (
+            _get_connection()
+            .execute(
+                "SELECT hw_id, id FROM homework WHERE account = ? AND hw_id IN"
+                f" ({', '.join('?' * len(hw_ids))})",
+                [account, *hw_ids],
+            )
+            .fetchall()
+        )
+    return dict(rows)
+
+
+def _build_filter(
+    account: Optional[str],
+    status: Optional[HomeworkStatus] = None,
+    kind: Optional[HomeworkKind] = None,
+    publisher: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> tuple[str, list]:
+    # every filter is served by one of the indexes above
+    sql = " WHERE account = ?"
+    params: list = [account]
+    if status is not None:
+        sql += " AND status = ?"
+        params.append(status.name)
+    if kind is not None:
+        sql += " AND kind = ?"
+        params.append(kind.value)
+    if publisher is not None:
+        sql += " AND publisher_name = ? COLLATE NOCASE"
+        params.append(publisher)
+    if since is not None:
+        sql += " AND publish_time >= ?"
+        params.append(since.strftime(TIME_FORMAT))
+    if until is not None:
+        # until names a day, and items published during it are included
+        sql += " AND publish_time < ?"
+        params.append((until + timedelta(days=1)).strftime(TIME_FORMAT))
+    return sql, params
+
+
+def query_records(
+    account: Optional[str],
+    limit: Optional[int] = None,
+    offset: int = 0,
+    **filters,
+) -> list[HomeworkRecord]:
+    # newest first, like the list the gateway returns; limit and offset
+    # select one page, so callers only ever materialize what they show
+    where, params = _build_filter(account, **filters)
+    sql = f"SELECT {_COLUMNS} FROM homework{where} ORDER BY publish_time DESC, id DESC"
+    if limit is not None:
+        sql += " LIMIT ? OFFSET ?"
+        params.extend((limit, offset))
+
+    with _lock:
+        rows = _get_connection().execute(sql, params).fetchall()
+    return [_from_row(row) for row in rows]
+
+
+def count_records(account: Optional[str], **filters) -> int:
+    where, params = _build_filter(account, **filters)
+    with _lock:
+        row = (
+            _get_connection()
+            .execute(f"SELECT COUNT(*) FROM homework{where}", params)
+            .fetchone()
+        )
+    return row[0]
+
+
+def parse_record_filters(flags: dict[str, str]) -> dict:
+    # --status/--kind/--publisher/--since/--until into query_records keywords;
+    # raises ValueError with a message fit for the user
+    filters: dict = {}
+    if "status" in flags:
+        filters["status"] = HomeworkStatus.from_name(flags["status"])
+        if filters["status"] is None:
+            raise ValueError(f"unknown status: {flags['status']}")
+    if "kind" in flags:
+        filters["kind"] = HomeworkKind.from_name(flags["kind"])
+        if filters["kind"] is None:
+            raise ValueError(f"unknown kind: {flags['kind']}")
+    if flags.get("publisher", "") != "":
+        filters["publisher"] = flags["publisher"]
+    for key in ("since", "until"):
+        if key in flags:
+            filters[key] = try_parse_date(flags[key])
+            if filters[key] is None:
+                raise ValueError("invalid date; expected format: yyyy-mm-dd")
+    return filters
@@ -0,0 +1,94 @@
+import time
+from pathlib import Path
+from typing import Optional
+
+import httpx
+from munch import Munch
+
+from .constants import BASE_URL
+from .fs import CACHE_DIR
+from .http_cassette import RecordingTransport, ReplayTransport
+from .logging import print
+from .metrics import GATEWAY_LATENCY, GATEWAY_REQUESTS
+from .tracing import get_tracer, span
+
+HTTP_CASSETTE_FILE = CACHE_DIR / "http_cassette.jsonl"
+GATEWAY_HOST = httpx.URL(BASE_URL).host
+EXTERNAL_ENDPOINT = "<external>"
+CASSETTE_MODES = ["record", "replay"]
+
+
+class InstrumentedTransport(httpx.BaseTransport):
+    # one span and one latency sample per gateway request, covering the time
+    # until the response headers arrive (streamed bodies are read afterwards)
+
+    def __init__(self, inner: httpx.BaseTransport) -> None:
+        self.inner = inner
+
+    def _get_endpoint(self, request: httpx.Request) -> str:
+        # file hosts have a path per file; keep the label set bounded
+        if request.url.host != GATEWAY_HOST:
+            return EXTERNAL_ENDPOINT
+        return request.url.path
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        endpoint = self._get_endpoint(request)
+        start = time.perf_counter()
+        try:
+            response = self._handle_request(request)
+        except httpx.TransportError:
+            GATEWAY_REQUESTS.inc(endpoint=endpoint, status="error")
+            raise
+        GATEWAY_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint)
+        GATEWAY_REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+        return response
+
+    def _handle_request(self, request: httpx.Request) -> httpx.Response:
+        if get_tracer() is None:
+            return self.inner.handle_request(request)
+
+        with span(
+            f"{request.method} {request.url.path}",
+            "http",
+            url=request.url.copy_with(query=None),
+        ) as current:
+            response = self.inner.handle_request(request)
+            current.set("status", response.status_code)
+            return response
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+def _get_cassette_transport(config: Munch) -> Optional[httpx.BaseTransport]:
+    cassette_config = getattr(config, "http_cassette", None)
+    mode = getattr(cassette_config, "mode", None)
+    if mode is None:
+        return None
+
+    path = Path(getattr(cassette_config, "path", None) or HTTP_CASSETTE_FILE)
+    redact = getattr(cassette_config, "redact", None) or []
+    if mode == "record":
+        print(f"<warning> recording http traffic to '{path}'")
+        return RecordingTransport(path, redact=redact)
+    if mode == "replay":
+        if not path.is_file():
+            raise FileNotFoundError(f"http cassette not found at {path}")
+        latency = getattr(cassette_config, "latency", None) or "original"
+        print(f"<warning> replaying http traffic from '{path}' ({latency} latency)")
+        return ReplayTransport(path, latency=latency, redact=redact)
+
+    raise ValueError(
+        f"unknown http cassette mode: {mode}; supported: {', '.join(CASSETTE_MODES)}"
+    )
+
+
+def is_replaying(config: Munch) -> bool:
+    return getattr(getattr(config, "http_cassette", None), "mode", None) == "replay"
+
+
+def create_http_client(config: Munch) -> httpx.Client:
+    # the client every task talks to the gateway through; http_cassette.mode
+    # swaps its transport for a recording or replaying one
+    transport = _get_cassette_transport(config) or httpx.HTTPTransport()
+    return httpx.Client(base_url=BASE_URL, transport=InstrumentedTransport(transport))
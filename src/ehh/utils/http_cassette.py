@@ -0,0 +1,228 @@
+import base64
+import collections
+import json
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+import httpx
+
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+REDACTED = "<redacted>"
+REDACTED_HEADERS = {"authorization", "cookie", "set-cookie", "proxy-authorization"}
+# query parameters and json fields whose values never reach the cassette
+REDACTED_FIELDS = {
+    "password",
+    "username",
+    "client_secret",
+    "access_token",
+    "refresh_token",
+    "jti",
+}
+# the body is stored decoded, so the framing headers no longer apply
+DROPPED_RESPONSE_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+LATENCY_MODES = ["original", "zero"]
+
+
+class CassetteMissError(httpx.TransportError):
+    pass
+
+
+class _Redactor:
+    def __init__(self, fields: Iterable[str] = ()) -> None:
+        self.fields = REDACTED_FIELDS | {f.lower() for f in fields}
+
+    def _value(self, value: Any) -> Any:
+        if isinstance(value, dict):
+            return {
+                k: REDACTED if k.lower() in self.fields else self._value(v)
+                for k, v in value.items()
+            }
+        if isinstance(value, list):
+            return [self._value(v) for v in value]
+        return value
+
+    def url(self, url: httpx.URL) -> str:
+        params = [
+            (k, REDACTED if k.lower() in self.fields else v)
+            for k, v in sorted(url.params.multi_items())
+        ]
+        return str(url.copy_with(params=params, fragment=None))
+
+    def headers(self, headers: httpx.Headers) -> dict[str, str]:
+        return {
+            k: REDACTED if k.lower() in REDACTED_HEADERS else v
+            for k, v in headers.items()
+        }
+
+    def body(self, content: bytes, content_type: str) -> dict:
+        # json is redacted and kept readable (and comparable, with sorted
+        # keys); anything else is stored as base64
+        if "json" in content_type or content_type == "":
+            try:
+                data = json.loads(content) if content else None
+            except ValueError:
+                pass
+            else:
+                if data is not None:
+                    return {
+                        "json": json.dumps(
+                            self._value(data), ensure_ascii=False, sort_keys=True
+                        )
+                    }
+        if len(content) == 0:
+            return {}
+        return {"base64": base64.b64encode(content).decode("ascii")}
+
+
+def _decode_body(body: dict) -> bytes:
+    if "json" in body:
+        return body["json"].encode("utf-8")
+    if "base64" in body:
+        return base64.b64decode(body["base64"])
+    return b""
+
+
+def _request_key(method: str, url: str, body: dict) -> str:
+    return f"{method} {url} {body.get('json', body.get('base64', ''))}"
+
+
+class RecordingTransport(httpx.BaseTransport):
+    # passes requests through to the real transport and appends every
+    # exchange, with its timing, to a json lines cassette. credentials are
+    # redacted before anything is written
+    #
+    # responses are read fully before being handed back, so streamed
+    # downloads still work but are buffered in memory while recording
+
+    def __init__(
+        self,
+        path: Path,
+        inner: Optional[httpx.BaseTransport] = None,
+        redact: Iterable[str] = (),
+    ) -> None:
+        self.path = path
+        self.inner = inner or httpx.HTTPTransport()
+        self._redactor = _Redactor(redact)
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # a recording session starts a fresh cassette
+        path.write_text("", encoding="utf-8")
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        response = self.inner.handle_request(request)
+        try:
+            content = response.read()
+        finally:
+            response.close()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        headers = [
+            (k, v)
+            for k, v in response.headers.multi_items()
+            if k.lower() not in DROPPED_RESPONSE_HEADERS
+        ]
+        interaction = {
+            "recorded_at": datetime.now().isoformat(),
+            "elapsed_ms": elapsed_ms,
+            "request": {
+                "method": request.method,
+                "url": self._redactor.url(request.url),
+                "headers": self._redactor.headers(request.headers),
+                "body": self._redactor.body(
+                    request.read(), request.headers.get("content-type", "")
+                ),
+            },
+            "response": {
+                "status": response.status_code,
+                "headers": [
+                    [k, REDACTED if k.lower() in REDACTED_HEADERS else v]
+                    for k, v in headers
+                ],
+                "body": self._redactor.body(
+                    content, response.headers.get("content-type", "")
+                ),
+            },
+        }
+        line = json.dumps(interaction, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, "at", encoding="utf-8") as f:
+                f.write(line)
+
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=headers,
+            content=content,
+            extensions={"http_version": response.extensions.get("http_version", b"")},
+        )
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+class ReplayTransport(httpx.BaseTransport):
+    # serves a recorded cassette without touching the network. requests are
+    # matched on method, redacted url and redacted body; repeated requests
+    # get the recorded responses in order, and the last one once they run out
+    #
+    # latency "original" sleeps for the recorded time, "zero" answers at once
+
+    def __init__(
+        self, path: Path, latency: str = "original", redact: Iterable[str] = ()
+    ) -> None:
+        if latency not in LATENCY_MODES:
+            raise ValueError(
+                f"unknown cassette latency mode: {latency}; supported: {', '.join(LATENCY_MODES)}"
+            )
+        self.path = path
+        self.latency = latency
+        self._redactor = _Redactor(redact)
+        self._lock = threading.Lock()
+        self._interactions: dict[str, collections.deque] = collections.defaultdict(
+            collections.deque
+        )
+
+        count = 0
+        with open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                interaction = json.loads(line)
+                request = interaction["request"]
+                key = _request_key(request["method"], request["url"], request["body"])
+                self._interactions[key].append(interaction)
+                count += 1
+        logger.info("loaded %d recorded http exchange(s) from %s", count, path)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        key = _request_key(
+            request.method,
+            self._redactor.url(request.url),
+            self._redactor.body(
+                request.read(), request.headers.get("content-type", "")
+            ),
+        )
+        with self._lock:
+            queue = self._interactions.get(key, None)
+            if not queue:
+                raise CassetteMissError(
+                    f"no recorded response for {request.method} {self._redactor.url(request.url)}",
+                    request=request,
+                )
+            interaction = queue.popleft() if len(queue) > 1 else queue[0]
+
+        if self.latency == "original":
+            time.sleep(interaction["elapsed_ms"] / 1000)
+
+        response = interaction["response"]
+        return httpx.Response(
+            status_code=response["status"],
+            headers=[tuple(h) for h in response["headers"]],
+            content=_decode_body(response["body"]),
+        )
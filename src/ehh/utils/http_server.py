@@ -0,0 +1,214 @@
+import asyncio
+import json
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from typing import Any, Awaitable, Callable, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+from .logging import get_logger, print
+
+logger = get_logger(__name__)
+
+MAX_HEADER_COUNT = 100
+MAX_BODY_SIZE = 1024 * 1024
+# idle keep-alive connections are dropped after this long
+KEEP_ALIVE_TIMEOUT = 75.0
+
+
+@dataclass
+class HttpRequest:
+    method: str
+    path: str
+    query: dict[str, str]
+    # header names are lower-cased
+    headers: dict[str, str]
+    body: bytes
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+
+@dataclass
+class HttpResponse:
+    status: int = 200
+    body: bytes = b""
+    content_type: str = "text/plain; charset=utf-8"
+    headers: dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def text(cls, text: str, status: int = 200) -> "HttpResponse":
+        return cls(status=status, body=text.encode("utf-8"))
+
+    @classmethod
+    def error(cls, status: int) -> "HttpResponse":
+        return cls.text(HTTPStatus(status).phrase, status=status)
+
+
+HttpHandler = Callable[[HttpRequest], Awaitable[HttpResponse]]
+
+
+class _BadRequest(Exception):
+    def __init__(self, status: int) -> None:
+        super().__init__(status)
+        self.status = status
+
+
+class HttpServer:
+    # a deliberately small HTTP/1.1 server: enough for webhooks and metrics
+    # endpoints, with keep-alive and Content-Length bodies, no chunked uploads
+
+    def __init__(
+        self, host: str, port: int, max_body_size: int = MAX_BODY_SIZE
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.max_body_size = max_body_size
+        self._routes: dict[tuple[str, str], HttpHandler] = {}
+        self._server: Optional[asyncio.Server] = None
+        self._connections: set[asyncio.Task] = set()
+        # connections currently waiting for a new request, safe to drop
+        self._idle: set[asyncio.StreamWriter] = set()
+        self._closing = False
+
+    def route(self, method: str, path: str, handler: HttpHandler) -> None:
+        self._routes[(method.upper(), path)] = handler
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(
+            self._on_connection, self.host, self.port
+        )
+        # port 0 asks the os for a free port; report the one we got
+        self.port = self._server.sockets[0].getsockname()[1]
+        print(f"<info> http server listening on {self.host}:{self.port}")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        # stop accepting, drop idle keep-alive connections, and give requests
+        # that are being handled a chance to finish
+        if self._server is None:
+            return
+        self._closing = True
+        self._server.close()
+        for writer in list(self._idle):
+            writer.close()
+
+        if self._connections:
+            _, pending = await asyncio.wait(self._connections, timeout=timeout)
+            for task in pending:
+                task.cancel()
+        self._server = None
+
+    def _on_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        task = asyncio.get_running_loop().create_task(
+            self._serve_connection(reader, writer)
+        )
+        self._connections.add(task)
+        task.add_done_callback(self._connections.discard)
+
+    async def _serve_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while not self._closing:
+                self._idle.add(writer)
+                try:
+                    request_line = await asyncio.wait_for(
+                        reader.readline(), KEEP_ALIVE_TIMEOUT
+                    )
+                finally:
+                    self._idle.discard(writer)
+                if not request_line:
+                    return
+
+                try:
+                    request = await self._read_request(request_line, reader)
+                except _BadRequest as e:
+                    await self._write_response(
+                        writer, HttpResponse.error(e.status), keep_alive=False
+                    )
+                    return
+
+                response = await self._dispatch(request)
+                keep_alive = (
+                    request.headers.get("connection", "").lower() != "close"
+                    and not self._closing
+                )
+                await self._write_response(writer, response, keep_alive)
+                if not keep_alive:
+                    return
+        except (asyncio.TimeoutError, ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(
+        self, request_line: bytes, reader: asyncio.StreamReader
+    ) -> HttpRequest:
+        try:
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise _BadRequest(400)
+
+        headers: dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            if len(headers) >= MAX_HEADER_COUNT:
+                raise _BadRequest(431)
+            name, sep, value = line.decode("latin-1").partition(":")
+            if not sep:
+                raise _BadRequest(400)
+            headers[name.strip().lower()] = value.strip()
+
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise _BadRequest(411)
+        try:
+            content_length = int(headers.get("content-length", "0"))
+        except ValueError:
+            raise _BadRequest(400)
+        if content_length < 0:
+            raise _BadRequest(400)
+        if content_length > self.max_body_size:
+            raise _BadRequest(413)
+        body = await reader.readexactly(content_length) if content_length else b""
+
+        url = urlsplit(target)
+        return HttpRequest(
+            method=method.upper(),
+            path=url.path,
+            query=dict(parse_qsl(url.query)),
+            headers=headers,
+            body=body,
+        )
+
+    async def _dispatch(self, request: HttpRequest) -> HttpResponse:
+        handler = self._routes.get((request.method, request.path), None)
+        if handler is None:
+            if any(path == request.path for _, path in self._routes):
+                return HttpResponse.error(405)
+            return HttpResponse.error(404)
+
+        try:
+            return await handler(request)
+        except Exception as e:
+            logger.error(
+                "http handler for %s %s failed: %s", request.method, request.path, e
+            )
+            return HttpResponse.error(500)
+
+    async def _write_response(
+        self, writer: asyncio.StreamWriter, response: HttpResponse, keep_alive: bool
+    ) -> None:
+        status = HTTPStatus(response.status)
+        lines = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            f"Content-Type: {response.content_type}",
+            f"Content-Length: {len(response.body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        lines.extend(f"{name}: {value}" for name, value in response.headers.items())
+        head = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+        writer.write(head + response.body)
+        await writer.drain()
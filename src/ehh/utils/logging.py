@@ -1,35 +1,234 @@
 import inspect
+import json
+import logging
+import re
+import sys
+import time
+from datetime import datetime
 from pathlib import Path
 
 import pyperclip
-from rich.progress import BarColumn, Progress, TextColumn, TimeRemainingColumn
+from munch import Munch
 
 from .. import globalvars
+from .metrics import DOWNLOAD_BYTES, DOWNLOAD_THROUGHPUT
+from .tracing import span
 
 _original_print = print
 
+SUCCESS = 25
+# untagged lines are command output (homework text, help...) and are never
+# filtered by level
+OUTPUT = 60
+logging.addLevelName(SUCCESS, "SUCCESS")
+logging.addLevelName(OUTPUT, "OUTPUT")
+
+TAG_LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "tip": logging.INFO,
+    "success": SUCCESS,
+    "warning": logging.WARNING,
+    "error": logging.ERROR,
+}
+LEVEL_TAGS = {
+    logging.DEBUG: "debug",
+    logging.INFO: "info",
+    SUCCESS: "success",
+    logging.WARNING: "warning",
+    logging.ERROR: "error",
+    logging.CRITICAL: "error",
+}
+TAG_PATTERN = re.compile(r"<(debug|info|tip|success|warning|error)> ?", re.IGNORECASE)
+ROOT_LOGGER_NAME = "ehh"
+
+
+class EhhLogger(logging.Logger):
+    def success(self, msg, *args, **kwargs) -> None:
+        if self.isEnabledFor(SUCCESS):
+            self._log(SUCCESS, msg, args, **kwargs)
+
+
+class MessengerHandler(logging.Handler):
+    def emit(self, record: logging.LogRecord) -> None:
+        tag = getattr(record, "tag", LEVEL_TAGS.get(record.levelno, None))
+        text = record.getMessage()
+        if tag is not None:
+            text = f"<{tag}> {text}"
+
+        context = globalvars.get_context()
+        if not context or not context.messenger:
+            _original_print("(null ctx fallback) ", end="")
+            _original_print(text)
+            return
+
+        context.messenger.send_text(text)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        tag = getattr(record, "tag", None)
+        if tag is not None:
+            entry["tag"] = tag
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def _setup_root_logger() -> logging.Logger:
+    logging.setLoggerClass(EhhLogger)
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    logging.setLoggerClass(logging.Logger)
+
+    root.setLevel(logging.INFO)
+    root.propagate = False
+    root.addHandler(MessengerHandler())
+    return root
+
+
+_root_logger = _setup_root_logger()
+_json_handler: logging.Handler | None = None
+_loggers: dict[str, EhhLogger] = {}
+
+
+def get_logger(name: str) -> EhhLogger:
+    logger = _loggers.get(name, None)
+    if logger is not None:
+        return logger
+
+    # modules run via 'python -m' are called '__main__'; keep everything under
+    # the 'ehh' hierarchy so handlers and per-module levels apply
+    full_name = (
+        name if name.startswith(ROOT_LOGGER_NAME) else f"{ROOT_LOGGER_NAME}.{name}"
+    )
+    logging.setLoggerClass(EhhLogger)
+    logger = logging.getLogger(full_name)
+    logging.setLoggerClass(logging.Logger)
+    _loggers[name] = logger  # type: ignore
+    return logger  # type: ignore
+
+
+def _parse_level(level: str | int | None, default: int) -> int:
+    if level is None:
+        return default
+    if isinstance(level, int):
+        return level
+    parsed = TAG_LEVELS.get(level.lower(), None) or logging.getLevelName(level.upper())
+    # getLevelName answers an unknown name with the string "Level NAME"
+    if not isinstance(parsed, int):
+        print(
+            f"<warning> unknown log level '{level}'; using {logging.getLevelName(default)}"
+        )
+        return default
+    return parsed
+
+
+def configure_logging(config: Munch) -> None:
+    global _json_handler
+
+    logging_config = getattr(config, "logging", None)
+    _root_logger.setLevel(
+        _parse_level(getattr(logging_config, "level", None), logging.INFO)
+    )
+
+    for name, level in (getattr(logging_config, "levels", None) or {}).items():
+        get_logger(name).setLevel(_parse_level(level, logging.NOTSET))
+
+    if _json_handler is not None:
+        _root_logger.removeHandler(_json_handler)
+        _json_handler.close()
+        _json_handler = None
+
+    json_file = getattr(logging_config, "json_file", None)
+    if json_file:
+        _json_handler = logging.FileHandler(json_file, encoding="utf-8")
+        _json_handler.setFormatter(JsonLinesFormatter())
+        _root_logger.addHandler(_json_handler)
+
 
 def print(*args, **kwargs):
-    if not globalvars.context or not globalvars.context.messenger:
-        _original_print("(null ctx fallback) ", end="")
-        _original_print(*args, **kwargs)
+    frame_globals = sys._getframe(1).f_globals
+    spec = frame_globals.get("__spec__", None)
+    logger = get_logger(
+        spec.name if spec is not None else frame_globals.get("__name__", "")
+    )
+
+    # rich renderables and print() options cannot go through the logger;
+    # they are output by definition
+    if kwargs or len(args) != 1 or not isinstance(args[0], str):
+        context = globalvars.get_context()
+        if not context or not context.messenger:
+            _original_print("(null ctx fallback) ", end="")
+            _original_print(*args, **kwargs)
+            return
+        context.messenger.send_text(*args, **kwargs)
         return
 
-    globalvars.context.messenger.send_text(*args, **kwargs)
+    text: str = args[0]
+    match = TAG_PATTERN.match(text)
+    if match is not None:
+        tag = match.group(1).lower()
+        level = TAG_LEVELS[tag]
+        text = text[match.end() :]
+    elif text.startswith("---"):
+        tag = None
+        level = logging.INFO
+    else:
+        tag = None
+        level = OUTPUT
 
+    if logger.isEnabledFor(level):
+        # the text is already formatted; pass it as an argument so '%' in it
+        # is never interpreted
+        logger._log(level, "%s", (text,), extra={"tag": tag})
 
-def download_file_with_progress(progress, url: str, filename: str):
-    with globalvars.context.http_client.stream("GET", url) as response:
+
+def download_file_with_progress(
+    url: str, filename: str | Path, rate_limiter=None, show_progress: bool = True
+):
+    # download next to the target and rename when done, so readers never see
+    # a partially written file
+    part_path = Path(f"{filename}.part")
+    context = globalvars.get_context()
+    with (
+        span("download", "download", url=url) as current,
+        context.http_client.stream("GET", url) as response,
+    ):
         response.raise_for_status()
-        total = int(response.headers.get("Content-Length", 0))
+        total = int(response.headers.get("Content-Length", 0)) or None
+        current.set("bytes", total)
+        start = time.perf_counter()
+        downloaded = 0
+
+        progress = None
+        if show_progress:
+            progress = context.messenger.track_progress("Downloading...", total=total)
 
-        with open(filename, "wb") as f:
+        try:
+            with open(part_path, "wb") as f:
+                for chunk in response.iter_bytes(chunk_size=65536):
+                    if rate_limiter is not None:
+                        rate_limiter.acquire(len(chunk))
+                    f.write(chunk)
+                    downloaded += len(chunk)
+                    if progress is not None:
+                        progress.advance(len(chunk))
+        finally:
             if progress is not None:
-                task_id = progress.add_task("[cyan]Downloading...", total=total)
-            for chunk in response.iter_bytes(chunk_size=8192):
-                f.write(chunk)
-                if progress is not None:
-                    progress.update(task_id, advance=len(chunk))  # type: ignore
+                progress.finish()
+
+    part_path.replace(filename)
+    seconds = time.perf_counter() - start
+    DOWNLOAD_BYTES.inc(downloaded)
+    if seconds > 0:
+        DOWNLOAD_THROUGHPUT.observe(downloaded / seconds)
 
 
 def print_and_copy_path(path: str | Path) -> None:
@@ -57,34 +256,21 @@ def patch_whisper_transcribe_progress():
     ) as pbar:
     """
 
-    rich_ctx_line = """
-    with Progress(
-        TextColumn("[progress.description]{task.description}"),
-        BarColumn(),
-        TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
-        TimeRemainingColumn(),
-        console=globalvars.context.messenger.rich_console,
-    ) as progress:
-        task_id = progress.add_task("[cyan]Transcribing...", total=content_frames)
+    # the ProgressTask returned by track_progress is tqdm-compatible, so the
+    # existing pbar.update() calls keep working unchanged
+    messenger_ctx_line = """
+    with globalvars.get_context().messenger.track_progress(
+        "Transcribing...", total=content_frames
+    ) as pbar:
     """
 
-    patched_source = original_source.replace(tqdm_ctx_line, rich_ctx_line)
-
-    tqdm_update_line = "pbar.update(min(content_frames, seek) - previous_seek)"
-    rich_update_line = (
-        "progress.update(task_id, advance=min(content_frames, seek) - previous_seek)"
-    )
-    patched_source = patched_source.replace(tqdm_update_line, rich_update_line)
+    patched_source = original_source.replace(tqdm_ctx_line, messenger_ctx_line)
 
     whisper.transcribe  # type: ignore
     execution_scope = whisper.transcribe.__dict__.copy()
     execution_scope.update(whisper.transcribe.__globals__)
     execution_scope.update(whisper.__dict__)
     execution_scope.update(whisper.model.__dict__)
-    execution_scope["Progress"] = Progress
-    execution_scope["BarColumn"] = BarColumn
-    execution_scope["TimeRemainingColumn"] = TimeRemainingColumn
-    execution_scope["TextColumn"] = TextColumn
     execution_scope["globalvars"] = globalvars
 
     exec(patched_source, execution_scope)
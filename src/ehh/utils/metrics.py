@@ -0,0 +1,286 @@
+import math
+import threading
+from typing import Callable, Iterator, Optional, TypeVar
+
+# latencies of gateway calls, in seconds
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# download throughput, in bytes per second (64 KiB/s .. 64 MiB/s)
+THROUGHPUT_BUCKETS = tuple(float(64 * 1024 * 2**i) for i in range(11))
+# transcription time / audio duration; below 1 is faster than real time
+RTF_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 4.0)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels.items()
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self._lock = threading.Lock()
+        self._values: dict[tuple[str, ...], object] = {}
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        if len(labels) != len(self.label_names) or any(
+            name not in labels for name in self.label_names
+        ):
+            raise ValueError(
+                f"metric {self.name} takes labels {self.label_names}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _labels(self, key: tuple[str, ...]) -> dict[str, str]:
+        return dict(zip(self.label_names, key))
+
+    def samples(self) -> Iterator[tuple[str, dict[str, str], float]]:
+        # (name, labels, value) in prometheus exposition order
+        raise NotImplementedError
+
+    def summarize(self) -> Iterator[tuple[dict[str, str], str]]:
+        # (labels, human readable value) for the stats commands
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        super().__init__(name, help, labels)
+        if not labels:
+            # unlabelled series exist from the start, so scrapes see a 0
+            self._values[()] = 0.0
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount  # type: ignore
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)  # type: ignore
+
+    def samples(self) -> Iterator[tuple[str, dict[str, str], float]]:
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, self._labels(key), value  # type: ignore
+
+    def summarize(self) -> Iterator[tuple[dict[str, str], str]]:
+        for _, labels, value in self.samples():
+            yield labels, _format_value(value)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, func: Callable[[], float], **labels) -> None:
+        # evaluated whenever the metric is read, e.g. for queue depths
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = func
+
+    def samples(self) -> Iterator[tuple[str, dict[str, str], float]]:
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, self._labels(key), value() if callable(value) else value  # type: ignore
+
+    def summarize(self) -> Iterator[tuple[dict[str, str], str]]:
+        for _, labels, value in self.samples():
+            yield labels, _format_value(value)
+
+
+class _HistogramValue:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, size: int) -> None:
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        if not labels:
+            self._values[()] = _HistogramValue(len(self.buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            entry = self._values.get(key, None)
+            if entry is None:
+                entry = self._values[key] = _HistogramValue(len(self.buckets))
+            entry.counts[index] += 1  # type: ignore
+            entry.sum += value  # type: ignore
+            entry.count += 1  # type: ignore
+
+    def _snapshot(self) -> list[tuple[tuple[str, ...], list[int], float, int]]:
+        with self._lock:
+            return [
+                (key, list(v.counts), v.sum, v.count)  # type: ignore
+                for key, v in sorted(self._values.items())
+            ]
+
+    def samples(self) -> Iterator[tuple[str, dict[str, str], float]]:
+        for key, counts, total, count in self._snapshot():
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield (
+                    f"{self.name}_bucket",
+                    {**labels, "le": _format_value(bound)},
+                    cumulative,
+                )
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+    def _quantile(self, counts: list[int], count: int, q: float) -> float:
+        # upper bound of the bucket holding the quantile; coarse, but enough
+        # to tell 50 ms from 5 s
+        rank = q * count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return bound
+        return math.inf
+
+    def summarize(self) -> Iterator[tuple[dict[str, str], str]]:
+        for key, counts, total, count in self._snapshot():
+            if count == 0:
+                continue
+            yield self._labels(key), (
+                f"n={count} avg={total / count:.3g} "
+                f"p50<={_format_value(self._quantile(counts, count, 0.5))} "
+                f"p95<={_format_value(self._quantile(counts, count, 0.95))}"
+            )
+
+
+M = TypeVar("M", bound=_Metric)
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: M) -> M:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name, None)
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def summarize(self) -> list[tuple[str, str, str]]:
+        # (metric, labels, value) rows, for the repl and bot stats commands
+        rows = []
+        for metric in list(self._metrics.values()):
+            for labels, value in metric.summarize():
+                rows.append(
+                    (
+                        metric.name,
+                        ", ".join(f"{k}={v}" for k, v in labels.items()),
+                        value,
+                    )
+                )
+        return rows
+
+
+REGISTRY = Registry()
+
+GATEWAY_REQUESTS = REGISTRY.register(
+    Counter(
+        "ehh_gateway_requests_total",
+        "Gateway requests by endpoint and response status.",
+        ("endpoint", "status"),
+    )
+)
+GATEWAY_LATENCY = REGISTRY.register(
+    Histogram(
+        "ehh_gateway_request_duration_seconds",
+        "Time until the gateway's response headers arrived.",
+        ("endpoint",),
+        LATENCY_BUCKETS,
+    )
+)
+DOWNLOAD_BYTES = REGISTRY.register(
+    Counter("ehh_download_bytes_total", "Bytes downloaded by file downloads.")
+)
+DOWNLOAD_THROUGHPUT = REGISTRY.register(
+    Histogram(
+        "ehh_download_throughput_bytes_per_second",
+        "Throughput of completed file downloads.",
+        buckets=THROUGHPUT_BUCKETS,
+    )
+)
+TRANSCRIPTION_RTF = REGISTRY.register(
+    Histogram(
+        "ehh_transcription_real_time_factor",
+        "Transcription time divided by audio duration.",
+        buckets=RTF_BUCKETS,
+    )
+)
+CACHE_REQUESTS = REGISTRY.register(
+    Counter(
+        "ehh_cache_requests_total",
+        "Cache lookups by cache and result (hit or miss).",
+        ("cache", "result"),
+    )
+)
+JOBS = REGISTRY.register(
+    Gauge("ehh_jobs", "Background jobs currently queued or running.", ("state",))
+)
+JOBS_FINISHED = REGISTRY.register(
+    Counter("ehh_jobs_finished_total", "Background jobs by final state.", ("state",))
+)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
@@ -0,0 +1,55 @@
+import re
+
+from ..models.paper_digest import PaperDigest
+from . import feature_flags
+from .tracing import traced
+
+HTML_PARSER = "lxml" if feature_flags.LXML else "html.parser"
+WHITESPACE_PATTERN = re.compile(r"[^\S\n]+")
+BLANK_LINES_PATTERN = re.compile(r"\n(?: ?\n)+")
+MEDIA_TAGS = {"audio", "video", "source", "img", "embed"}
+ANSWER_TAGS = {"input", "textarea", "select"}
+
+
+def normalize_text(text: str) -> str:
+    text = WHITESPACE_PATTERN.sub(" ", text.strip()).strip()
+    return BLANK_LINES_PATTERN.sub("\n", text)
+
+
+@traced(cat="parse", attrs=lambda html: {"html_chars": len(html)})
+def digest_paper_html(html: str) -> PaperDigest:
+    from bs4 import BeautifulSoup, CData, NavigableString, Tag
+
+    soup = BeautifulSoup(html, HTML_PARSER)
+
+    strings: list[str] = []
+    audio_urls: list[str] = []
+    media_urls: list[str] = []
+    question_anchors: dict[str, None] = {}
+
+    # a single walk over the tree collects everything the tasks need
+    for node in soup.descendants:
+        if isinstance(node, Tag):
+            if node.name in MEDIA_TAGS:
+                src = node.get("src")
+                if src:
+                    media_urls.append(str(src))
+                    if node.name == "audio" or (
+                        node.name == "source"
+                        and isinstance(node.parent, Tag)
+                        and node.parent.name == "audio"
+                    ):
+                        audio_urls.append(str(src))
+            elif node.name in ANSWER_TAGS:
+                name = node.get("name")
+                if name:
+                    question_anchors[str(name)] = None
+        elif type(node) is NavigableString or type(node) is CData:
+            strings.append(node)
+
+    return PaperDigest(
+        text=normalize_text("\n".join(strings)),
+        audio_urls=audio_urls,
+        media_urls=media_urls,
+        question_anchors=list(question_anchors),
+    )
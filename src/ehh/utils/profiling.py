@@ -0,0 +1,157 @@
+import cProfile
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable
+
+from .fs import CACHE_DIR
+
+PROFILE_DIR = CACHE_DIR / "profiles"
+TRACEMALLOC_FRAMES = 10
+DEFAULT_TOP = 15
+
+# cProfile (sys.monitoring on 3.12) and tracemalloc are process-wide, so only
+# one profile can run at a time
+_profile_lock = threading.Lock()
+
+
+class ProfileBusyError(RuntimeError):
+    def __init__(self) -> None:
+        super().__init__("a profile is already running")
+
+
+@dataclass
+class ProfileResult:
+    label: str
+    seconds: float
+    peak_bytes: int
+    prof_path: Path
+    snapshot_path: Path
+    # (function, calls, own seconds, cumulative seconds)
+    top_functions: list[tuple[str, str, str, str]] = field(default_factory=list)
+    # (site, size, blocks)
+    top_allocations: list[tuple[str, str, str]] = field(default_factory=list)
+    result: Any = None
+
+
+def _format_bytes(size: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+def _get_top_functions(
+    profile: cProfile.Profile, top: int
+) -> list[tuple[str, str, str, str]]:
+    stats = pstats.Stats(profile)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE)
+    rows = []
+    # fcn_list holds the keys in the order of the last sort
+    for key in stats.fcn_list[:top]:  # type: ignore
+        filename, line, name = key
+        _, calls, own, cumulative, _ = stats.stats[key]  # type: ignore
+        location = name if filename == "~" else f"{Path(filename).name}:{line}({name})"
+        rows.append((location, str(calls), f"{own:.3f}s", f"{cumulative:.3f}s"))
+    return rows
+
+
+def _get_top_allocations(
+    snapshot: tracemalloc.Snapshot, top: int
+) -> list[tuple[str, str, str]]:
+    snapshot = snapshot.filter_traces(
+        (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*"),
+            tracemalloc.Filter(False, "<unknown>"),
+        )
+    )
+    rows = []
+    for stat in snapshot.statistics("lineno")[:top]:
+        frame = stat.traceback[0]
+        rows.append(
+            (
+                f"{Path(frame.filename).name}:{frame.lineno}",
+                _format_bytes(stat.size),
+                str(stat.count),
+            )
+        )
+    return rows
+
+
+def profile_call(
+    label: str, func: Callable, *args, top: int = DEFAULT_TOP, **kwargs
+) -> ProfileResult:
+    # runs func under cProfile and tracemalloc. both are process-wide, so
+    # whatever other threads run meanwhile (e.g. concurrent jobs) shows up in
+    # both tables; work handed to other processes shows up as waiting. the
+    # allocation snapshot holds what func left allocated when it returned,
+    # the peak covers the whole call. raises ProfileBusyError while another
+    # profile runs
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfileBusyError()
+    try:
+        return _profile_call(label, func, args, kwargs, top)
+    finally:
+        _profile_lock.release()
+
+
+def is_profiling() -> bool:
+    return _profile_lock.locked()
+
+
+def _profile_call(
+    label: str, func: Callable, args: tuple, kwargs: dict, top: int
+) -> ProfileResult:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    stem = re.sub(r"[^A-Za-z0-9_-]+", "_", label).strip("_")[:60] or "profile"
+    base = PROFILE_DIR / f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{stem}"
+
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    tracemalloc.reset_peak()
+    profile = cProfile.Profile()
+
+    start = time.perf_counter()
+    try:
+        profile.enable()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            profile.disable()
+        seconds = time.perf_counter() - start
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+    prof_path = base.with_suffix(".prof")
+    snapshot_path = base.with_suffix(".snapshot")
+    profile.dump_stats(prof_path)
+    snapshot.dump(str(snapshot_path))
+
+    return ProfileResult(
+        label=label,
+        seconds=seconds,
+        peak_bytes=peak,
+        prof_path=prof_path,
+        snapshot_path=snapshot_path,
+        top_functions=_get_top_functions(profile, top),
+        top_allocations=_get_top_allocations(snapshot, top),
+        result=result,
+    )
+
+
+def describe_profile(result: ProfileResult) -> str:
+    return (
+        f"{result.label}: {result.seconds:.2f}s, peak traced memory "
+        f"{_format_bytes(result.peak_bytes)}"
+    )
@@ -0,0 +1,87 @@
+import threading
+import time
+from typing import Callable, Optional
+
+
+class ProgressTask:
+    __slots__ = ("description", "total", "completed", "started_at", "finished")
+
+    def __init__(self, description: str, total: Optional[float]) -> None:
+        self.description = description
+        self.total = total
+        self.completed: float = 0
+        self.started_at = time.monotonic()
+        self.finished = False
+
+    # emitting an event is a plain attribute update; rendering happens on the
+    # bus thread at a capped frame rate, never per chunk
+    def advance(self, amount: float) -> None:
+        self.completed += amount
+
+    # tqdm-compatible alias, used by the patched whisper.transcribe
+    def update(self, amount: float) -> None:
+        self.completed += amount
+
+    def finish(self) -> None:
+        self.finished = True
+
+    @property
+    def fraction(self) -> Optional[float]:
+        if not self.total:
+            return None
+        return min(1.0, self.completed / self.total)
+
+    def __enter__(self) -> "ProgressTask":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.finish()
+
+
+class ProgressBus:
+    def __init__(
+        self,
+        render: Callable[[list[ProgressTask]], None],
+        end: Callable[[], None],
+        fps: float,
+    ) -> None:
+        self.render = render
+        self.end = end
+        self.interval = 1.0 / fps
+        self._tasks: list[ProgressTask] = []
+        self._lock = threading.Lock()
+        self._render_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def add_task(self, description: str, total: Optional[float]) -> ProgressTask:
+        task = ProgressTask(description, total)
+        with self._lock:
+            self._tasks.append(task)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="ehh-progress", daemon=True
+                )
+                self._thread.start()
+        return task
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self._render_lock:
+                with self._lock:
+                    tasks = list(self._tasks)
+                    self._tasks = [t for t in tasks if not t.finished]
+                    idle = len(self._tasks) == 0
+                    if idle:
+                        self._thread = None
+
+                # finished tasks get rendered one last time before dropping out
+                try:
+                    self.render(tasks)
+                    if idle:
+                        self.end()
+                except Exception:
+                    pass
+
+            if idle:
+                return
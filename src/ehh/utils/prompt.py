@@ -1,6 +1,13 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
 from prompt_toolkit import PromptSession
 from prompt_toolkit.completion import Completer, Completion
 from prompt_toolkit.document import Document
+from prompt_toolkit.shortcuts import choice
+
+from .. import globalvars
 
 
 # Powered by Google Gemini
@@ -43,9 +50,38 @@ class ReplCompleter(Completer):
                 yield Completion(option, start_position=-len(current_word))
 
 
+def _run_blocking_prompt(func: Callable, *args, **kwargs):
+    # blocking prompts start an event loop of their own, which is not allowed
+    # on a thread that is already running one (the async repl); hand them to
+    # a helper thread in that case
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return func(*args, **kwargs)
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(func, *args, **kwargs).result()
+
+
+def prompt(session: PromptSession, message: str, **kwargs) -> str:
+    # buffered log lines must reach the terminal before the prompt is drawn
+    globalvars.get_context().messenger.flush_output()
+    return _run_blocking_prompt(session.prompt, message, **kwargs)
+
+
+async def prompt_async(session: PromptSession, message: str, **kwargs) -> str:
+    globalvars.get_context().messenger.flush_output()
+    return await session.prompt_async(message, **kwargs)
+
+
+def prompt_choice(message: str, **kwargs):
+    globalvars.get_context().messenger.flush_output()
+    return _run_blocking_prompt(choice, message, **kwargs)
+
+
 def prompt_for_yn(session: PromptSession, message: str) -> bool:
     while True:
-        response = session.prompt(message)
+        response = prompt(session, message)
         text = response.lower().strip()
         yes_variants = ("y", "yes")
         no_variants = ("n", "no")
@@ -0,0 +1,186 @@
+import json
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterable, Optional
+
+from ..models.homework_kind import HomeworkKind
+from ..models.homework_record import HomeworkRecord
+from .constants import TIME_FORMAT
+from .crypto import encodeb64_safe
+from .fs import CACHE_DIR
+
+SEARCH_INDEX_FILE = CACHE_DIR / "search_index.db"
+
+SOURCE_TEXT = "text"
+SOURCE_TRANSCRIPT = "transcript"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    hw_id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    title TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    publish_time TEXT NOT NULL,
+    mtime REAL,
+    UNIQUE (hw_id, source)
+);
+CREATE INDEX IF NOT EXISTS documents_kind ON documents (kind);
+CREATE INDEX IF NOT EXISTS documents_publish_time ON documents (publish_time);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5 (
+    title, content, tokenize = 'unicode61'
+);
+"""
+
+_lock = threading.Lock()
+_connection: Optional[sqlite3.Connection] = None
+
+
+@dataclass
+class SearchHit:
+    hw_id: str
+    source: str
+    title: str
+    kind: str
+    publish_time: datetime
+    snippet: str
+
+
+def _get_connection() -> sqlite3.Connection:
+    global _connection
+    if _connection is None:
+        _connection = sqlite3.connect(SEARCH_INDEX_FILE, check_same_thread=False)
+        _connection.executescript(_SCHEMA)
+    return _connection
+
+
+def get_hw_id(record: HomeworkRecord) -> str:
+    # api_id is optional on HomeworkRecord; fall back to the title, which is
+    # what the cache files are keyed by anyway
+    return str(record.api_id or encodeb64_safe(record.title))
+
+
+def index_document(
+    record: HomeworkRecord, source: str, content: str, mtime: Optional[float] = None
+) -> None:
+    hw_id = get_hw_id(record)
+    with _lock:
+        conn = _get_connection()
+        with conn:
+            row = conn.execute(
+                "SELECT id FROM documents WHERE hw_id = ? AND source = ?",
+                (hw_id, source),
+            ).fetchone()
+            if row is not None:
+                conn.execute("DELETE FROM documents_fts WHERE rowid = ?", (row[0],))
+                conn.execute("DELETE FROM documents WHERE id = ?", (row[0],))
+
+            cursor = conn.execute(
+                "INSERT INTO documents (hw_id, source, title, kind, publish_time, mtime) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    hw_id,
+                    source,
+                    record.title,
+                    record.kind.value,
+                    record.publish_time.strftime(TIME_FORMAT),
+                    mtime,
+                ),
+            )
+            conn.execute(
+                "INSERT INTO documents_fts (rowid, title, content) VALUES (?, ?, ?)",
+                (cursor.lastrowid, record.title, content),
+            )
+
+
+def index_file(record: HomeworkRecord, source: str, path: Path) -> bool:
+    if not path.is_file():
+        return False
+
+    # unchanged files (same mtime) are skipped, which keeps re-syncs cheap
+    mtime = path.stat().st_mtime
+    with _lock:
+        row = (
+            _get_connection()
+            .execute(
+                "SELECT mtime FROM documents WHERE hw_id = ? AND source = ?",
+                (get_hw_id(record), source),
+            )
+            .fetchone()
+        )
+    if row is not None and row[0] == mtime:
+        return False
+
+    with open(path, "rt", encoding="utf-8") as f:
+        index_document(record, source, f.read(), mtime)
+    return True
+
+
+def _quote_query(query: str) -> str:
+    # quote every term so user input never trips over fts5 query syntax;
+    # a trailing '*' still requests a prefix match
+    terms = []
+    for term in query.split():
+        prefix = term.endswith("*") and len(term) > 1
+        term = term.rstrip("*").replace('"', '""')
+        terms.append(f'"{term}"*' if prefix else f'"{term}"')
+    return " ".join(terms)
+
+
+def search(
+    query: str,
+    kind: Optional[HomeworkKind] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 20,
+    hw_ids: Optional[Iterable[str]] = None,
+) -> list[SearchHit]:
+    # hits are marked with guillemets; square brackets would be read as rich
+    # markup and swallowed when the snippet is rendered in a table. cached
+    # files are shared by every account, so callers pass the hw_ids of the
+    # account's homework to keep other accounts' papers out of the results
+    match_query = _quote_query(query)
+    if match_query == "":
+        return []
+
+    sql = (
+        "SELECT d.hw_id, d.source, d.title, d.kind, d.publish_time,"
+        " snippet(documents_fts, 1, '«', '»', '...', 12)"
+        " FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid"
+        " WHERE documents_fts MATCH ?"
+    )
+    params: list = [match_query]
+    if hw_ids is not None:
+        # one json parameter however many ids, clear of sqlite's cap on
+        # bound variables
+        sql += " AND d.hw_id IN (SELECT value FROM json_each(?))"
+        params.append(json.dumps(list(hw_ids)))
+    if kind is not None:
+        sql += " AND d.kind = ?"
+        params.append(kind.value)
+    if since is not None:
+        sql += " AND d.publish_time >= ?"
+        params.append(since.strftime(TIME_FORMAT))
+    if until is not None:
+        # until names a day, and items published during it are included
+        sql += " AND d.publish_time < ?"
+        params.append((until + timedelta(days=1)).strftime(TIME_FORMAT))
+    sql += " ORDER BY rank LIMIT ?"
+    params.append(limit)
+
+    with _lock:
+        rows = _get_connection().execute(sql, params).fetchall()
+
+    return [
+        SearchHit(
+            hw_id=row[0],
+            source=row[1],
+            title=row[2],
+            kind=row[3],
+            publish_time=datetime.strptime(row[4], TIME_FORMAT),
+            snippet=row[5].replace("\n", " "),
+        )
+        for row in rows
+    ]
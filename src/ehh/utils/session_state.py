@@ -0,0 +1,84 @@
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from ..models.credentials import Credentials
+from ..models.school_info import SchoolInfo
+from ..models.token import Token
+from ..models.user_info import UserInfo
+from .fs import CACHE_DIR
+
+SESSION_STATE_FILE = CACHE_DIR / "session.json"
+# a token this close to expiry is treated as expired already
+EXPIRY_MARGIN_SECONDS = 60
+
+_lock = threading.Lock()
+
+
+@dataclass
+class SavedSession:
+    token: Token
+    saved_at: float
+
+    @property
+    def expires_at(self) -> float:
+        return self.saved_at + self.token.expires_in
+
+    @property
+    def is_expired(self) -> bool:
+        return time.time() >= self.expires_at - EXPIRY_MARGIN_SECONDS
+
+
+def _read_sessions() -> dict:
+    try:
+        with open(SESSION_STATE_FILE, "rt", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _write_sessions(sessions: dict) -> None:
+    tmp_path = SESSION_STATE_FILE.with_suffix(".tmp")
+    # the file holds bearer tokens; keep it readable by the owner only
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wt", encoding="utf-8") as f:
+        json.dump(sessions, f, ensure_ascii=False)
+    os.replace(tmp_path, SESSION_STATE_FILE)
+
+
+def save_session(credentials: Credentials, token: Token) -> None:
+    with _lock:
+        sessions = _read_sessions()
+        sessions[credentials.account_key()] = {
+            "saved_at": time.time(),
+            "token": asdict(token),
+        }
+        _write_sessions(sessions)
+
+
+def load_session(credentials: Credentials) -> Optional[SavedSession]:
+    with _lock:
+        entry = _read_sessions().get(credentials.account_key(), None)
+    if entry is None:
+        return None
+
+    data = entry["token"]
+    user_info = data["user_info"]
+    return SavedSession(
+        token=Token(
+            **{k: v for k, v in data.items() if k != "user_info"},
+            user_info=UserInfo(
+                **{k: v for k, v in user_info.items() if k != "school"},
+                school=SchoolInfo(**user_info["school"]),
+            ),
+        ),
+        saved_at=entry["saved_at"],
+    )
+
+
+def clear_sessions() -> None:
+    with _lock:
+        SESSION_STATE_FILE.unlink(missing_ok=True)
@@ -0,0 +1,76 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+from .fs import CACHE_DIR
+
+TELEGRAM_FILE_CACHE_FILE = CACHE_DIR / "telegram_file_ids.json"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class TelegramFileCache:
+    # maps the sha256 of a file's content to the file_id telegram assigned
+    # when it was first uploaded, so later sends can reference it instead of
+    # uploading the bytes again; ids are per bot and per media kind
+
+    def __init__(self, path: Path = TELEGRAM_FILE_CACHE_FILE) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        # str(path) -> [mtime_ns, size, sha256], to avoid rehashing
+        self._digests: dict[str, list] = {}
+        # "<kind>:<sha256>" -> file_id
+        self._file_ids: dict[str, str] = {}
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path.is_file():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        self._digests = data.get("digests", {})
+        self._file_ids = data.get("file_ids", {})
+
+    def _save(self) -> None:
+        data = {"digests": self._digests, "file_ids": self._file_ids}
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(data), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+    def get_digest(self, path: Path) -> str:
+        # blocking: hashes the file unless it is unchanged since last time
+        stat = path.stat()
+        key = str(path)
+        with self._lock:
+            entry = self._digests.get(key, None)
+            if entry is not None and entry[:2] == [stat.st_mtime_ns, stat.st_size]:
+                return entry[2]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(HASH_CHUNK_SIZE):
+                digest.update(chunk)
+        sha256 = digest.hexdigest()
+
+        with self._lock:
+            self._digests[key] = [stat.st_mtime_ns, stat.st_size, sha256]
+            self._save()
+        return sha256
+
+    def get(self, kind: str, digest: str) -> Optional[str]:
+        with self._lock:
+            return self._file_ids.get(f"{kind}:{digest}", None)
+
+    def put(self, kind: str, digest: str, file_id: str) -> None:
+        with self._lock:
+            self._file_ids[f"{kind}:{digest}"] = file_id
+            self._save()
+
+    def discard(self, kind: str, digest: str) -> None:
+        with self._lock:
+            if self._file_ids.pop(f"{kind}:{digest}", None) is not None:
+                self._save()
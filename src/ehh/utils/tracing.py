@@ -0,0 +1,212 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+
+from .fs import CACHE_DIR
+
+TRACE_DIR = CACHE_DIR / "traces"
+# a long-running bot would otherwise grow the trace without bound
+MAX_TRACE_EVENTS = 500_000
+# virtual tracks (e.g. one per background job) get thread ids from here up,
+# well clear of real native thread ids in practice
+TRACK_TID_BASE = 1 << 40
+
+
+class Span:
+    __slots__ = ("name", "cat", "track", "args", "start_ns")
+
+    def __init__(
+        self, name: str, cat: str, track: Optional[str], args: dict[str, Any]
+    ) -> None:
+        self.name = name
+        self.cat = cat
+        self.track = track
+        self.args = args
+        self.start_ns = time.perf_counter_ns()
+
+    def set(self, key: str, value: Any) -> None:
+        self.args[key] = value
+
+
+class _NullSpan:
+    # handed out while tracing is off, so call sites need no checks
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def _to_json_value(value: Any) -> Any:
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+class Tracer:
+    # collects finished spans as chrome trace-event "complete" events; the
+    # viewer (chrome://tracing, perfetto) nests them by time within a thread
+
+    def __init__(self, max_events: int = MAX_TRACE_EVENTS) -> None:
+        self.max_events = max_events
+        self.dropped = 0
+        self._origin_ns = time.perf_counter_ns()
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._events: list[dict] = []
+        # tid -> display name, for the metadata events
+        self._threads: dict[int, str] = {}
+        self._tracks: dict[str, int] = {}
+
+    def _get_tid(self, track: Optional[str]) -> int:
+        # called with the lock held
+        if track is None:
+            tid = threading.get_native_id()
+            if tid not in self._threads:
+                self._threads[tid] = threading.current_thread().name
+            return tid
+
+        tid = self._tracks.get(track, None)
+        if tid is None:
+            tid = TRACK_TID_BASE + len(self._tracks)
+            self._tracks[track] = tid
+            self._threads[tid] = track
+        return tid
+
+    def finish(self, span: Span, end_ns: Optional[int] = None) -> None:
+        if end_ns is None:
+            end_ns = time.perf_counter_ns()
+        event = {
+            "name": span.name,
+            "cat": span.cat,
+            "ph": "X",
+            "ts": (span.start_ns - self._origin_ns) / 1000,
+            "dur": (end_ns - span.start_ns) / 1000,
+            "pid": self._pid,
+            "args": {k: _to_json_value(v) for k, v in span.args.items()},
+        }
+        with self._lock:
+            if len(self._events) >= self.max_events:
+                self.dropped += 1
+                return
+            event["tid"] = self._get_tid(span.track)
+            self._events.append(event)
+
+    def write(self, path: Path) -> int:
+        with self._lock:
+            events = list(self._events)
+            threads = dict(self._threads)
+        metadata = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": self._pid,
+                "tid": tid,
+                "args": {"name": name},
+            }
+            for tid, name in threads.items()
+        ]
+        data = {
+            "traceEvents": metadata + events,
+            "displayTimeUnit": "ms",
+            "otherData": {"dropped_events": self.dropped},
+        }
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, path)
+        return len(events)
+
+
+_tracer: Optional[Tracer] = None
+
+
+def enable_tracing(max_events: int = MAX_TRACE_EVENTS) -> Tracer:
+    global _tracer
+    _tracer = Tracer(max_events)
+    return _tracer
+
+
+def disable_tracing() -> Optional[Tracer]:
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def get_tracer() -> Optional[Tracer]:
+    return _tracer
+
+
+def get_trace_path(prefix: str) -> Path:
+    return TRACE_DIR / f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+
+
+@contextmanager
+def span(
+    name: str, cat: str = "task", track: Optional[str] = None, **attrs
+) -> Iterator[Span | _NullSpan]:
+    # times the enclosed block; track puts the span on a named virtual thread
+    # instead of the current one, for work that hops threads or processes
+    tracer = _tracer
+    if tracer is None:
+        yield _NULL_SPAN
+        return
+
+    current = Span(name, cat, track, attrs)
+    try:
+        yield current
+    except BaseException as e:
+        current.set("error", type(e).__name__)
+        raise
+    finally:
+        tracer.finish(current)
+
+
+def record_span(
+    name: str,
+    cat: str,
+    start_ns: int,
+    end_ns: int,
+    track: Optional[str] = None,
+    **attrs,
+) -> None:
+    # adds a span timed elsewhere, e.g. in a worker process, from its
+    # perf_counter_ns readings; perf_counter is a system-wide monotonic clock,
+    # so readings from another process on this host line up with ours
+    tracer = _tracer
+    if tracer is None:
+        return
+
+    recorded = Span(name, cat, track, attrs)
+    recorded.start_ns = start_ns
+    tracer.finish(recorded, end_ns)
+
+
+def traced(
+    name: Optional[str] = None,
+    cat: str = "task",
+    attrs: Optional[Callable[..., dict[str, Any]]] = None,
+):
+    # decorator form of span(); attrs receives the call's arguments and
+    # returns the span attributes
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return func(*args, **kwargs)
+            with span(span_name, cat, **(attrs(*args, **kwargs) if attrs else {})):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
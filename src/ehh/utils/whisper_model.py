@@ -0,0 +1,245 @@
+import itertools
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+from .crypto import encodeb64_safe
+from .fs import CACHE_DIR
+from .logging import print
+from .metrics import TRANSCRIPTION_RTF, record_cache
+from .tracing import record_span
+
+WHISPER_MMAP_DIR = CACHE_DIR / "whisper"
+
+
+def _get_mmap_checkpoint_path(model_name: str) -> Path:
+    return WHISPER_MMAP_DIR / f"{encodeb64_safe(model_name)}.mmap.pt"
+
+
+def _convert_checkpoint(model_name: str, path: Path) -> None:
+    import torch
+    import whisper
+
+    print(
+        f"<info> converting Whisper model '{model_name}' to a memory-mappable checkpoint (one-time)..."
+    )
+    model = whisper.load_model(model_name, device="cpu")
+    checkpoint = {
+        "dims": asdict(model.dims),
+        "model_state_dict": model.state_dict(),
+        "alignment_heads": model.alignment_heads.to_dense(),
+    }
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # write to a process-unique temp file and rename, so concurrent processes
+    # never observe a partially written checkpoint
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    torch.save(checkpoint, tmp_path)
+    os.replace(tmp_path, path)
+    print(f"<info> saved memory-mappable checkpoint to '{path}'")
+
+
+def _load_mmap_model(model_name: str, device: Optional[str]):
+    import torch
+    from whisper.model import ModelDimensions, Whisper
+
+    path = _get_mmap_checkpoint_path(model_name)
+    if not path.is_file():
+        _convert_checkpoint(model_name, path)
+
+    # tensors stay backed by the page cache, so every process on this host
+    # that maps the same file shares the same physical pages
+    checkpoint = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+
+    dims = ModelDimensions(**checkpoint["dims"])
+    with torch.device("meta"):
+        model = Whisper(dims)
+    model.load_state_dict(checkpoint["model_state_dict"], assign=True)
+    model.register_buffer(
+        "alignment_heads", checkpoint["alignment_heads"].to_sparse(), persistent=False
+    )
+    # non-persistent buffers are not in the state dict, so assign=True leaves
+    # them on the meta device; rebuild the decoder's causal mask like
+    # TextDecoder.__init__ does
+    model.decoder.register_buffer(
+        "mask",
+        torch.empty(dims.n_text_ctx, dims.n_text_ctx).fill_(-float("inf")).triu_(1),
+        persistent=False,
+    )
+    meta_tensors = [
+        name
+        for name, tensor in itertools.chain(
+            model.named_parameters(), model.named_buffers()
+        )
+        if tensor.is_meta
+    ]
+    if len(meta_tensors) > 0:
+        raise RuntimeError(
+            f"memory-mapped Whisper model has tensors left on the meta device: {', '.join(meta_tensors)}"
+        )
+
+    if device is None:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    if device != "cpu":
+        model = model.to(device)
+    return model
+
+
+def _supports_mmap() -> bool:
+    import torch
+
+    major, minor = (int(p) for p in torch.__version__.split(".")[:2])
+    return (major, minor) >= (2, 1)
+
+
+def load_whisper_model(
+    model_name: str, device: Optional[str], in_memory: bool, mmap: bool
+):
+    import whisper
+
+    if mmap:
+        if in_memory:
+            print("<warning> whisper 'in_memory' is ignored when 'mmap' is enabled")
+
+        if _supports_mmap():
+            return _load_mmap_model(model_name, device)
+
+        print(
+            "<warning> memory-mapped loading requires torch>=2.1; falling back to regular loading"
+        )
+
+    return whisper.load_model(model_name, device=device, in_memory=in_memory)
+
+
+# loaded models, shared by everything in this process (worker processes get
+# their own copy and keep it between jobs)
+_models: dict[tuple, object] = {}
+_models_lock = threading.Lock()
+
+
+def _get_model_key(
+    model_name: str, device: Optional[str], in_memory: bool, mmap: bool
+) -> tuple:
+    return (model_name, device, in_memory, mmap)
+
+
+def is_whisper_model_loaded(
+    model_name: str, device: Optional[str], in_memory: bool, mmap: bool
+) -> bool:
+    return _get_model_key(model_name, device, in_memory, mmap) in _models
+
+
+def _get_or_load_model(
+    model_name: str, device: Optional[str], in_memory: bool, mmap: bool
+) -> tuple[object, bool]:
+    # returns the model and whether it was loaded already
+    key = _get_model_key(model_name, device, in_memory, mmap)
+    # held while loading, so concurrent callers wait for one load instead of
+    # each loading their own copy
+    with _models_lock:
+        model = _models.get(key, None)
+        if model is not None:
+            return model, True
+        model = load_whisper_model(
+            model_name, device=device, in_memory=in_memory, mmap=mmap
+        )
+        _models[key] = model
+    return model, False
+
+
+def get_whisper_model(
+    model_name: str, device: Optional[str], in_memory: bool, mmap: bool
+):
+    model, cached = _get_or_load_model(model_name, device, in_memory, mmap)
+    record_cache("whisper_model", cached)
+    return model
+
+
+def get_audio_duration(result: dict) -> Optional[float]:
+    # whisper does not report the clip length; the last segment ends close
+    # enough to it for real-time factors
+    segments = result.get("segments", None) or []
+    if len(segments) == 0:
+        return None
+    return segments[-1].get("end", None)
+
+
+@dataclass
+class TranscriptionResult:
+    length: int
+    real_time_factor: Optional[float]
+    model_name: str
+    audio_path: str
+    # whether the worker had the model loaded already
+    model_cached: bool
+    # perf_counter_ns readings from the worker
+    load_start_ns: int
+    transcribe_start_ns: int
+    transcribe_end_ns: int
+
+
+def transcribe_audio_file(
+    audio_path: str,
+    output_path: str,
+    model_name: str,
+    device: Optional[str],
+    in_memory: bool,
+    mmap: bool,
+) -> TranscriptionResult:
+    # runs in a worker process: takes and returns only plain values and never
+    # touches the messenger or the shared context. the worker has no tracer
+    # and its metrics are never read, so timings and the cache result go
+    # back to the parent, which reports them with report_transcription
+    load_start_ns = time.perf_counter_ns()
+    model, cached = _get_or_load_model(model_name, device, in_memory, mmap)
+    transcribe_start_ns = time.perf_counter_ns()
+    result = model.transcribe(audio_path, language="en", verbose=None)  # type: ignore
+    transcribe_end_ns = time.perf_counter_ns()
+    audio_seconds = get_audio_duration(result)
+    transcription = result.get("text", None)
+    if isinstance(transcription, list):
+        transcription = "\n".join(transcription)
+    if not transcription or transcription.strip() == "":
+        raise RuntimeError("transcription failed or returned empty result")
+
+    Path(output_path).write_text(transcription, encoding="utf-8")
+    seconds = (transcribe_end_ns - transcribe_start_ns) / 1e9
+    return TranscriptionResult(
+        length=len(transcription),
+        real_time_factor=seconds / audio_seconds if audio_seconds else None,
+        model_name=model_name,
+        audio_path=audio_path,
+        model_cached=cached,
+        load_start_ns=load_start_ns,
+        transcribe_start_ns=transcribe_start_ns,
+        transcribe_end_ns=transcribe_end_ns,
+    )
+
+
+def report_transcription(
+    result: TranscriptionResult, track: Optional[str] = None
+) -> None:
+    # records a worker's transcription in this process's metrics and trace
+    record_cache("whisper_model", result.model_cached)
+    if result.real_time_factor is not None:
+        TRANSCRIPTION_RTF.observe(result.real_time_factor)
+    record_span(
+        "whisper.load",
+        "whisper",
+        result.load_start_ns,
+        result.transcribe_start_ns,
+        track=track,
+        model=result.model_name,
+        cached=result.model_cached,
+    )
+    record_span(
+        "whisper.transcribe",
+        "whisper",
+        result.transcribe_start_ns,
+        result.transcribe_end_ns,
+        track=track,
+        path=result.audio_path,
+    )